@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""Benchmark of the metadata codecs.
+
+Compare the parse time and the encoded size of typical metadata with the
+indented JSON and the MessagePack codecs
+
+Usage
+-----
+    python -m benchmarks.bench_codecs [REPEAT]
+
+"""
+
+import sys
+import timeit
+
+from scixtracer.codecs import JsonCodec, MsgpackCodec
+
+
+def _rawdata():
+    return {
+        'uuid': 'b5cbd0c8-3ad1-4d0e-a5a8-6b6f0c5d3c3f',
+        'origin': {'type': 'raw'},
+        'common': {'name': 'population1_001.tif', 'author': 'sprigent',
+                   'date': '2021-03-17', 'format': 'tif',
+                   'url': 'population1_001.tif'},
+        'tags': {'Population': 'population1', 'ID': '001'}
+    }
+
+
+def _processeddata():
+    return {
+        'uuid': 'b5cbd0c8-3ad1-4d0e-a5a8-6b6f0c5d3c3f',
+        'common': {'name': 'o_population1_001.tif', 'author': 'sprigent',
+                   'date': '2021-03-17', 'format': 'tif',
+                   'url': 'o_population1_001.tif'},
+        'origin': {'type': 'processed',
+                   'run': {'url': 'run.md.json',
+                           'uuid': '0c1e8c0a-7f7c-4a36-9d61-8bd5d4f0b3c2'},
+                   'inputs': [{'name': 'i',
+                               'url': '../data/population1_001.md.json',
+                               'uuid': 'b5cbd0c8-3ad1-4d0e-a5a8-6b6f0c5d3c3f',
+                               'type': 'raw'}],
+                   'output': {'name': 'o', 'label': 'wiener deconv'}}
+    }
+
+
+def _dataset(size):
+    return {
+        'uuid': 'b5cbd0c8-3ad1-4d0e-a5a8-6b6f0c5d3c3f',
+        'name': 'data',
+        'urls': [{'uuid': 'b5cbd0c8-3ad1-4d0e-a5a8-6b6f0c5d3c3f',
+                  'url': 'population1_{:06d}.md.json'.format(i)}
+                 for i in range(size)]
+    }
+
+
+def main(repeat):
+    cases = [('rawdata', _rawdata(), repeat),
+             ('processeddata', _processeddata(), repeat),
+             ('dataset 10k', _dataset(10000), max(1, repeat // 1000))]
+    codecs = [JsonCodec(), MsgpackCodec()]
+    for name, metadata, number in cases:
+        for codec in codecs:
+            content = codec.encode(metadata)
+            seconds = timeit.timeit(lambda: codec.decode(content),
+                                    number=number)
+            print('{} {}: {} bytes, parse {:.2f} us'.format(
+                name, codec.name, len(content), 1e6 * seconds / number))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
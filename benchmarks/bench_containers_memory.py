@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""Memory benchmark of the scixtracer containers.
+
+Compare the memory used by N RawData and ProcessedData containers with the
+memory used by the same containers with a per-instance __dict__ (the layout
+used before the containers got __slots__). The 'RawData with metadata' case
+fills the containers as the local service does when reading an experiment,
+with and without the shared URI prefixes and the interned tags
+
+Usage
+-----
+    python -m benchmarks.bench_containers_memory [N]
+
+"""
+
+import sys
+import json
+import tracemalloc
+
+from scixtracer.containers import (RawData, ProcessedData,
+                                   ProcessedDataInputContainer)
+from scixtracer.request_local import LocalRequestService
+
+_METADATA = json.dumps({
+    'dir': '/home/user/workspace/my_experiment_with_a_long_name/data/',
+    'tags': {'Population': 'population1', 'ID': '001'}
+})
+
+
+class _DictRawData:
+    """RawData layout with a per-instance __dict__"""
+
+    def __init__(self):
+        self.md_uri = ''
+        self.uuid = ''
+        self.name = ''
+        self.author = ''
+        self.date = ''
+        self.format = ''
+        self.uri = ''
+        self.type = 'raw'
+        self.tags = dict()
+
+
+class _DictInput:
+    """ProcessedDataInputContainer layout with a per-instance __dict__"""
+
+    def __init__(self, name, uri, uuid, type_):
+        self.name = name
+        self.uri = uri
+        self.uuid = uuid
+        self.type = type_
+
+
+class _DictProcessedData:
+    """ProcessedData layout with a per-instance __dict__"""
+
+    def __init__(self):
+        self.md_uri = ''
+        self.uuid = ''
+        self.name = ''
+        self.author = ''
+        self.date = ''
+        self.format = ''
+        self.uri = ''
+        self.type = 'processed'
+        self.run = None
+        self.inputs = list()
+        self.output = dict()
+
+
+def _measure(factory, count):
+    """Measure the memory allocated to keep count objects alive
+
+    Parameters
+    ----------
+    factory: callable
+        Function creating one object
+    count: int
+        Number of objects to create
+
+    Returns
+    -------
+    int
+        Number of bytes allocated
+    """
+
+    tracemalloc.start()
+    objects = [factory() for _ in range(count)]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objects
+    return size
+
+
+def _processed_data(cls, input_cls):
+    def factory():
+        data = cls()
+        data.inputs.append(input_cls('i', '', '', 'raw'))
+        return data
+    return factory
+
+
+def _filled_rawdata(intern):
+    counter = iter(range(100000000))
+
+    def factory():
+        # json.loads creates new strings for each data as when reading files
+        metadata = json.loads(_METADATA)
+        index = str(next(counter))
+        if intern:
+            data = RawData()
+            data.tags = LocalRequestService._intern_tags(metadata['tags'])
+        else:
+            data = _DictRawData()
+            data.tags = metadata['tags']
+        data.md_uri = metadata['dir'] + 'population1_' + index + '.md.json'
+        data.uri = metadata['dir'] + 'population1_' + index + '.tif'
+        return data
+    return factory
+
+
+def main(count):
+    cases = [
+        ('RawData', _DictRawData, RawData),
+        ('ProcessedData',
+         _processed_data(_DictProcessedData, _DictInput),
+         _processed_data(ProcessedData, ProcessedDataInputContainer)),
+        ('RawData with metadata', _filled_rawdata(False),
+         _filled_rawdata(True)),
+    ]
+    print('containers:', count)
+    for name, dict_factory, slots_factory in cases:
+        dict_size = _measure(dict_factory, count)
+        slots_size = _measure(slots_factory, count)
+        print('{}: legacy {:.1f} MB, current {:.1f} MB, '
+              'saved {:.0f} bytes/object ({:.0f}%)'.format(
+                  name, dict_size / 1e6, slots_size / 1e6,
+                  (dict_size - slots_size) / count,
+                  100 * (dict_size - slots_size) / dict_size))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
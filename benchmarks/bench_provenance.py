@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""Benchmark of the provenance index queries.
+
+Build the provenance index of a synthetic experiment with N raw data and a
+pipeline of D stages (one output per input at each stage), then time the
+descendants of one raw data, of 1% of the raw data and of all the raw data
+(the stale outputs after the raw data changed), and the ancestors of the
+last stage outputs. The index is built in memory, the file is not written
+
+Usage
+-----
+    python -m benchmarks.bench_provenance [N] [D]
+
+"""
+
+import sys
+import time
+import uuid
+
+from scixtracer.provenance import ProvenanceIndex
+
+
+def build_index(raw, depth):
+    index = ProvenanceIndex('experiment')
+    inputs = [str(uuid.uuid4()) for _ in range(raw)]
+    for i, uuid_ in enumerate(inputs):
+        index._add({'uuid': uuid_, 'type': 'raw',
+                    'url': 'data/{:06d}.md.json'.format(i)})
+    raw_uuids = inputs
+    for stage in range(depth):
+        run = str(uuid.uuid4())
+        index._add({'uuid': run, 'type': 'run',
+                    'url': 'stage{}/run.md.json'.format(stage)})
+        outputs = []
+        for i, input_ in enumerate(inputs):
+            uuid_ = str(uuid.uuid4())
+            index._add({'uuid': uuid_, 'type': 'processed',
+                        'url': 'stage{}/{:06d}.md.json'.format(stage, i),
+                        'run': run, 'inputs': [input_]})
+            outputs.append(uuid_)
+        inputs = outputs
+    return index, raw_uuids, inputs
+
+
+def _time(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, len(result)
+
+
+def main(raw, depth):
+    start = time.perf_counter()
+    index, raw_uuids, last = build_index(raw, depth)
+    print('index of {} nodes built in {:.2f} s'.format(
+        len(index.nodes), time.perf_counter() - start))
+    cases = [
+        ('descendants of 1 raw data', lambda: index.descendants(
+            raw_uuids[:1])),
+        ('descendants of 1% raw data', lambda: index.descendants(
+            raw_uuids[:max(1, raw // 100)])),
+        ('descendants of all raw data', lambda: index.descendants(
+            raw_uuids)),
+        ('ancestors of 1 output', lambda: index.ancestors(last[:1])),
+    ]
+    for name, func in cases:
+        seconds, size = _time(func)
+        print('{}: {} data in {:.4f} s'.format(name, size, seconds))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 10)
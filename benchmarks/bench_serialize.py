@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""Benchmark of the container serializers.
+
+Time the text serialization of a dataset of N uris with the previous string
+concatenation implementation and with the current serialize_dataset, the
+JSON export of the dataset (to_json) and the NDJSON export of N raw data
+(write_ndjson). The containers are built in memory, the NDJSON is written to
+os.devnull
+
+Usage
+-----
+    python -m benchmarks.bench_serialize [N] [REPEAT]
+
+"""
+
+import os
+import sys
+import time
+
+from scixtracer.containers import Container, Dataset, RawData
+from scixtracer.serialize import serialize_dataset, write_ndjson
+
+
+def legacy_serialize_dataset(dataset):
+    """serialize_dataset before the export layer (string concatenation)"""
+    content = 'Dataset:\n'
+    content += 'name = ' + dataset.name
+    content += 'uris = [\n'
+    for uri in dataset.uris:
+        content += '\t{\n'
+        content += '\t\tuuid: ' + uri.uuid + ',\n'
+        content += '\t\turl: ' + uri.md_uri + ',\n'
+        content += '\t}\n'
+    content += ']\n'
+    return content
+
+
+def build_dataset(size):
+    dataset = Dataset()
+    dataset.name = 'data'
+    dataset.uris = [Container('/workspace/experiment/data/'
+                              'population1_{:06d}.md.json'.format(i),
+                              '{:032x}'.format(i))
+                    for i in range(size)]
+    return dataset
+
+
+def build_rawdata(size):
+    data_list = []
+    for i in range(size):
+        data = RawData()
+        data.uuid = '{:032x}'.format(i)
+        data.md_uri = '/workspace/experiment/data/' \
+                      'population1_{:06d}.md.json'.format(i)
+        data.name = 'population1_{:06d}.tif'.format(i)
+        data.author = 'benchmark'
+        data.date = '2021-03-17'
+        data.format = 'tif'
+        data.uri = '/workspace/experiment/data/' \
+                   'population1_{:06d}.tif'.format(i)
+        data.tags = {'Population': 'population1', 'ID': str(i)}
+        data_list.append(data)
+    return data_list
+
+
+def _best(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main(size, repeat):
+    dataset = build_dataset(size)
+    data_list = build_rawdata(size)
+    assert legacy_serialize_dataset(dataset) == serialize_dataset(dataset)
+
+    def ndjson():
+        with open(os.devnull, 'w') as out_file:
+            write_ndjson((data.to_dict() for data in data_list), out_file)
+
+    cases = [
+        ('serialize_dataset (concatenation)',
+         lambda: legacy_serialize_dataset(dataset)),
+        ('serialize_dataset', lambda: serialize_dataset(dataset)),
+        ('Dataset.to_json', dataset.to_json),
+        ('write_ndjson of the raw data', ndjson),
+    ]
+    print('{} uris, best of {}'.format(size, repeat))
+    for name, func in cases:
+        print('{:<36} {:.4f} s'.format(name, _best(func, repeat)))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 5)
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""Synthetic experiment generator for the benchmarks.
+
+Create an experiment at a realistic scale: N raw data tagged with
+configurable tag cardinalities, and processed datasets organized in
+pipelines of a given depth (each stage processes the outputs of the
+previous stage, one output per input)
+
+Usage
+-----
+    python -m benchmarks.generator WORKSPACE [--raw N] [--pipelines P]
+                                             [--depth D]
+
+Methods
+-------
+write_raw_files
+generate_experiment
+
+"""
+
+import os
+import sys
+import argparse
+
+from scixtracer import Request, Run, ProcessedData
+
+
+def tag_values(tags: dict) -> dict:
+    """Build the tag values from the tag cardinalities
+
+    Parameters
+    ----------
+    tags: dict
+        {tag key: number of values} (ex: {'Population': 4})
+
+    Returns
+    -------
+    dict
+        {tag key: [values]} (ex: {'Population': ['population0', ...]})
+    """
+    return {key: ['{}{}'.format(key.lower(), i) for i in range(number)]
+            for key, number in tags.items()}
+
+
+def write_raw_files(directory: str, raw: int, tags: dict,
+                    extension='tif') -> list:
+    """Write the raw data files to import
+
+    The tag values are encoded in the file names, separated by '_', so
+    that the data can be tagged with tag_from_name or tag_using_separator
+
+    Parameters
+    ----------
+    directory: str
+        Directory where the files are written
+    raw: int
+        Number of files
+    tags: dict
+        {tag key: number of values}
+    extension: str
+        Extension of the files
+
+    Returns
+    -------
+    list
+        The names of the written files
+    """
+    os.makedirs(directory, exist_ok=True)
+    values = tag_values(tags)
+    names = []
+    for i in range(raw):
+        parts = [values[key][i % len(values[key])] for key in values]
+        name = '_'.join(parts + ['{:06d}.{}'.format(i, extension)])
+        with open(os.path.join(directory, name), 'wb') as data_file:
+            data_file.write(name.encode('utf-8'))
+        names.append(name)
+    return names
+
+
+def stage_name(pipeline: int, stage: int) -> str:
+    """Name of the processed dataset of a pipeline stage"""
+    return 'pipeline{}_stage{}'.format(pipeline, stage)
+
+
+def _process(data, label):
+    processed_data = ProcessedData()
+    processed_data.set_info(name='o_' + data.name, author='benchmark',
+                            date='now', format_='tif',
+                            url='o_' + data.name)
+    processed_data.add_input(id='i', data=data)
+    processed_data.set_output(id='o', label=label)
+    return processed_data
+
+
+def generate_experiment(workspace: str, raw=1000, tags=None, pipelines=1,
+                        depth=1, name='experiment', request=None):
+    """Generate a synthetic experiment
+
+    Parameters
+    ----------
+    workspace: str
+        Directory where the experiment is created
+    raw: int
+        Number of raw data
+    tags: dict
+        {tag key: number of values}. Default is {'Population': 4, 'Well': 8}
+    pipelines: int
+        Number of processing pipelines
+    depth: int
+        Number of processed datasets (stages) per pipeline
+    name: str
+        Name of the experiment
+    request: Request
+        Request used to create the experiment
+
+    Returns
+    -------
+    Experiment
+        The generated experiment
+    """
+    if tags is None:
+        tags = {'Population': 4, 'Well': 8}
+    request = request or Request()
+    source_dir = os.path.join(workspace, name + '_source')
+    write_raw_files(source_dir, raw, tags)
+
+    experiment = request.create_experiment(name, 'benchmark', date='now',
+                                           tag_keys=[], destination=workspace)
+    request.import_dir(experiment, source_dir, filter_=r'\.tif$',
+                       author='benchmark', format_='tif', date='now',
+                       copy_data=True)
+    for position, key in enumerate(tags):
+        request.tag_using_separator(experiment, key, '_', position)
+
+    for pipeline in range(pipelines):
+        input_dataset = request.get_rawdataset(experiment)
+        input_name = 'data'
+        for stage in range(depth):
+            dataset = request.create_dataset(experiment,
+                                             stage_name(pipeline, stage))
+            run_info = Run()
+            run_info.set_process(name='process{}'.format(stage),
+                                 uri='benchmark.process{}'.format(stage))
+            run_info.add_input(name='i', dataset=input_name)
+            request.create_run(dataset, run_info)
+            label = 'stage {}'.format(stage)
+            processed_list = [_process(data, label) for data in
+                              request.get_data(input_dataset)]
+            request.create_data_many(dataset, run_info, processed_list)
+            input_dataset = request.get_dataset(experiment, dataset.name)
+            input_name = dataset.name
+    return request.get_experiment(experiment.md_uri)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks.generator',
+        description='Generate a synthetic experiment')
+    parser.add_argument('workspace')
+    parser.add_argument('--name', default='experiment')
+    parser.add_argument('--raw', type=int, default=1000)
+    parser.add_argument('--populations', type=int, default=4)
+    parser.add_argument('--wells', type=int, default=8)
+    parser.add_argument('--pipelines', type=int, default=1)
+    parser.add_argument('--depth', type=int, default=1)
+    args = parser.parse_args(argv)
+    experiment = generate_experiment(
+        args.workspace, raw=args.raw,
+        tags={'Population': args.populations, 'Well': args.wells},
+        pipelines=args.pipelines, depth=args.depth, name=args.name)
+    print(experiment.md_uri)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
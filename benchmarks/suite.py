@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+"""Benchmark suite of the local request service.
+
+Time the main Request operations on a synthetic experiment (see generator):
+import_dir, tag_from_name, get_experiment, get_data on the raw dataset and
+on the last stage of a processing pipeline, workspace experiments and
+create_data. The results are written as JSON with the commit and the
+parameters so that two runs can be compared
+
+Usage
+-----
+    python -m benchmarks.suite [--raw N] [--depth D] [--repeat R]
+                               [--output results.json]
+    python -m benchmarks.suite --compare before.json after.json
+
+Methods
+-------
+run_suite
+compare
+
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import subprocess
+
+from scixtracer import Request, Run, ProcessedData
+
+from .generator import (write_raw_files, tag_values, generate_experiment,
+                        stage_name)
+
+
+def _timed(func) -> float:
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def _new_experiment(request, workspace, name, source_dir):
+    experiment = request.create_experiment(name, 'benchmark', date='now',
+                                           tag_keys=[], destination=workspace)
+    return experiment, lambda: request.import_dir(
+        experiment, source_dir, filter_=r'\.tif$', author='benchmark',
+        format_='tif', date='now', copy_data=False)
+
+
+def bench_import_dir(request, context, repeat):
+    times = []
+    for i in range(repeat):
+        _, import_dir = _new_experiment(request, context['workspace'],
+                                        'import{}'.format(i),
+                                        context['source_dir'])
+        times.append(_timed(import_dir))
+    return times
+
+
+def bench_tag_from_name(request, context, repeat):
+    times = []
+    values = tag_values(context['tags'])
+    key = list(values)[0]
+    for i in range(repeat):
+        experiment, import_dir = _new_experiment(
+            request, context['workspace'], 'tag{}'.format(i),
+            context['source_dir'])
+        import_dir()
+        times.append(_timed(
+            lambda: request.tag_from_name(experiment, key, values[key])))
+    return times
+
+
+def bench_get_experiment(request, context, repeat):
+    md_uri = context['experiment'].md_uri
+    return [_timed(lambda: request.get_experiment(md_uri))
+            for _ in range(repeat)]
+
+
+def bench_get_data_raw(request, context, repeat):
+    dataset = request.get_rawdataset(context['experiment'])
+    query = context['query']
+    return [_timed(lambda: request.get_data(dataset, query))
+            for _ in range(repeat)]
+
+
+def bench_get_data_processed(request, context, repeat):
+    dataset = request.get_dataset(
+        context['experiment'], stage_name(0, context['depth'] - 1))
+    query = context['query']
+    return [_timed(lambda: request.get_data(dataset, query))
+            for _ in range(repeat)]
+
+
+def bench_workspace_experiments(request, context, repeat):
+    workspace = context['workspace']
+    return [_timed(lambda: request.experiments(workspace))
+            for _ in range(repeat)]
+
+
+def bench_create_data(request, context, repeat):
+    raw_data = request.get_data(
+        request.get_rawdataset(context['experiment']))
+    times = []
+    for i in range(repeat):
+        dataset = request.create_dataset(context['experiment'],
+                                         'create{}'.format(i))
+        run_info = Run()
+        run_info.set_process(name='create', uri='benchmark.create')
+        run_info.add_input(name='i', dataset='data')
+        request.create_run(dataset, run_info)
+
+        def create():
+            for data in raw_data:
+                processed_data = ProcessedData()
+                processed_data.set_info(name='o_' + data.name,
+                                        author='benchmark', date='now',
+                                        format_='tif', url='o_' + data.name)
+                processed_data.add_input(id='i', data=data)
+                processed_data.set_output(id='o', label='create')
+                request.create_data(dataset, run_info, processed_data)
+        times.append(_timed(create))
+    return times
+
+
+BENCHMARKS = [
+    ('import_dir', bench_import_dir),
+    ('tag_from_name', bench_tag_from_name),
+    ('get_experiment', bench_get_experiment),
+    ('get_data_raw', bench_get_data_raw),
+    ('get_data_processed', bench_get_data_processed),
+    ('workspace_experiments', bench_workspace_experiments),
+    ('create_data', bench_create_data),
+]
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+            text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except OSError:
+        return ''
+
+
+def run_suite(raw=1000, tags=None, pipelines=1, depth=3, repeat=3,
+              names=None) -> dict:
+    """Run the benchmarks on a synthetic experiment
+
+    Parameters
+    ----------
+    raw: int
+        Number of raw data of the experiment
+    tags: dict
+        {tag key: number of values}. Default is {'Population': 4, 'Well': 8}
+    pipelines: int
+        Number of processing pipelines
+    depth: int
+        Number of stages per pipeline
+    repeat: int
+        Number of timed repetitions of each benchmark
+    names: list
+        Names of the benchmarks to run. Default is all
+
+    Returns
+    -------
+    dict
+        The results: commit, parameters and {benchmark: statistics}
+    """
+    if tags is None:
+        tags = {'Population': 4, 'Well': 8}
+    request = Request()
+    results = dict()
+    with tempfile.TemporaryDirectory() as workspace:
+        context = {
+            'workspace': workspace,
+            'tags': tags,
+            'depth': depth,
+            'query': '{}={}'.format(list(tags)[0],
+                                    tag_values(tags)[list(tags)[0]][0]),
+            'source_dir': os.path.join(workspace, 'source'),
+            'experiment': generate_experiment(
+                workspace, raw=raw, tags=tags, pipelines=pipelines,
+                depth=depth, request=request)
+        }
+        write_raw_files(context['source_dir'], raw, tags)
+        for name, bench in BENCHMARKS:
+            if names and name not in names:
+                continue
+            times = bench(request, context, repeat)
+            results[name] = {'min': min(times),
+                             'mean': sum(times) / len(times),
+                             'max': max(times), 'repeat': len(times)}
+    return {
+        'commit': _commit(),
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'parameters': {'raw': raw, 'tags': tags, 'pipelines': pipelines,
+                       'depth': depth, 'repeat': repeat},
+        'results': results
+    }
+
+
+def compare(before: dict, after: dict) -> str:
+    """Format the ratio of the min times of two result sets
+
+    Parameters
+    ----------
+    before: dict
+        Reference results
+    after: dict
+        New results
+
+    Returns
+    -------
+    str
+        One line per benchmark with the times and the ratio after/before
+    """
+    lines = ['{:<24} {:>12} {:>12} {:>8}'.format(
+        'benchmark', before.get('commit', 'before'),
+        after.get('commit', 'after'), 'ratio')]
+    for name, stats in after['results'].items():
+        if name not in before['results']:
+            continue
+        reference = before['results'][name]['min']
+        lines.append('{:<24} {:>12.4f} {:>12.4f} {:>8.2f}'.format(
+            name, reference, stats['min'],
+            stats['min'] / reference if reference > 0 else float('nan')))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks.suite',
+        description='Benchmark the local request service')
+    parser.add_argument('--raw', type=int, default=1000)
+    parser.add_argument('--populations', type=int, default=4)
+    parser.add_argument('--wells', type=int, default=8)
+    parser.add_argument('--pipelines', type=int, default=1)
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--bench', nargs='*', help='benchmarks to run')
+    parser.add_argument('--output', help='JSON file of the results')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'),
+                        help='compare two JSON result files')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0]) as before_file, \
+                open(args.compare[1]) as after_file:
+            print(compare(json.load(before_file), json.load(after_file)))
+        return
+    results = run_suite(raw=args.raw,
+                        tags={'Population': args.populations,
+                              'Well': args.wells},
+                        pipelines=args.pipelines, depth=args.depth,
+                        repeat=args.repeat, names=args.bench)
+    for name, stats in results['results'].items():
+        print('{:<24} min {:.4f} s  mean {:.4f} s'.format(
+            name, stats['min'], stats['mean']))
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(results, output_file, indent=4)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+"""SciXtracerPy I/O accounting.
+
+Count the file system operations (opens, reads, writes, stats, directory
+listings and bytes) made by the Request calls. It is meant for regression
+tests of the I/O complexity of the requests:
+
+Example
+-------
+    >>> from scixtracer.accounting import io_accounting
+    >>> with io_accounting() as account:
+    >>>     req.get_data(dataset, 'Population=population1')
+    >>> assert account.calls['get_data'].opens <= dataset.size() + 1
+
+While an account is active, builtins.open, os.stat, os.lstat, os.listdir
+and os.scandir are replaced by counting wrappers and the public methods of
+Request record the operations they make. The operations are attributed to
+the outermost Request call of the thread. The accounting is process wide
+and is not meant to be used in production
+
+Classes
+-------
+IOCounts
+IOAccount
+
+Methods
+-------
+io_accounting
+
+"""
+
+import os
+import builtins
+import functools
+import threading
+import inspect
+from contextlib import contextmanager
+
+
+_FIELDS = ('opens', 'reads', 'writes', 'stats', 'listdirs', 'bytes_read',
+           'bytes_written')
+
+_lock = threading.Lock()
+_accounts = []
+_originals = dict()
+_context = threading.local()
+
+
+class IOCounts:
+    """Counts of the file system operations
+
+    Attributes
+    ----------
+    calls: int
+        Number of calls the operations are counted for
+    opens: int
+        Number of opened files
+    reads: int
+        Number of read calls on the opened files
+    writes: int
+        Number of write calls on the opened files
+    stats: int
+        Number of stat calls (os.path.isfile, exists, getsize...)
+    listdirs: int
+        Number of directory listings
+    bytes_read: int
+        Number of bytes read
+    bytes_written: int
+        Number of bytes written
+    """
+
+    __slots__ = ('calls',) + _FIELDS
+
+    def __init__(self):
+        self.calls = 0
+        for field in _FIELDS:
+            setattr(self, field, 0)
+
+    def to_dict(self) -> dict:
+        return {field: getattr(self, field)
+                for field in ('calls',) + _FIELDS}
+
+    def __repr__(self):
+        return 'IOCounts({})'.format(', '.join(
+            '{}={}'.format(key, value)
+            for key, value in self.to_dict().items()))
+
+
+class IOAccount:
+    """File system operations recorded by io_accounting
+
+    Attributes
+    ----------
+    total: IOCounts
+        All the operations made while the account was active
+    calls: dict
+        {Request method name: IOCounts} of the operations made by the
+        Request calls. calls['get_data'].calls is the number of calls
+    """
+
+    def __init__(self):
+        self.total = IOCounts()
+        self.calls = dict()
+
+    def _add(self, method, field, value):
+        setattr(self.total, field, getattr(self.total, field) + value)
+        if method is not None:
+            counts = self.calls.get(method)
+            if counts is None:
+                counts = self.calls[method] = IOCounts()
+            setattr(counts, field, getattr(counts, field) + value)
+
+    def _call(self, method):
+        counts = self.calls.get(method)
+        if counts is None:
+            counts = self.calls[method] = IOCounts()
+        counts.calls += 1
+
+    def summary(self) -> str:
+        """Format the counts as a table"""
+        lines = ['{:<28} {:>6}'.format('call', 'calls') +
+                 ''.join(' {:>13}'.format(field) for field in _FIELDS)]
+        rows = sorted(self.calls.items()) + [('total', self.total)]
+        for name, counts in rows:
+            lines.append('{:<28} {:>6}'.format(name, counts.calls) + ''.join(
+                ' {:>13}'.format(getattr(counts, field))
+                for field in _FIELDS))
+        return '\n'.join(lines)
+
+
+def _record(field, value=1):
+    method = getattr(_context, 'method', None)
+    with _lock:
+        for account in _accounts:
+            account._add(method, field, value)
+
+
+class _CountingFile:
+    """Proxy of a file object counting the reads and the writes"""
+
+    def __init__(self, file):
+        self._file = file
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+    def __enter__(self):
+        self._file.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return self._file.__exit__(exc_type, exc_value, traceback)
+
+    def __iter__(self):
+        for line in self._file:
+            _record('reads')
+            _record('bytes_read', len(line))
+            yield line
+
+    def _read(self, method, *args):
+        data = method(*args)
+        _record('reads')
+        _record('bytes_read', len(data))
+        return data
+
+    def read(self, *args):
+        return self._read(self._file.read, *args)
+
+    def readline(self, *args):
+        return self._read(self._file.readline, *args)
+
+    def readinto(self, buffer):
+        size = self._file.readinto(buffer)
+        _record('reads')
+        _record('bytes_read', size or 0)
+        return size
+
+    def write(self, data):
+        size = self._file.write(data)
+        _record('writes')
+        _record('bytes_written', len(data) if size is None else size)
+        return size
+
+
+def _open(*args, **kwargs):
+    file = _originals['open'](*args, **kwargs)
+    _record('opens')
+    return _CountingFile(file)
+
+
+def _counting(name, field):
+    original = _originals[name]
+
+    @functools.wraps(original)
+    def wrapper(*args, **kwargs):
+        _record(field)
+        return original(*args, **kwargs)
+    return wrapper
+
+
+def _request_method(name, func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if getattr(_context, 'method', None) is not None:
+            return func(*args, **kwargs)
+        _context.method = name
+        with _lock:
+            for account in _accounts:
+                account._call(name)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _context.method = None
+    return wrapper
+
+
+def _install():
+    from .request import Request
+
+    _originals['open'] = builtins.open
+    _originals['stat'] = os.stat
+    _originals['lstat'] = os.lstat
+    _originals['listdir'] = os.listdir
+    _originals['scandir'] = os.scandir
+    builtins.open = _open
+    os.stat = _counting('stat', 'stats')
+    os.lstat = _counting('lstat', 'stats')
+    os.listdir = _counting('listdir', 'listdirs')
+    os.scandir = _counting('scandir', 'listdirs')
+
+    methods = dict()
+    for name, func in vars(Request).items():
+        # generators and context managers return before doing their I/O
+        if (name.startswith('_') or not inspect.isfunction(func) or
+                inspect.isgeneratorfunction(func) or
+                hasattr(func, '__wrapped__')):
+            continue
+        methods[name] = func
+        setattr(Request, name, _request_method(name, func))
+    _originals['methods'] = methods
+
+
+def _uninstall():
+    from .request import Request
+
+    builtins.open = _originals['open']
+    os.stat = _originals['stat']
+    os.lstat = _originals['lstat']
+    os.listdir = _originals['listdir']
+    os.scandir = _originals['scandir']
+    for name, func in _originals['methods'].items():
+        setattr(Request, name, func)
+    _originals.clear()
+
+
+@contextmanager
+def io_accounting():
+    """Count the file system operations made in a context
+
+    The accounts can be nested
+
+    Returns
+    -------
+    IOAccount
+        The account filled while the context is active
+    """
+    account = IOAccount()
+    with _lock:
+        if len(_accounts) == 0:
+            _install()
+        _accounts.append(account)
+    try:
+        yield account
+    finally:
+        with _lock:
+            _accounts.remove(account)
+            if len(_accounts) == 0:
+                _uninstall()
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""SciXtracerPy metadata codecs.
+
+Codecs used by the local request service to encode the metadata files. The
+default codec is indented JSON. MessagePack is available when the optional
+msgpack package is installed. The codec of a file is detected from its
+content when it is read
+
+Classes
+-------
+JsonCodec
+MsgpackCodec
+
+Methods
+-------
+get_codec
+detect_codec
+
+"""
+
+import json
+
+from .utils import SciXtracerError
+
+
+class JsonCodec:
+    """Indented JSON codec"""
+
+    name = 'json'
+
+    @staticmethod
+    def encode(metadata: dict) -> bytes:
+        return json.dumps(metadata, indent=4).encode('utf-8')
+
+    @staticmethod
+    def decode(content: bytes) -> dict:
+        return json.loads(content)
+
+
+class MsgpackCodec:
+    """MessagePack binary codec
+
+    Requires the msgpack package
+    """
+
+    name = 'msgpack'
+
+    @staticmethod
+    def _msgpack():
+        try:
+            import msgpack
+        except ImportError:
+            raise SciXtracerError('The msgpack metadata format requires the '
+                                  'msgpack package')
+        return msgpack
+
+    def encode(self, metadata: dict) -> bytes:
+        return self._msgpack().packb(metadata, use_bin_type=True)
+
+    def decode(self, content: bytes) -> dict:
+        return self._msgpack().unpackb(content, raw=False)
+
+
+_CODECS = {JsonCodec.name: JsonCodec(), MsgpackCodec.name: MsgpackCodec()}
+
+
+def get_codec(name: str):
+    """Get a codec from its name
+
+    Parameters
+    ----------
+    name: str
+        Name of the codec ('json' or 'msgpack')
+
+    Returns
+    -------
+    The codec object
+
+    Raises
+    ------
+    SciXtracerError: if the codec does not exists
+
+    """
+    if name in _CODECS:
+        return _CODECS[name]
+    raise SciXtracerError('Unknown metadata format: ' + name)
+
+
+def detect_codec(content: bytes):
+    """Detect the codec of encoded metadata
+
+    JSON metadata start with '{' (after optional white spaces). Any other
+    content is considered as MessagePack
+
+    Parameters
+    ----------
+    content: bytes
+        Content of a metadata file
+
+    Returns
+    -------
+    The codec object
+    """
+    if content.lstrip()[:1] in (b'{', b'['):
+        return _CODECS[JsonCodec.name]
+    return _CODECS[MsgpackCodec.name]
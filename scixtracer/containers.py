@@ -15,6 +15,10 @@ Run
 
 """
 
+import sys
+import json
+import hashlib
+
 from .utils import format_date
 
 
@@ -28,6 +32,29 @@ def METADATA_TYPE_PROCESSED():
     return "processed"
 
 
+def split_uri(uri):
+    """Split a URI into a shared directory prefix and a file suffix
+
+    The prefix is interned so that all the URIs of the same directory share a
+    single prefix string in memory
+
+    Parameters
+    ----------
+    uri: str
+        URI to split
+
+    Returns
+    -------
+    tuple
+        (prefix, suffix) where prefix + suffix == uri
+    """
+
+    if not isinstance(uri, str):
+        return '', uri
+    pos = max(uri.rfind('/'), uri.rfind('\\')) + 1
+    return sys.intern(uri[:pos]), uri[pos:]
+
+
 class Container:
     """Interface fo all scixtracer containers
 
@@ -41,10 +68,44 @@ class Container:
     uuid: str
         Unique identifier of the metadata
     """
+
+    __slots__ = ('_md_uri_prefix', '_md_uri_suffix', 'uuid')
+
     def __init__(self, md_uri='', uuid=''):
         self.md_uri = md_uri
         self.uuid = uuid
 
+    @property
+    def md_uri(self):
+        if self._md_uri_prefix == '':
+            return self._md_uri_suffix
+        return self._md_uri_prefix + self._md_uri_suffix
+
+    @md_uri.setter
+    def md_uri(self, value):
+        self._md_uri_prefix, self._md_uri_suffix = split_uri(value)
+
+    def to_dict(self) -> dict:
+        """Export the container to a dictionary of JSON types"""
+        return {'md_uri': self.md_uri, 'uuid': self.uuid}
+
+    def to_json(self, **kwargs) -> str:
+        """Export the container to a JSON string
+
+        Parameters
+        ----------
+        kwargs
+            Arguments of json.dumps (ex: indent=4)
+        """
+        return json.dumps(self.to_dict(), **kwargs)
+
+
+def _container_dict(container):
+    """Export an optional Container reference to a dictionary"""
+    if container is None:
+        return None
+    return {'md_uri': container.md_uri, 'uuid': container.uuid}
+
 
 class Data(Container):
     """Interface for data container
@@ -66,6 +127,9 @@ class Data(Container):
 
     """
 
+    __slots__ = ('name', 'author', 'date', 'format', '_uri_prefix',
+                 '_uri_suffix', 'type')
+
     def __init__(self):
         Container.__init__(self)
         self.name = ''
@@ -75,6 +139,22 @@ class Data(Container):
         self.uri = ''
         self.type = ''
 
+    @property
+    def uri(self):
+        if self._uri_prefix == '':
+            return self._uri_suffix
+        return self._uri_prefix + self._uri_suffix
+
+    @uri.setter
+    def uri(self, value):
+        self._uri_prefix, self._uri_suffix = split_uri(value)
+
+    def to_dict(self) -> dict:
+        content = Container.to_dict(self)
+        content.update(type=self.type, name=self.name, author=self.author,
+                       date=self.date, format=self.format, uri=self.uri)
+        return content
+
 
 class RawData(Data):
     """Container for a Raw data
@@ -83,17 +163,30 @@ class RawData(Data):
     ----------
     tags
         Dictionary containing the tags (key=value)
+    file_info
+        Dictionary with the information recorded about the data file when
+        it was imported: 'size', 'mtime_ns' and optionally 'hash'
+        (ex: 'blake2b:...'). None if nothing was recorded
 
     """
 
+    __slots__ = ('tags', 'file_info')
+
     def __init__(self):
         Data.__init__(self)
         self.tags = dict()
+        self.file_info = None
         self.type = 'raw'
 
     def set_tag(self, key, value):
         self.tags[key] = value
 
+    def to_dict(self) -> dict:
+        content = Data.to_dict(self)
+        content['tags'] = dict(self.tags)
+        content['file_info'] = dict(self.file_info or {})
+        return content
+
 
 class ProcessedDataInputContainer:
     """Container for processed data origin input
@@ -106,6 +199,8 @@ class ProcessedDataInputContainer:
         The uri of the input metadata
     """
 
+    __slots__ = ('name', 'uri', 'uuid', 'type')
+
     def __init__(self, name: str = '', uri: str = '', uuid: str = '',
                  type_: str = METADATA_TYPE_RAW()):
         self.name = name
@@ -113,6 +208,10 @@ class ProcessedDataInputContainer:
         self.uuid = uuid
         self.type = type_
 
+    def to_dict(self) -> dict:
+        return {'name': self.name, 'uri': self.uri, 'uuid': self.uuid,
+                'type': self.type}
+
 
 class ProcessedData(Data):
     """Container for processed data
@@ -128,14 +227,23 @@ class ProcessedData(Data):
         Information about how the output is referenced
         in the process that generates this processed data
         ex: {"name": "o", "label": "Processed image"}
+    origin_uuid
+        uuid of the origin raw data when its tags are snapshotted
+    origin_tags
+        Snapshot of the tags of the origin raw data, or None if the tags are
+        not snapshotted (they are then read from the origin raw data)
 
     """
 
+    __slots__ = ('run', 'inputs', 'output', 'origin_uuid', 'origin_tags')
+
     def __init__(self):
         Data.__init__(self)
         self.run = None # Container
         self.inputs = list()
         self.output = dict()
+        self.origin_uuid = ''
+        self.origin_tags = None
         self.type = 'processed'
 
     def set_info(self, name='', author='', date='', format_='', url=''):
@@ -157,6 +265,16 @@ class ProcessedData(Data):
     def set_output(self, id: str, label: str):
         self.output = {'name': id, 'label': label}
 
+    def to_dict(self) -> dict:
+        content = Data.to_dict(self)
+        content['run'] = _container_dict(self.run)
+        content['inputs'] = [input_.to_dict() for input_ in self.inputs]
+        content['output'] = dict(self.output)
+        content['origin_uuid'] = self.origin_uuid
+        content['origin_tags'] = None if self.origin_tags is None \
+            else dict(self.origin_tags)
+        return content
+
 
 class Dataset(Container):
     """Container for a dataset metadata
@@ -169,6 +287,8 @@ class Dataset(Container):
         List of the URIs of the data (metadata) in the URIs
     """
 
+    __slots__ = ('name', 'uris')
+
     def __init__(self):
         Container.__init__(self)
         self.name = ''
@@ -177,6 +297,13 @@ class Dataset(Container):
     def size(self):
         return len(self.uris)
 
+    def to_dict(self) -> dict:
+        content = Container.to_dict(self)
+        content['name'] = self.name
+        content['uris'] = [{'md_uri': uri.md_uri, 'uuid': uri.uuid}
+                           for uri in self.uris]
+        return content
+
 
 class RunParameterContainer:
     """Container for a run parameter
@@ -189,10 +316,15 @@ class RunParameterContainer:
         Value of the parameter
     """
 
+    __slots__ = ('name', 'value')
+
     def __init__(self, name: str = '', value: str = ''):
         self.name = name
         self.value = value
 
+    def to_dict(self) -> dict:
+        return {'name': self.name, 'value': self.value}
+
 
 class RunInputContainer:
     """Container for a run input
@@ -209,6 +341,9 @@ class RunInputContainer:
         Name of the output in the parent run if run on a processed dataset
 
     """
+
+    __slots__ = ('name', 'dataset', 'query', 'origin_output_name')
+
     def __init__(
         self,
         name: str = '',
@@ -221,6 +356,11 @@ class RunInputContainer:
         self.query = query
         self.origin_output_name = origin_output_name
 
+    def to_dict(self) -> dict:
+        return {'name': self.name, 'dataset': self.dataset,
+                'query': self.query,
+                'origin_output_name': self.origin_output_name}
+
 
 class Run(Container):
     """Container for a run (processing or job execution)
@@ -240,6 +380,9 @@ class Run(Container):
 
     """
 
+    __slots__ = ('process_name', 'process_uri', 'processeddataset',
+                 'parameters', 'inputs')
+
     def __init__(self):
         Container.__init__(self)
         self.process_name = ''
@@ -268,6 +411,39 @@ class Run(Container):
         self.inputs.append(RunInputContainer(name, dataset, query,
                                              origin_output_name))
 
+    def fingerprint(self):
+        """Compute the fingerprint of the run
+
+        Two runs with the same process URI, parameters and inputs have the
+        same fingerprint. The order of the parameters does not matter
+
+        Returns
+        -------
+        str
+            Hexadecimal SHA-256 hash of the run definition
+        """
+
+        definition = {
+            'process': self.process_uri,
+            'parameters': sorted([parameter.name, str(parameter.value)]
+                                 for parameter in self.parameters),
+            'inputs': [[input_.name, input_.dataset, input_.query,
+                        input_.origin_output_name]
+                       for input_ in self.inputs]
+        }
+        content = json.dumps(definition, sort_keys=True).encode('utf-8')
+        return hashlib.sha256(content).hexdigest()
+
+    def to_dict(self) -> dict:
+        content = Container.to_dict(self)
+        content['process_name'] = self.process_name
+        content['process_uri'] = self.process_uri
+        content['processeddataset'] = _container_dict(self.processeddataset)
+        content['parameters'] = [parameter.to_dict()
+                                 for parameter in self.parameters]
+        content['inputs'] = [input_.to_dict() for input_ in self.inputs]
+        return content
+
 
 class DatasetInfo:
     """Contains the info of a dataset
@@ -281,11 +457,17 @@ class DatasetInfo:
     uuid: str
         Unique ID of the dataset
     """
+
+    __slots__ = ('name', 'url', 'uuid')
+
     def __init__(self, name, url, uuid):
         self.name = name
         self.url = url
         self.uuid = uuid
 
+    def to_dict(self) -> dict:
+        return {'name': self.name, 'url': self.url, 'uuid': self.uuid}
+
 
 class Experiment(Container):
     """Container for an experiment
@@ -304,9 +486,15 @@ class Experiment(Container):
         URIs of the processed datasets
     tag_keys
         List of vocabulary keys used in the experiment
+    metadata_format
+        Codec used to store the metadata of the experiment data ('json' or
+        'msgpack')
 
     """
 
+    __slots__ = ('name', 'author', 'date', 'rawdataset', 'processeddatasets',
+                 'tag_keys', 'metadata_format')
+
     def __init__(self):
         Container.__init__(self)
         self.name = ''
@@ -315,7 +503,21 @@ class Experiment(Container):
         self.rawdataset = None  # DatasetInfo
         self.processeddatasets = []  # list of DatasetInfo
         self.tag_keys = []
+        self.metadata_format = 'json'
 
     def set_tag_key(self, key):
         if key not in self.tag_keys:
             self.tag_keys.append(key)
+
+    def to_dict(self) -> dict:
+        content = Container.to_dict(self)
+        content['name'] = self.name
+        content['author'] = self.author
+        content['date'] = self.date
+        content['rawdataset'] = None if self.rawdataset is None \
+            else self.rawdataset.to_dict()
+        content['processeddatasets'] = [info.to_dict() for info
+                                        in self.processeddatasets]
+        content['tag_keys'] = list(self.tag_keys)
+        content['metadata_format'] = self.metadata_format
+        return content
@@ -0,0 +1,331 @@
+# -*- coding: utf-8 -*-
+"""SciXtracerPy instrumentation.
+
+Opt-in instrumentation of the request services. When enabled, each
+instrumented service method and each metadata file read or write emits a
+span (name, duration, attributes such as the file bytes) and the caches emit
+hit counters. The spans and counters are sent to pluggable sinks. When no
+sink is enabled, an instrumented call only costs a check of the sink list
+
+Example
+-------
+    >>> from scixtracer import instrumentation
+    >>> sink = instrumentation.MemorySink()
+    >>> with instrumentation.record(sink):
+    >>>     req.get_data(dataset, 'Population=population1')
+    >>> print(sink.summary())
+
+Classes
+-------
+Span
+MemorySink
+LoggingSink
+OpenTelemetrySink
+
+Methods
+-------
+enable
+disable
+record
+is_enabled
+span
+instrumented
+count
+
+"""
+
+import time
+import logging
+import functools
+import threading
+import itertools
+from contextlib import contextmanager
+
+
+_sinks = []
+_context = threading.local()
+_span_ids = itertools.count(1)
+
+
+class Span:
+    """A timed operation
+
+    Attributes
+    ----------
+    name: str
+        Name of the operation (ex: 'LocalRequestService.get_rawdata')
+    span_id: int
+        Unique identifier of the span
+    parent_id: int
+        Identifier of the enclosing span, None for a root span
+    start_ns: int
+        Start time in nanoseconds since the epoch
+    duration_ns: int
+        Duration in nanoseconds
+    attributes: dict
+        Attributes of the operation (ex: {'bytes': 356})
+    """
+
+    __slots__ = ('name', 'span_id', 'parent_id', 'start_ns', 'duration_ns',
+                 'attributes', '_start_counter')
+
+    def __init__(self, name, attributes):
+        self.name = name
+        self.span_id = next(_span_ids)
+        self.parent_id = None
+        self.start_ns = 0
+        self.duration_ns = 0
+        self.attributes = attributes
+        self._start_counter = 0
+
+    def set(self, key, value):
+        """Set an attribute of the span"""
+        self.attributes[key] = value
+
+    def __enter__(self):
+        stack = getattr(_context, 'stack', None)
+        if stack is None:
+            stack = _context.stack = []
+        if len(stack) > 0:
+            self.parent_id = stack[-1].span_id
+        stack.append(self)
+        self.start_ns = time.time_ns()
+        self._start_counter = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.duration_ns = time.perf_counter_ns() - self._start_counter
+        if exc_type is not None:
+            self.attributes['error'] = exc_type.__name__
+        _context.stack.pop()
+        for sink in _sinks:
+            sink.record_span(self)
+        return False
+
+
+class _NoopSpan:
+    """Span used when the instrumentation is disabled"""
+
+    __slots__ = ()
+
+    def set(self, key, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def is_enabled() -> bool:
+    """Check if at least one sink is enabled"""
+    return len(_sinks) > 0
+
+
+def enable(sink):
+    """Send the spans and counters to a sink"""
+    if sink not in _sinks:
+        _sinks.append(sink)
+
+
+def disable(sink=None):
+    """Stop sending the spans and counters to a sink (all sinks if None)"""
+    if sink is None:
+        del _sinks[:]
+    elif sink in _sinks:
+        _sinks.remove(sink)
+
+
+@contextmanager
+def record(sink):
+    """Enable a sink in a context"""
+    enable(sink)
+    try:
+        yield sink
+    finally:
+        disable(sink)
+
+
+def span(name, **attributes):
+    """Create a span for an operation
+
+    Parameters
+    ----------
+    name: str
+        Name of the operation
+    attributes
+        Initial attributes of the span
+
+    Returns
+    -------
+    A context manager timing the operation. It is a no-op when the
+    instrumentation is disabled
+    """
+    if not _sinks:
+        return _NOOP_SPAN
+    return Span(name, attributes)
+
+
+def instrumented(func):
+    """Decorator emitting a span for each call of a function
+
+    The span is named with the function qualified name
+    """
+    name = func.__qualname__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _sinks:
+            return func(*args, **kwargs)
+        with Span(name, {}):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def count(name, value=1, **attributes):
+    """Increment a counter (ex: a cache hit)
+
+    Parameters
+    ----------
+    name: str
+        Name of the counter
+    value: int
+        Increment
+    attributes
+        Attributes of the event
+    """
+    for sink in _sinks:
+        sink.record_counter(name, value, attributes)
+
+
+class MemorySink:
+    """Sink aggregating the spans and counters in memory
+
+    Attributes
+    ----------
+    spans: dict
+        {name: {'count', 'total_ns', 'max_ns', 'bytes'}} per span name
+    counters: dict
+        {name: value} per counter name
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.spans = dict()
+        self.counters = dict()
+
+    def record_span(self, span_):
+        with self._lock:
+            stats = self.spans.get(span_.name)
+            if stats is None:
+                stats = self.spans[span_.name] = {'count': 0, 'total_ns': 0,
+                                                  'max_ns': 0, 'bytes': 0}
+            stats['count'] += 1
+            stats['total_ns'] += span_.duration_ns
+            stats['max_ns'] = max(stats['max_ns'], span_.duration_ns)
+            stats['bytes'] += span_.attributes.get('bytes', 0)
+
+    def record_counter(self, name, value, attributes):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def reset(self):
+        """Clear the aggregated values"""
+        with self._lock:
+            self.spans = dict()
+            self.counters = dict()
+
+    def summary(self) -> str:
+        """Format the aggregated values as a table sorted by total time"""
+        lines = ['{:<48} {:>8} {:>12} {:>12} {:>12}'.format(
+            'operation', 'calls', 'total ms', 'mean us', 'bytes')]
+        for name, stats in sorted(self.spans.items(),
+                                  key=lambda item: -item[1]['total_ns']):
+            lines.append('{:<48} {:>8} {:>12.3f} {:>12.1f} {:>12}'.format(
+                name, stats['count'], stats['total_ns'] / 1e6,
+                stats['total_ns'] / 1e3 / stats['count'], stats['bytes']))
+        for name, value in sorted(self.counters.items()):
+            lines.append('{:<48} {:>8}'.format(name, value))
+        return '\n'.join(lines)
+
+
+class LoggingSink:
+    """Sink writing each span and counter to a logger
+
+    Parameters
+    ----------
+    logger: logging.Logger
+        Logger to use. Default is the 'scixtracer' logger
+    level: int
+        Logging level of the messages
+    """
+
+    def __init__(self, logger=None, level=logging.DEBUG):
+        self.logger = logger or logging.getLogger('scixtracer')
+        self.level = level
+
+    def record_span(self, span_):
+        self.logger.log(self.level, '%s %.3f ms %s', span_.name,
+                        span_.duration_ns / 1e6, span_.attributes)
+
+    def record_counter(self, name, value, attributes):
+        self.logger.log(self.level, '%s +%s %s', name, value, attributes)
+
+
+class OpenTelemetrySink:
+    """Sink keeping the spans as OpenTelemetry compatible dictionaries
+
+    The exported dictionaries follow the OTLP span fields (traceId, spanId,
+    parentSpanId, name, startTimeUnixNano, endTimeUnixNano, attributes) so
+    that they can be forwarded to an OpenTelemetry collector
+
+    Parameters
+    ----------
+    trace_id: str
+        Identifier of the trace the spans belong to
+    """
+
+    def __init__(self, trace_id=''):
+        self._lock = threading.Lock()
+        self.trace_id = trace_id
+        self._spans = []
+        self._counters = []
+
+    def record_span(self, span_):
+        data = {
+            'traceId': self.trace_id,
+            'spanId': '{:016x}'.format(span_.span_id),
+            'parentSpanId': '' if span_.parent_id is None
+            else '{:016x}'.format(span_.parent_id),
+            'name': span_.name,
+            'startTimeUnixNano': span_.start_ns,
+            'endTimeUnixNano': span_.start_ns + span_.duration_ns,
+            'attributes': [{'key': key, 'value': value}
+                           for key, value in span_.attributes.items()]
+        }
+        with self._lock:
+            self._spans.append(data)
+
+    def record_counter(self, name, value, attributes):
+        data = {'name': name, 'value': value, 'timeUnixNano': time.time_ns(),
+                'attributes': [{'key': key, 'value': value_}
+                               for key, value_ in attributes.items()]}
+        with self._lock:
+            self._counters.append(data)
+
+    def export(self) -> dict:
+        """Export and clear the recorded spans and counters
+
+        Returns
+        -------
+        dict
+            {'spans': [span dict], 'metrics': [counter dict]}
+        """
+        with self._lock:
+            spans, self._spans = self._spans, []
+            counters, self._counters = self._counters, []
+        return {'spans': spans, 'metrics': counters}
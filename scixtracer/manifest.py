@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""SciXtracerPy import manifest.
+
+Checkpoint of the files imported into an experiment by import_dir. An
+interrupted import is resumed by running it again: the files recorded in the
+manifest are skipped, the others are imported
+
+The manifest is persisted in the IMPORT_MANIFEST_FILE file of the experiment
+directory, beside experiment.md.json. The file is an append only log with
+one JSON record per line, written when the imported metadata are committed:
+
+    {"source": "/path/to/population1_001.tif", "size": 1024,
+     "mtime_ns": 1600000000000000000, "url": "data/population1_001.md.json"}
+
+A file is imported if its absolute path, size and modification time match a
+record. The urls are relative to the experiment directory
+
+Classes
+-------
+ImportManifest
+
+"""
+
+import os
+import json
+
+
+IMPORT_MANIFEST_FILE = 'import_manifest.ndjson'
+
+
+class ImportManifest:
+    """Files imported into an experiment
+
+    Parameters
+    ----------
+    experiment_dir: str
+        Absolute path of the experiment directory
+
+    Attributes
+    ----------
+    files: dict
+        {source path: (size, mtime_ns)} of the imported files
+    """
+
+    def __init__(self, experiment_dir: str):
+        self.experiment_dir = experiment_dir
+        self.path = os.path.join(experiment_dir, IMPORT_MANIFEST_FILE)
+        self.files = dict()
+
+    def exists(self) -> bool:
+        """Check if the manifest file exists"""
+        return os.path.isfile(self.path)
+
+    def _add(self, record: dict):
+        self.files[record['source']] = (record['size'], record['mtime_ns'])
+
+    def load(self):
+        """Read the manifest file
+
+        Returns
+        -------
+        ImportManifest
+            The manifest, for chaining
+        """
+        self.files = dict()
+        if not self.exists():
+            return self
+        with open(self.path, 'rb') as manifest_file:
+            content = manifest_file.read()
+        # ignore a last line that was not completely written
+        end = content.rfind(b'\n') + 1
+        for line in content[:end].splitlines():
+            if line.strip():
+                self._add(json.loads(line))
+        return self
+
+    def is_imported(self, source: str, size: int, mtime_ns: int) -> bool:
+        """Check if a file is imported and has not changed since
+
+        Parameters
+        ----------
+        source: str
+            Absolute path of the file
+        size: int
+            Size of the file in bytes
+        mtime_ns: int
+            Modification time of the file in nanoseconds
+        """
+        return self.files.get(source) == (size, mtime_ns)
+
+    def append(self, records: list):
+        """Add records to the manifest and to the manifest file"""
+        if len(records) == 0:
+            return
+        for record in records:
+            self._add(record)
+        with open(self.path, 'a') as manifest_file:
+            manifest_file.write(''.join(json.dumps(record) + '\n'
+                                        for record in records))
+
+    @staticmethod
+    def record(source: str, size: int, mtime_ns: int, url: str) -> dict:
+        """Create the record of an imported file"""
+        return {'source': source, 'size': size, 'mtime_ns': mtime_ns,
+                'url': url}
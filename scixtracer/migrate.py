@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""SciXtracerPy metadata format migration tool.
+
+Rewrite the metadata of a local experiment with another codec (see codecs)
+and record the new format in experiment.md.json
+
+Example
+-------
+    $ python -m scixtracer.migrate path/to/experiment msgpack
+    $ python -m scixtracer.migrate path/to/experiment json
+
+Methods
+-------
+migrate_experiment
+
+"""
+
+import os
+import sys
+import argparse
+
+from .codecs import get_codec
+from .factory import requestServices
+
+
+def migrate_experiment(experiment_uri: str, format_: str):
+    """Convert the metadata files of an experiment to a new format
+
+    The dataset, run and data metadata files of the experiment directories
+    are rewritten. Packed metadata (see packed_store) are kept in their
+    record files
+
+    Parameters
+    ----------
+    experiment_uri: str
+        Path of the experiment directory or experiment.md.json file
+    format_: str
+        Name of the new format ('json' or 'msgpack')
+
+    Returns
+    -------
+    int
+        Number of converted metadata files
+    """
+
+    service = requestServices.get('LOCAL')
+    if os.path.isdir(experiment_uri):
+        experiment_uri = os.path.join(experiment_uri, 'experiment.md.json')
+    experiment = service.get_experiment(experiment_uri)
+    experiment.metadata_format = get_codec(format_).name
+    service.update_experiment(experiment)
+
+    datasets = [experiment.rawdataset] + experiment.processeddatasets
+    directories = []
+    for dataset in datasets:
+        directory = os.path.dirname(os.path.abspath(dataset.url))
+        if directory not in directories:
+            directories.append(directory)
+
+    count = 0
+    for directory in directories:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.endswith('.md.json'):
+                    metadata = service._read_json(entry.path)
+                    service._write_json(metadata, entry.path)
+                    count += 1
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m scixtracer.migrate',
+        description='Convert the metadata of a local experiment to another '
+                    'format')
+    parser.add_argument('experiment',
+                        help='experiment directory or experiment.md.json')
+    parser.add_argument('format', choices=['json', 'msgpack'])
+    args = parser.parse_args(argv)
+    count = migrate_experiment(args.experiment, args.format)
+    print('converted', count, 'metadata files to', args.format)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""SciXtracerPy pack tool.
+
+Convert the metadata of a local experiment between the one .md.json file per
+data format and the packed format (see packed_store)
+
+Example
+-------
+    Convert an experiment from the command line
+
+    $ python -m scixtracer.pack pack path/to/experiment
+    $ python -m scixtracer.pack unpack path/to/experiment
+
+Methods
+-------
+pack_experiment
+unpack_experiment
+
+"""
+
+import os
+import sys
+import json
+import argparse
+
+from .packed_store import PACK_FILE, PackedStore
+from .request_local import LocalRequestService
+
+
+def _experiment_dataset_dirs(experiment_uri: str):
+    """List the dataset directories of an experiment with their files
+
+    Parameters
+    ----------
+    experiment_uri: str
+        Path of the experiment directory or experiment.md.json file
+
+    Returns
+    -------
+    dict
+        {dataset directory: [metadata file names]}
+    """
+
+    service = LocalRequestService()
+    experiment = service.get_experiment(_experiment_md_uri(experiment_uri))
+    datasets = [experiment.rawdataset] + experiment.processeddatasets
+    dirs = dict()
+    for dataset_info in datasets:
+        dataset = service.get_dataset(dataset_info.url)
+        dataset_dir = os.path.dirname(dataset.md_uri)
+        names = dirs.setdefault(dataset_dir, dict())
+        for uri in dataset.uris:
+            if os.path.dirname(uri.md_uri) == dataset_dir:
+                names[os.path.basename(uri.md_uri)] = None
+    return {directory: list(names) for directory, names in dirs.items()}
+
+
+def _experiment_md_uri(experiment_uri: str) -> str:
+    if os.path.isdir(experiment_uri):
+        return os.path.join(experiment_uri, 'experiment.md.json')
+    return experiment_uri
+
+
+def pack_experiment(experiment_uri: str):
+    """Pack the data metadata files of an experiment
+
+    Each dataset directory gets one record file. The loose .md.json files of
+    the data are removed. An already packed directory is compacted
+
+    Parameters
+    ----------
+    experiment_uri: str
+        Path of the experiment directory or experiment.md.json file
+    """
+
+    for directory, names in _experiment_dataset_dirs(experiment_uri).items():
+        records = []
+        store = None
+        if os.path.isfile(os.path.join(directory, PACK_FILE)):
+            store = PackedStore(directory)
+        for name in names:
+            path = os.path.join(directory, name)
+            if os.path.isfile(path):
+                with open(path, 'rb') as md_file:
+                    records.append((name, json.load(md_file)))
+            elif store is not None and store.contains(name):
+                records.append((name, store.read(name)))
+        if store is not None:
+            store.close()
+
+        tmp_path = os.path.join(directory, PACK_FILE + '.tmp')
+        with open(tmp_path, 'wb') as tmp_file:
+            for name, metadata in records:
+                tmp_file.write(name.encode('utf-8') + b'\t' +
+                               json.dumps(metadata).encode('utf-8') + b'\n')
+        os.replace(tmp_path, os.path.join(directory, PACK_FILE))
+        for name, _ in records:
+            path = os.path.join(directory, name)
+            if os.path.isfile(path):
+                os.remove(path)
+    _reset_service_stores()
+
+
+def unpack_experiment(experiment_uri: str):
+    """Convert a packed experiment back to one .md.json file per data
+
+    Parameters
+    ----------
+    experiment_uri: str
+        Path of the experiment directory or experiment.md.json file
+    """
+
+    for directory in _experiment_dataset_dirs(experiment_uri):
+        if not os.path.isfile(os.path.join(directory, PACK_FILE)):
+            continue
+        store = PackedStore(directory)
+        for name in store.index:
+            with open(os.path.join(directory, name), 'w') as md_file:
+                json.dump(store.read(name), md_file, indent=4)
+        store.close()
+        os.remove(store.path)
+    _reset_service_stores()
+
+
+def _reset_service_stores():
+    """Drop the packed stores opened by the local request service"""
+    from .factory import requestServices
+    requestServices.get('LOCAL').close_packs()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m scixtracer.pack',
+        description='Convert the metadata of a local experiment between the '
+                    'one file per data and the packed formats')
+    parser.add_argument('command', choices=['pack', 'unpack'])
+    parser.add_argument('experiment',
+                        help='experiment directory or experiment.md.json')
+    args = parser.parse_args(argv)
+    if args.command == 'pack':
+        pack_experiment(args.experiment)
+    else:
+        unpack_experiment(args.experiment)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
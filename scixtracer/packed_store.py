@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""SciXtracerPy packed metadata store.
+
+Packed store for the local request service. The metadata files of the data
+of a dataset directory are stored in a single append-only record file
+instead of one small .md.json file per data. Each record is a line
+'<file name>\t<json>\n'. The last record of a file name is the current
+version of the metadata. The records are read through mmap using an offset
+index built when the store is opened.
+
+Classes
+-------
+PackedStore
+
+"""
+
+import os
+import mmap
+import json
+
+from .utils import SciXtracerError
+
+
+PACK_FILE = 'metadata.pack'
+
+
+class PackedStore:
+    """Append-only record file of the metadata of a directory
+
+    Parameters
+    ----------
+    directory: str
+        Path of the directory containing the pack file
+
+    Attributes
+    ----------
+    path: str
+        Path of the pack file
+    index: dict
+        Offset index {file name: (offset, length)} of the current records
+
+    """
+
+    def __init__(self, directory: str):
+        self.path = os.path.join(directory, PACK_FILE)
+        self.index = dict()
+        self._file = None
+        self._map = None
+        self._map_size = 0
+        self._load()
+
+    def _load(self):
+        """Build the offset index by scanning the record file"""
+        if not os.path.isfile(self.path):
+            open(self.path, 'ab').close()
+        self._file = open(self.path, 'rb')
+        self._remap()
+        offset = 0
+        while offset < self._map_size:
+            end = self._map.find(b'\n', offset)
+            if end < 0:
+                # drop the truncated last record of an interrupted write
+                self._map.close()
+                self._map = None
+                os.truncate(self.path, offset)
+                self._remap()
+                break
+            separator = self._map.find(b'\t', offset, end)
+            if separator < 0:
+                raise SciXtracerError('Corrupted pack file: ' + self.path)
+            key = self._map[offset:separator].decode('utf-8')
+            self.index[key] = (separator + 1, end - separator - 1)
+            offset = end + 1
+
+    def _remap(self):
+        """Map the current content of the record file"""
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._map_size = os.fstat(self._file.fileno()).st_size
+        if self._map_size > 0:
+            self._map = mmap.mmap(self._file.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+
+    def close(self):
+        """Release the file and the memory map"""
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def is_valid(self) -> bool:
+        """Check that the record file was not removed or replaced"""
+        return self._file is not None and \
+            os.fstat(self._file.fileno()).st_nlink > 0
+
+    def contains(self, key: str) -> bool:
+        """Check if a metadata file is in the store"""
+        return key in self.index
+
+    def read_bytes(self, key: str) -> bytes:
+        """Read the encoded metadata of a file
+
+        Parameters
+        ----------
+        key: str
+            Name of the metadata file (ex: 'image.md.json')
+
+        Returns
+        -------
+        bytes
+            The JSON encoded metadata
+        """
+
+        offset, length = self.index[key]
+        if offset + length > self._map_size:
+            self._remap()
+        return self._map[offset:offset + length]
+
+    def read(self, key: str) -> dict:
+        """Read the metadata of a file
+
+        Parameters
+        ----------
+        key: str
+            Name of the metadata file (ex: 'image.md.json')
+
+        Returns
+        -------
+        dict
+            The metadata
+        """
+
+        return json.loads(self.read_bytes(key))
+
+    def append(self, key: str, metadata: dict):
+        """Append a new version of the metadata of a file
+
+        Parameters
+        ----------
+        key: str
+            Name of the metadata file (ex: 'image.md.json')
+        metadata: dict
+            The metadata
+        """
+
+        self.append_many([(key, metadata)])
+
+    def append_many(self, records):
+        """Append the metadata of several files in a single write
+
+        Parameters
+        ----------
+        records: iterable
+            (file name, metadata dict) pairs
+        """
+
+        offset = os.path.getsize(self.path)
+        chunks = []
+        new_index = dict()
+        for key, metadata in records:
+            prefix = key.encode('utf-8') + b'\t'
+            content = json.dumps(metadata).encode('utf-8')
+            new_index[key] = (offset + len(prefix), len(content))
+            offset += len(prefix) + len(content) + 1
+            chunks.append(prefix + content + b'\n')
+        with open(self.path, 'ab') as pack_file:
+            pack_file.write(b''.join(chunks))
+        self.index.update(new_index)
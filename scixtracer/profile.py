@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""SciXtracerPy profiling tool.
+
+Replay a workload on an existing experiment under a profiler. The workload
+is made of get_data queries, lineage resolutions (get_origin of each
+processed data) and workspace scans. The tool writes the profile and
+prints the time spent in each request service method (see instrumentation)
+
+With the sampling profiler (default), the stacks of the workload are
+sampled at a fixed interval and written in the collapsed stack format
+read by flamegraph.pl, speedscope or inferno. With cProfile, the pstats
+file is written and the most expensive functions are printed
+
+Example
+-------
+    $ python -m scixtracer.profile path/to/experiment \\
+        --query "Population=population1" --lineage --repeat 5 \\
+        --output profile.folded
+
+Methods
+-------
+run_workload
+sample
+write_collapsed
+
+"""
+
+import os
+import sys
+import time
+import pstats
+import cProfile
+import argparse
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+from . import instrumentation
+from .request import Request
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    module = frame.f_globals.get('__name__', '')
+    return '{}:{}'.format(module, code.co_name)
+
+
+@contextmanager
+def sample(interval=0.001):
+    """Sample the stacks of the current thread in a context
+
+    Parameters
+    ----------
+    interval: float
+        Time between two samples in seconds
+
+    Returns
+    -------
+    Counter
+        {collapsed stack: number of samples}, filled when the context exits.
+        The collapsed stack is the list of the frames names (module:function)
+        from the root, separated by ';'
+    """
+    stacks = Counter()
+    thread_id = threading.get_ident()
+    stop = threading.Event()
+
+    def sampler():
+        while not stop.wait(interval):
+            frame = sys._current_frames().get(thread_id)
+            names = []
+            while frame is not None:
+                # skip the instrumentation wrappers of the service methods
+                if frame.f_globals.get('__name__') != instrumentation.__name__:
+                    names.append(_frame_name(frame))
+                frame = frame.f_back
+            if names:
+                stacks[';'.join(reversed(names))] += 1
+
+    thread = threading.Thread(target=sampler, daemon=True)
+    thread.start()
+    try:
+        yield stacks
+    finally:
+        stop.set()
+        thread.join()
+
+
+def write_collapsed(stacks: Counter, path: str):
+    """Write sampled stacks in the collapsed stack format"""
+    with open(path, 'w') as out_file:
+        for stack, count in sorted(stacks.items()):
+            out_file.write('{} {}\n'.format(stack, count))
+
+
+def run_workload(request, experiment_uri, queries=None, datasets=None,
+                 lineage=False, workspace=None, repeat=1):
+    """Replay a workload on an experiment
+
+    Parameters
+    ----------
+    request: Request
+        Request used to run the workload
+    experiment_uri: str
+        Path of the experiment directory or experiment.md.json file
+    queries: list
+        Queries run with get_data on each selected dataset. If no query,
+        lineage nor workspace is given, all the data of the datasets are read
+    datasets: list
+        Names of the datasets to query. Default is all the datasets
+    lineage: bool
+        True to resolve the origin of each processed data of the datasets
+    workspace: str
+        Workspace directory to scan for experiments
+    repeat: int
+        Number of times the workload is replayed
+    """
+    if os.path.isdir(experiment_uri):
+        experiment_uri = os.path.join(experiment_uri, 'experiment.md.json')
+    experiment = request.get_experiment(experiment_uri)
+    names = datasets or ([experiment.rawdataset.name] +
+                         [info.name for info in experiment.processeddatasets])
+    if not queries and not lineage and not workspace:
+        queries = ['']
+    for _ in range(repeat):
+        for name in names:
+            dataset = request.get_dataset(experiment, name)
+            for query in queries or []:
+                request.get_data(dataset, query)
+            if lineage and name != experiment.rawdataset.name:
+                for uri in dataset.uris:
+                    request.get_origin(request.get_processeddata(uri.md_uri))
+        if workspace:
+            request.experiments(workspace)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m scixtracer.profile',
+        description='Profile a workload on an experiment')
+    parser.add_argument('experiment',
+                        help='experiment directory or experiment.md.json')
+    parser.add_argument('--query', action='append', default=[],
+                        help='get_data query (can be repeated)')
+    parser.add_argument('--dataset', action='append', default=[],
+                        help='name of a dataset to query (can be repeated)')
+    parser.add_argument('--lineage', action='store_true',
+                        help='resolve the origin of the processed data')
+    parser.add_argument('--workspace', help='workspace directory to scan')
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--profiler', choices=['sampling', 'cprofile'],
+                        default='sampling')
+    parser.add_argument('--interval', type=float, default=0.001,
+                        help='sampling interval in seconds')
+    parser.add_argument('--output', default='scixtracer_profile',
+                        help='profile file (collapsed stacks or pstats)')
+    args = parser.parse_args(argv)
+
+    request = Request()
+    sink = instrumentation.MemorySink()
+    start = time.perf_counter()
+    with instrumentation.record(sink):
+        if args.profiler == 'sampling':
+            with sample(args.interval) as stacks:
+                run_workload(request, args.experiment, args.query,
+                             args.dataset, args.lineage, args.workspace,
+                             args.repeat)
+            write_collapsed(stacks, args.output)
+        else:
+            profiler = cProfile.Profile()
+            profiler.runcall(run_workload, request, args.experiment,
+                             args.query, args.dataset, args.lineage,
+                             args.workspace, args.repeat)
+            profiler.dump_stats(args.output)
+            pstats.Stats(profiler).sort_stats('cumulative').print_stats(20)
+    print('workload: {:.3f} s'.format(time.perf_counter() - start))
+    print(sink.summary())
+    print('profile written to ' + args.output)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
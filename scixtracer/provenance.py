@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+"""SciXtracerPy provenance index.
+
+Provenance graph (DAG) of the data of an experiment. The nodes are the raw
+data, the processed data and the runs. A processed data is linked to its
+inputs and to the run that created it. The index keeps the links in both
+directions, so that the ancestors and the descendants of a data are found
+in a time proportional to the size of the result
+
+The index is persisted in the PROVENANCE_FILE file of the experiment
+directory, beside experiment.md.json. The file is an append only log with
+one JSON record per line. A record replaces the previous record of the same
+node:
+
+    {"uuid": "...", "type": "raw", "url": "data/population1_001.md.json"}
+    {"uuid": "...", "type": "run", "url": "process1/run.md.json"}
+    {"uuid": "...", "type": "processed", "url": "process1/o_001.md.json",
+     "run": "<run uuid>", "inputs": ["<input uuid>"]}
+
+The urls are relative to the experiment directory
+
+Classes
+-------
+ProvenanceIndex
+
+"""
+
+import os
+import json
+import threading
+from itertools import chain
+from collections import deque
+
+from .containers import Container
+
+
+PROVENANCE_FILE = 'provenance.ndjson'
+
+
+class ProvenanceIndex:
+    """Provenance graph of an experiment
+
+    Parameters
+    ----------
+    experiment_dir: str
+        Absolute path of the experiment directory
+
+    Attributes
+    ----------
+    nodes: dict
+        {uuid: record} of the data and runs
+    parents: dict
+        {uuid: list of input uuids} of the processed data
+    run_of: dict
+        {uuid: run uuid} of the processed data
+    outputs: dict
+        {run uuid: list of uuids of the processed data created by the run}
+    """
+
+    def __init__(self, experiment_dir: str):
+        self.experiment_dir = experiment_dir
+        self.path = os.path.join(experiment_dir, PROVENANCE_FILE)
+        self._lock = threading.RLock()
+        self._offset = 0
+        self._identity = None
+        self._clear()
+
+    def _clear(self):
+        self.nodes = dict()
+        self.parents = dict()
+        self.run_of = dict()
+        self.outputs = dict()
+        # reverse links between integer ids: large walks iterate over lists
+        # of small integers instead of hashing uuid strings
+        self._ids = dict()
+        self._uuids = []
+        self._children = []
+
+    def _id(self, uuid_: str) -> int:
+        id_ = self._ids.get(uuid_)
+        if id_ is None:
+            id_ = self._ids[uuid_] = len(self._uuids)
+            self._uuids.append(uuid_)
+            self._children.append(())
+        return id_
+
+    def exists(self) -> bool:
+        """Check if the index file exists"""
+        return os.path.isfile(self.path)
+
+    def _add(self, record: dict):
+        """Add a record to the graph, replacing the previous record
+
+        Returns
+        -------
+        bool
+            False if the record was already in the graph
+        """
+        uuid_ = record['uuid']
+        previous = self.nodes.get(uuid_)
+        if previous == record:
+            return False
+        id_ = self._id(uuid_)
+        if previous is not None:
+            for parent in self.parents.pop(uuid_, ()):
+                self._children[self._ids[parent]].remove(id_)
+            run = self.run_of.pop(uuid_, None)
+            if run is not None:
+                self.outputs[run].remove(uuid_)
+
+        self.nodes[uuid_] = record
+        inputs = record.get('inputs')
+        if inputs:
+            self.parents[uuid_] = inputs
+            children = self._children
+            for parent in inputs:
+                parent_id = self._id(parent)
+                if children[parent_id]:
+                    children[parent_id].append(id_)
+                else:
+                    children[parent_id] = [id_]
+        run = record.get('run')
+        if run:
+            self.run_of[uuid_] = run
+            linked = self.outputs.get(run)
+            if linked is None:
+                self.outputs[run] = [uuid_]
+            else:
+                linked.append(uuid_)
+        return True
+
+    def refresh(self):
+        """Read the records appended to the index file by other processes
+
+        The index is reloaded if the file has been rewritten
+        """
+        with self._lock:
+            try:
+                stat = os.stat(self.path)
+            except FileNotFoundError:
+                return
+            identity = (stat.st_dev, stat.st_ino)
+            if identity != self._identity or stat.st_size < self._offset:
+                self._clear()
+                self._offset = 0
+                self._identity = identity
+            if stat.st_size == self._offset:
+                return
+            with open(self.path, 'rb') as index_file:
+                index_file.seek(self._offset)
+                content = index_file.read()
+            # ignore a last line that is still being written
+            end = content.rfind(b'\n') + 1
+            for line in content[:end].splitlines():
+                if line.strip():
+                    self._add(json.loads(line))
+            self._offset += end
+
+    def append(self, records: list):
+        """Add records to the graph and to the index file
+
+        The records that do not change the graph are not written
+        """
+        with self._lock:
+            self.refresh()
+            lines = [json.dumps(record) + '\n' for record in records
+                     if self._add(record)]
+            if len(lines) == 0:
+                return
+            with open(self.path, 'a') as index_file:
+                index_file.write(''.join(lines))
+                self._offset = index_file.tell()
+            if self._identity is None:
+                stat = os.stat(self.path)
+                self._identity = (stat.st_dev, stat.st_ino)
+
+    def write(self, records: list):
+        """Replace the index file and the graph with records"""
+        with self._lock:
+            self._clear()
+            for record in records:
+                self._add(record)
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w') as index_file:
+                for record in self.nodes.values():
+                    index_file.write(json.dumps(record) + '\n')
+            os.replace(tmp_path, self.path)
+            stat = os.stat(self.path)
+            self._identity = (stat.st_dev, stat.st_ino)
+            self._offset = stat.st_size
+
+    def container(self, uuid_: str) -> Container:
+        """Get the Container (md_uri, uuid) of a node"""
+        return Container(os.path.join(self.experiment_dir,
+                                      self.nodes[uuid_]['url']), uuid_)
+
+    def _walk(self, uuids, links, runs):
+        seen = set(uuids)
+        result = []
+        queue = deque(uuids)
+        while queue:
+            uuid_ = queue.popleft()
+            if runs:
+                run = self.run_of.get(uuid_)
+                if run is not None and run not in seen:
+                    seen.add(run)
+                    result.append(run)
+            for linked in links.get(uuid_, ()):
+                if linked not in seen:
+                    seen.add(linked)
+                    result.append(linked)
+                    queue.append(linked)
+        return result
+
+    def ancestors(self, uuids, runs=False) -> list:
+        """Get the uuids of the data a set of data derives from
+
+        Parameters
+        ----------
+        uuids: iterable
+            uuids of the data
+        runs: bool
+            True to add the uuids of the runs that created the data
+
+        Returns
+        -------
+        list
+            The uuids, in breadth first order from the data
+        """
+        with self._lock:
+            return self._walk(list(uuids), self.parents, runs)
+
+    def descendants(self, uuids) -> list:
+        """Get the uuids of the processed data derived from a set of data
+
+        The graph is walked one generation at a time with set operations, so
+        that large invalidations (ex: 10 stages of 100k data) stay fast
+
+        Parameters
+        ----------
+        uuids: iterable
+            uuids of the data or of runs. The descendants of a run are the
+            data it created and their descendants
+
+        Returns
+        -------
+        list
+            The uuids, generation by generation from the data. The order
+            inside a generation is not defined
+        """
+        with self._lock:
+            uuids = list(uuids)
+            ids = self._ids
+            seeds = [ids[uuid_] for uuid_ in uuids if uuid_ in ids]
+            start = [ids[output] for uuid_ in uuids
+                     for output in self.outputs.get(uuid_, ())]
+            children = self._children.__getitem__
+            seen = set(seeds)
+            frontier = set(start)
+            frontier.update(chain.from_iterable(map(children, seeds)))
+            result = []
+            while frontier:
+                frontier.difference_update(seen)
+                seen.update(frontier)
+                result.extend(frontier)
+                frontier = set(chain.from_iterable(map(children, frontier)))
+            return list(map(self._uuids.__getitem__, result))
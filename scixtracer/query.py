@@ -18,6 +18,8 @@ class SearchContainer:
             data['tags'] = {'tag1'='value1', 'tag2'='value2'}
     """
 
+    __slots__ = ('data',)
+
     def __init__(self):
         self.data = dict()
         self.data['name'] = ''
@@ -177,3 +179,29 @@ def query_list_single(search_list, query):
                 selected_list.append(search_list[i])
 
     return selected_list
+
+
+def query_single(search_container, queries):
+    """query internal function
+    Check if a single data matches all the AND queries
+
+    Parameters
+    ----------
+    search_container: SearchContainer
+        Data to check
+    queries: list
+        List of string queries with the key=value format. The data is
+        selected if it matches all the queries
+
+    Returns
+    -------
+    bool
+        True if the data matches all the queries, False otherwise
+    """
+
+    selected_list = [search_container]
+    for query in queries:
+        selected_list = query_list_single(selected_list, query)
+        if len(selected_list) == 0:
+            return False
+    return True
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""SciXtracerPy origin tags repair tool.
+
+Refresh the snapshots of the origin tags stored in the processed data
+metadata (see Request.create_data) after the tags of the raw data changed
+
+Example
+-------
+    $ python -m scixtracer.repair path/to/experiment
+    $ python -m scixtracer.repair path/to/experiment --dataset process1 --add
+
+Methods
+-------
+repair_origin_tags
+
+"""
+
+import os
+import sys
+import argparse
+
+from .request import Request
+
+
+def repair_origin_tags(experiment_uri: str, datasets=None, add=False) -> int:
+    """Refresh the origin tags snapshots of an experiment
+
+    Parameters
+    ----------
+    experiment_uri: str
+        Path of the experiment directory or experiment.md.json file
+    datasets: list
+        Names of the processed datasets to refresh. Default is all
+    add: bool
+        True to also snapshot the processed data without snapshot
+
+    Returns
+    -------
+    int
+        Number of updated processed data
+    """
+
+    if os.path.isdir(experiment_uri):
+        experiment_uri = os.path.join(experiment_uri, 'experiment.md.json')
+    request = Request()
+    experiment = request.get_experiment(experiment_uri)
+    return request.refresh_origin_tags(experiment, datasets, add)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m scixtracer.repair',
+        description='Refresh the origin tags snapshots of the processed data '
+                    'of a local experiment')
+    parser.add_argument('experiment',
+                        help='experiment directory or experiment.md.json')
+    parser.add_argument('--dataset', action='append',
+                        help='processed dataset to refresh (can be repeated)')
+    parser.add_argument('--add', action='store_true',
+                        help='also snapshot the data without snapshot')
+    args = parser.parse_args(argv)
+    count = repair_origin_tags(args.experiment, args.dataset, args.add)
+    print('updated', count, 'processed data')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -11,11 +11,18 @@ Request
 
 import os
 import re
+import queue
+import fnmatch
+import threading
+from itertools import islice
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from .utils import Observable, SciXtracerError, format_date
 from .factory import requestServices
-from .containers import (Experiment, RawData, ProcessedData, Dataset,
-                         METADATA_TYPE_RAW)
-from .query import SearchContainer, query_list_single
+from .containers import (Container, Experiment, RawData, ProcessedData,
+                         Dataset, METADATA_TYPE_RAW)
+from .query import SearchContainer, query_single
 
 
 class Request(Observable):
@@ -27,6 +34,31 @@ class Request(Observable):
         self.service = requestServices.get("LOCAL")
 
 
+    @contextmanager
+    def batch(self):
+        """Group the writes of several requests in a single unit of work
+
+        Inside the context, the metadata written by the update_* and create_*
+        requests are kept in memory and the repeated writes of the same
+        metadata file are coalesced. Everything is written once when the
+        context exits, or discarded if an exception is raised. The data
+        files copied by the imports are not affected
+
+        Example
+        -------
+            >>> with req.batch():
+            >>>     for data in data_list:
+            >>>         req.create_data(dataset, run, processed_data(data))
+
+        """
+        self.service.begin_batch()
+        try:
+            yield self
+        except BaseException:
+            self.service.rollback_batch()
+            raise
+        self.service.commit_batch()
+
     def experiments(self, workspace_uri):
         """Get the list of experiments"""
         #workspace_dir = ConfigAccess.instance().config['workspace']
@@ -34,7 +66,7 @@ class Request(Observable):
 
 
     def create_experiment(self, name, author, date='now', tag_keys=[],
-                          destination=''):
+                          destination='', metadata_format='json'):
         """Create a new experiment
 
         Parameters
@@ -50,6 +82,9 @@ class Request(Observable):
         destination: str
             Destination where the experiment is created. It is a the path of the
             directory where the experiment will be created for local use case
+        metadata_format: str
+            Format used to store the metadata of the experiment data ('json'
+            or 'msgpack')
 
         Returns
         -------
@@ -57,7 +92,8 @@ class Request(Observable):
         """
 
         return self.service.create_experiment(name, author, format_date(date),
-                                              tag_keys, destination)
+                                              tag_keys, destination,
+                                              metadata_format)
 
     def get_experiment(self, uri):
         """Read an experiment from the database
@@ -120,7 +156,8 @@ class Request(Observable):
         self.service.update_experiment(experiment)
 
     def import_data(self, experiment, data_path, name, author, format_,
-                    date='now', tags=dict, copy=True):
+                    date='now', tags=dict, copy=True, hash_content=False,
+                    deduplicate=False, file_name=''):
         """import one data to the experiment
 
         The data is imported to the rawdataset
@@ -144,6 +181,15 @@ class Request(Observable):
         copy: bool
             True to copy the data to the Experiment database
             False otherwise
+        hash_content: bool
+            True to record the hash of the data content in the metadata
+        deduplicate: bool
+            True to store identical copied data only once in the workspace
+            and link them into the experiment. The linked files are shared
+            between experiments and read-only. Implies hash_content
+        file_name: str
+            Name of the data file in the experiment data directory. Default
+            is the base name of data_path
 
         Returns
         -------
@@ -152,16 +198,26 @@ class Request(Observable):
         """
 
         return self.service.import_data(experiment, data_path, name, author,
-                                        format_, format_date(date), tags, copy)
+                                        format_, format_date(date), tags, copy,
+                                        hash_content, deduplicate, file_name)
 
     def import_dir(self, experiment, dir_uri, filter_, author, format_, date,
-                   copy_data):
+                   copy_data, hash_content=False, deduplicate=False,
+                   recursive=False, glob_pattern='', chunk_size=1000,
+                   resume=True):
         """Import data from a directory to the experiment
 
         This method import with or without copy data contained
         in a local folder into an experiment. Imported data are
         considered as RawData for the experiment
 
+        The directory is read as a stream, so the import of a huge directory
+        tree uses a bounded memory. The metadata are committed every
+        chunk_size files: an interrupted import keeps the data imported by
+        the committed chunks. The imported files are recorded in the import
+        manifest of the experiment, so that running the import again skips
+        them and resumes the import
+
         Parameters
         ----------
         experiment: Experiment
@@ -170,7 +226,7 @@ class Request(Observable):
             URI of the directory containing the data to be imported
         filter_: str
             Regular expression to filter which files in the folder
-            to import
+            to import. It is matched against the file names
         author: str
             Name of the person who created the data
         format_: str
@@ -182,18 +238,101 @@ class Request(Observable):
             data are not copied, an absolute link to dir_uri is kept in the
             experiment metadata. The original data directory must then not be
             changed for the experiment to find the data.
+        hash_content: bool
+            True to record the hash of the data content in the metadata
+        deduplicate: bool
+            True to store identical copied data only once in the workspace
+            and link them into the experiment. The linked files are shared
+            between experiments and read-only. Implies hash_content
+        recursive: bool
+            True to import the data of the sub directories. The data of a
+            sub directory are named with their path relative to dir_uri
+            (ex: 'plate1/population1_001.tif') and their files are stored
+            as 'plate1_population1_001.tif' in the experiment. A
+            SciXtracerError is raised if two files get the same stored name
+            (ex: 'a/b_c.tif' and 'a_b/c.tif'). The symbolic links to
+            directories are not followed
+        glob_pattern: str
+            Shell style pattern the file names must also match
+            (ex: '*.tif'). Empty for no pattern
+        chunk_size: int
+            Number of imported files between two metadata commits. None to
+            commit once at the end
+        resume: bool
+            True to skip the files already imported with the same size and
+            modification time. False to import all the files again
+
+        Returns
+        -------
+        int
+            The number of data imported by the call
         """
 
-        files = os.listdir(dir_uri)
+        regex = re.compile(filter_)
+        glob_regex = re.compile(fnmatch.translate(glob_pattern)) \
+            if glob_pattern else None
+
+        manifest = self.service.get_import_manifest(experiment) \
+            if resume else None
         count = 0
-        for file in files:
-            count += 1
-            r1 = re.compile(filter_)  # re.compile(r'\.tif$')
-            if r1.search(file):
-                self.notify_observers(int(100 * count / len(files)), file)
-                data_url = os.path.join(dir_uri, file)
-                self.import_data(experiment, data_url, file, author, format_,
-                                 date, {}, copy_data)
+        files = self._iter_files(dir_uri, recursive)
+        while True:
+            chunk = 0
+            with self.batch():
+                for relative_path, entry in files:
+                    if not regex.search(entry.name) or \
+                            (glob_regex is not None and
+                             not glob_regex.match(entry.name)):
+                        continue
+                    source = os.path.abspath(entry.path)
+                    stat = entry.stat()
+                    if manifest is not None and manifest.is_imported(
+                            source, stat.st_size, stat.st_mtime_ns):
+                        continue
+                    name = relative_path.replace(os.sep, '/')
+                    rawdata = self.import_data(
+                        experiment, entry.path, name, author, format_, date,
+                        {}, copy_data, hash_content, deduplicate,
+                        name.replace('/', '_'))
+                    self.service.checkpoint_import(
+                        experiment, source, stat.st_size, stat.st_mtime_ns,
+                        rawdata)
+                    count += 1
+                    chunk += 1
+                    if chunk_size is not None and chunk >= chunk_size:
+                        break
+            self.notify_message('imported {} data'.format(count))
+            if chunk_size is None or chunk < chunk_size:
+                break
+        self.notify_observers(100, 'imported {} data'.format(count))
+        return count
+
+    @staticmethod
+    def _iter_files(dir_uri, recursive):
+        """Iterate over the files of a directory tree
+
+        The directories are read with os.scandir one at a time, only the
+        paths of the sub directories left to read are kept in memory
+
+        Yields
+        ------
+        tuple
+            (path relative to dir_uri, os.DirEntry) of each file
+        """
+
+        directories = ['']
+        while directories:
+            relative_dir = directories.pop()
+            with os.scandir(os.path.join(dir_uri, relative_dir)) as entries:
+                sub_directories = []
+                for entry in entries:
+                    if entry.is_file():
+                        yield os.path.join(relative_dir, entry.name), entry
+                    # do not follow the links, they can make cycles
+                    elif recursive and entry.is_dir(follow_symlinks=False):
+                        sub_directories.append(
+                            os.path.join(relative_dir, entry.name))
+            directories.extend(sorted(sub_directories, reverse=True))
 
     def tag_from_name(self, experiment, tag, values):
         """Tag an experiment raw data using raw data file names
@@ -209,15 +348,16 @@ class Request(Observable):
         """
 
         experiment.set_tag_key(tag)
-        self.update_experiment(experiment)
-        _rawdataset = self.get_rawdataset(experiment)
-        for uri in _rawdataset.uris:
-            _rawdata = self.get_rawdata(uri.md_uri)
-            for value in values:
-                if value in _rawdata.name:
-                    _rawdata.set_tag(tag, value)
-                    self.update_rawdata(_rawdata)
-                    break
+        with self.batch():
+            self.update_experiment(experiment)
+            _rawdataset = self.get_rawdataset(experiment)
+            for uri in _rawdataset.uris:
+                _rawdata = self.get_rawdata(uri.md_uri)
+                for value in values:
+                    if value in _rawdata.name:
+                        _rawdata.set_tag(tag, value)
+                        self.update_rawdata(_rawdata)
+                        break
 
     def tag_using_separator(self, experiment, tag, separator, value_position):
         """Tag an experiment raw data using file name and separator
@@ -235,17 +375,18 @@ class Request(Observable):
         """
 
         experiment.set_tag_key(tag)
-        self.update_experiment(experiment)
-        _rawdataset = self.get_rawdataset(experiment)
-        for uri in _rawdataset.uris:
-            _rawdata = self.get_rawdata(uri.md_uri)
-            basename = os.path.splitext(os.path.basename(_rawdata.uri))[0]
-            splited_name = basename.split(separator)
-            value = ''
-            if len(splited_name) > value_position:
-                value = splited_name[value_position]
-            _rawdata.set_tag(tag, value)
-            self.update_rawdata(_rawdata)
+        with self.batch():
+            self.update_experiment(experiment)
+            _rawdataset = self.get_rawdataset(experiment)
+            for uri in _rawdataset.uris:
+                _rawdata = self.get_rawdata(uri.md_uri)
+                basename = os.path.splitext(os.path.basename(_rawdata.uri))[0]
+                splited_name = basename.split(separator)
+                value = ''
+                if len(splited_name) > value_position:
+                    value = splited_name[value_position]
+                _rawdata.set_tag(tag, value)
+                self.update_rawdata(_rawdata)
 
     def get_rawdata(self, uri):
         """Read a raw data from the database
@@ -273,6 +414,70 @@ class Request(Observable):
 
         self.service.update_rawdata(rawdata)
 
+    def changed_data(self, experiment, full_hash=False, workers=4):
+        """Find the raw data whose file changed since it was imported
+
+        The size and modification time recorded at import are compared
+        first, and the content hashes only when needed. The data are checked
+        in parallel. The new modification time of the data whose file was
+        touched without changing its content is written to their metadata,
+        so that they are not hashed again by the next calls
+
+        Parameters
+        ----------
+        experiment: Experiment
+            Container of the experiment metadata
+        full_hash: bool
+            True to compare the content hash of every data that has one
+        workers: int
+            Number of threads used to check the data
+
+        Returns
+        -------
+        list
+            List of the RawData whose file is missing or changed
+        """
+
+        rawdataset = self.get_rawdataset(experiment)
+
+        def check(data_info):
+            rawdata = self.get_rawdata(data_info.md_uri)
+            mtime_ns = (rawdata.file_info or {}).get('mtime_ns')
+            changed = self.service.is_rawdata_changed(rawdata, full_hash)
+            touched = not changed and \
+                (rawdata.file_info or {}).get('mtime_ns') != mtime_ns
+            return rawdata, changed, touched
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(check, rawdataset.uris))
+        touched = [rawdata for rawdata, _, is_touched in results
+                   if is_touched]
+        if touched:
+            with self.batch():
+                for rawdata in touched:
+                    self.update_rawdata(rawdata)
+        return [rawdata for rawdata, changed, _ in results if changed]
+
+    def verify(self, experiment, full_hash=False, workers=4):
+        """Check that the raw data files did not change since their import
+
+        Parameters
+        ----------
+        experiment: Experiment
+            Container of the experiment metadata
+        full_hash: bool
+            True to compare the content hash of every data that has one
+        workers: int
+            Number of threads used to check the data
+
+        Returns
+        -------
+        bool
+            True if no raw data file changed, False otherwise
+        """
+
+        return len(self.changed_data(experiment, full_hash, workers)) == 0
+
     def get_processeddata(self, uri):
         """Read a processed data from the database
 
@@ -388,6 +593,103 @@ class Request(Observable):
                 return self.get_origin(
                            self.get_processeddata(processed_data.inputs[0].uri))
 
+    def provenance(self, experiment, rebuild=False):
+        """Get the provenance index of an experiment
+
+        The index links the raw data, processed data and runs of the
+        experiment in both directions. It is updated when data are created
+        and is built from the experiment metadata if it does not exist
+
+        Parameters
+        ----------
+        experiment: Experiment
+            Container of the experiment metadata
+        rebuild: bool
+            True to rebuild the index from the experiment metadata
+
+        Returns
+        -------
+        ProvenanceIndex
+        """
+
+        return self.service.get_provenance(experiment.md_uri, rebuild)
+
+    def ancestors(self, data, runs=False):
+        """Get the full provenance of a data
+
+        The provenance is read from the provenance index without reading the
+        metadata of the intermediate data
+
+        Parameters
+        ----------
+        data: Data
+            Container of a raw or processed data
+        runs: bool
+            True to add the runs that created the data and its ancestors
+
+        Returns
+        -------
+        list
+            The Container (md_uri, uuid) of the data (and runs) the data
+            derives from, from the closest to the raw data
+        """
+
+        index = self.service.get_provenance(data.md_uri)
+        return [index.container(uuid_)
+                for uuid_ in index.ancestors([data.uuid], runs)]
+
+    def descendants(self, data):
+        """Get the processed data derived from a data or a run
+
+        The descendants are read from the provenance index, across all the
+        processed datasets of the experiment
+
+        Parameters
+        ----------
+        data: Data or Run
+            Container of a raw data, a processed data or a run
+
+        Returns
+        -------
+        list
+            The Container (md_uri, uuid) of the processed data derived from
+            the data, generation by generation
+        """
+
+        index = self.service.get_provenance(data.md_uri)
+        return [index.container(uuid_)
+                for uuid_ in index.descendants([data.uuid])]
+
+    def stale_outputs(self, experiment, changed=None, full_hash=False):
+        """Find the processed data that are stale after raw data changes
+
+        A processed data is stale if one of its ancestors changed. The stale
+        data are found with one traversal of the provenance index, without
+        reading the processed data metadata
+
+        Parameters
+        ----------
+        experiment: Experiment
+            Container of the experiment metadata
+        changed: list
+            The changed data (Data containers, for example the re-imported or
+            re-tagged raw data). Default is the raw data whose file changed
+            since the import (see changed_data)
+        full_hash: bool
+            Passed to changed_data when changed is None
+
+        Returns
+        -------
+        list
+            The Container (md_uri, uuid) of the stale processed data
+        """
+
+        if changed is None:
+            changed = self.changed_data(experiment, full_hash)
+        index = self.service.get_provenance(experiment.md_uri)
+        return [index.container(uuid_) for uuid_ in
+                index.descendants([data.uuid for data in changed])]
+
     def get_dataset(self, experiment, name):
         """Query a dataset from it name
 
@@ -413,7 +715,7 @@ class Request(Observable):
                     return pdataset
         return None
 
-    def get_data(self, dataset, query='', origin_output_name=''):
+    def get_data(self, dataset, query='', origin_output_name='', fields=None):
         """Query data from a dataset
 
         Parameters
@@ -425,56 +727,270 @@ class Request(Observable):
         origin_output_name
             Name of the output origin (ex: -o) in the case of ProcessedDataset
             search
+        fields
+            List of the fields to return (ex: ['uri', 'tags.ID']). See
+            iter_data for the available fields
 
         Returns
         -------
         list
-            List of selected data (list of RawData or ProcessedData objects)
+            List of selected data (list of RawData or ProcessedData objects),
+            or list of tuples of the fields values if fields is set
         """
 
-        if len(dataset.uris) < 1:
-            return list()
+        return list(self.iter_data(dataset, query, origin_output_name,
+                                   fields=fields))
 
-        # search the dataset
-        queries = re.split(' AND ', query)
+    def iter_data(self, dataset, query='', origin_output_name='', limit=None,
+                  offset=0, fields=None):
+        """Lazily query data from a dataset
 
-        # initially all the raw data are selected
-        #  first_data = self.get_rawdata(dataset.uris[0].md_uri)
-        selected_list = []
-        # raw dataset
-        if dataset.name == 'data':
-            for data_info in dataset.uris:
-                data_container = self.get_rawdata(data_info.md_uri)
-                selected_list.append(self._rawdata_to_search_container(
-                    data_container))
-        # processed dataset
-        else:
-            pre_list = []
-            for data_info in dataset.uris:
-                p_con = self.get_processeddata(data_info.md_uri)
-                pre_list.append(self._processed_data_to_search_container(p_con))
-            # remove the data where output origin is not the asked one
-            if origin_output_name != '':
-                for pdata in pre_list:
-                    data = self.get_processeddata(pdata.uri())
-                    if data.output["name"] == origin_output_name:
-                        selected_list.append(pdata)
-            else:
-                selected_list = pre_list
+        The metadata are read one data at a time and the selected data are
+        yielded as soon as they match the query. The reading stops as soon as
+        `limit` data have been yielded
+
+        Parameters
+        ----------
+        dataset: Dataset
+            Object containing the dataset metadata
+        query
+            String query with the key=value format.
+        origin_output_name
+            Name of the output origin (ex: -o) in the case of ProcessedDataset
+            search
+        limit: int
+            Maximum number of data to yield. None to yield all the selected
+            data
+        offset: int
+            Number of selected data to skip before yielding
+        fields: list
+            List of the fields to return instead of the data containers.
+            Available fields are 'md_uri', 'uuid', 'type', 'name', 'author',
+            'date', 'format', 'uri', 'tags', 'tags.<key>', 'output.name',
+            'output.label' and 'run'. For processed data, the tags are the
+            tags of the origin raw data
+
+        Yields
+        ------
+        RawData or ProcessedData
+            The selected data, in the dataset order. If fields is set, a tuple
+            with the values of the fields is yielded instead
+        """
+
+        if limit is not None and limit <= 0:
+            return
 
-        # run all the AND queries on the preselected dataset
+        queries = []
         if query != '':
-            for q in queries:
-                selected_list = query_list_single(selected_list, q)
-
-        # convert SearchContainer list to uri list
-        out = []
-        for d in selected_list:
-            if dataset.name == 'data':
-                out.append(self.get_rawdata(d.uri()))
+            queries = re.split(' AND ', query)
+
+        skipped = 0
+        count = 0
+        for data_info in dataset.uris:
+            # projection
+            if fields is not None:
+                container, data = self._project_data(dataset, data_info.md_uri,
+                                                     fields,
+                                                     origin_output_name)
+                if container is None:
+                    continue
+            # raw dataset
+            elif dataset.name == 'data':
+                data = self.get_rawdata(data_info.md_uri)
+                container = self._rawdata_to_search_container(data)
+            # processed dataset
             else:
-                out.append(self.get_processeddata(d.uri()))
-        return out
+                data = self.get_processeddata(data_info.md_uri)
+                # remove the data where output origin is not the asked one
+                if origin_output_name != '' and \
+                        data.output["name"] != origin_output_name:
+                    continue
+                container = self._processed_data_to_search_container(data)
+
+            if not query_single(container, queries):
+                continue
+            if skipped < offset:
+                skipped += 1
+                continue
+            yield data
+            count += 1
+            if limit is not None and count >= limit:
+                return
+
+    def group_by(self, dataset, keys, query='', origin_output_name=''):
+        """Group the data of a dataset by tag values
+
+        The dataset is read in a single pass using the data projection
+
+        Parameters
+        ----------
+        dataset: Dataset
+            Object containing the dataset metadata
+        keys: list
+            List of the tag keys to group by (ex: ['Population', 'ID'])
+        query
+            String query with the key=value format to select the data to
+            group
+        origin_output_name
+            Name of the output origin (ex: -o) in the case of ProcessedDataset
+            search
+
+        Returns
+        -------
+        dict
+            {(value1, value2, ...): [md_uri, md_uri, ...]} with one tuple of
+            tag values (in the keys order) per group. A missing tag has an
+            empty value
+        """
+
+        groups = dict()
+        fields = ['md_uri'] + ['tags.' + key for key in keys]
+        for record in self.iter_data(dataset, query, origin_output_name,
+                                     fields=fields):
+            groups.setdefault(record[1:], []).append(record[0])
+        return groups
+
+    def count(self, dataset, keys=None, query='', origin_output_name=''):
+        """Count the data of a dataset, optionally per tag values
+
+        Parameters
+        ----------
+        dataset: Dataset
+            Object containing the dataset metadata
+        keys: list
+            List of the tag keys to count by. None to count all the selected
+            data
+        query
+            String query with the key=value format to select the data to
+            count
+        origin_output_name
+            Name of the output origin (ex: -o) in the case of ProcessedDataset
+            search
+
+        Returns
+        -------
+        int or dict
+            The number of selected data if keys is None, otherwise
+            {(value1, value2, ...): count} with one entry per group
+        """
+
+        if keys is None:
+            if query == '' and origin_output_name == '':
+                return dataset.size()
+            return sum(1 for _ in self.iter_data(dataset, query,
+                                                 origin_output_name,
+                                                 fields=['md_uri']))
+        counts = dict()
+        fields = ['tags.' + key for key in keys]
+        for record in self.iter_data(dataset, query, origin_output_name,
+                                     fields=fields):
+            counts[record] = counts.get(record, 0) + 1
+        return counts
+
+    def query_workspace(self, workspace_uri, query='', experiments=None,
+                        datasets=None, origin_output_name='', fields=None,
+                        workers=4, buffer_size=1024):
+        """Query the data of several experiments and datasets
+
+        The datasets are queried in parallel by a pool of threads, each one
+        reading its datasets lazily (see iter_data). The selected data are
+        yielded as soon as they are found, so the results of the datasets are
+        interleaved. At most buffer_size results are kept in memory
+
+        Example
+        -------
+            >>> for experiment, dataset, data in req.query_workspace(
+            >>>         workspace, 'Population=population1',
+            >>>         datasets=['data']):
+            >>>     print(experiment.name, data.name)
+
+        Parameters
+        ----------
+        workspace_uri: str
+            URI of the workspace containing the experiments
+        query: str
+            String query with the key=value format
+        experiments: list
+            Names of the experiments to query. Default is all the
+            experiments of the workspace
+        datasets: list
+            Names of the datasets to query in each experiment ('data' for the
+            raw dataset). Default is all the datasets
+        origin_output_name: str
+            Name of the output origin for the processed datasets
+        fields: list
+            List of the fields to return instead of the data containers (see
+            iter_data)
+        workers: int
+            Number of threads querying the datasets
+        buffer_size: int
+            Maximum number of results waiting to be consumed
+
+        Yields
+        ------
+        tuple
+            (Experiment, dataset name, selected data or fields tuple)
+        """
+
+        tasks = queue.Queue()
+        for experiment_info in self.experiments(workspace_uri):
+            experiment = experiment_info['info']
+            if experiments is not None and experiment.name not in experiments:
+                continue
+            for dataset_info in [experiment.rawdataset] + \
+                    experiment.processeddatasets:
+                if datasets is None or dataset_info.name in datasets:
+                    tasks.put((experiment, dataset_info))
+
+        results = queue.Queue(maxsize=buffer_size)
+        stop = threading.Event()
+        done = object()
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    results.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def worker():
+            try:
+                while not stop.is_set():
+                    try:
+                        experiment_, dataset_info_ = tasks.get_nowait()
+                    except queue.Empty:
+                        break
+                    dataset = self.get_dataset_from_uri(dataset_info_.url)
+                    for data in self.iter_data(dataset, query,
+                                               origin_output_name,
+                                               fields=fields):
+                        if not put((experiment_, dataset.name, data)):
+                            return
+            except BaseException as error:
+                put(error)
+            finally:
+                put(done)
+
+        threads = [threading.Thread(target=worker, daemon=True)
+                   for _ in range(max(1, min(workers, tasks.qsize())))]
+        for thread in threads:
+            thread.start()
+        try:
+            running = len(threads)
+            while running > 0:
+                item = results.get()
+                if item is done:
+                    running -= 1
+                elif isinstance(item, BaseException):
+                    raise item
+                else:
+                    yield item
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
 
     def create_dataset(self, experiment, dataset_name):
         """Create a processed dataset in an experiment
@@ -527,7 +1043,7 @@ class Request(Observable):
 
         return self.service.get_run(uri)
 
-    def create_data(self, dataset, run, processed_data):
+    def create_data(self, dataset, run, processed_data, snapshot_tags=False):
         """Create a new processed data for a given dataset
 
         Parameters
@@ -539,14 +1055,471 @@ class Request(Observable):
         processed_data: ProcessedData
             Object containing the new processed data. md_uri is ignored and
             created automatically by this method
+        snapshot_tags: bool
+            True to store the tags and the uuid of the origin raw data in the
+            processed data metadata. The queries on the processed dataset
+            then do not read the origin data (see refresh_origin_tags)
 
         Returns
         -------
         ProcessedData object with the metadata and the new created md_uri
         """
 
+        if snapshot_tags:
+            self._snapshot_origin(processed_data)
         return self.service.create_data(dataset, run, processed_data)
 
+    def _snapshot_origin(self, processed_data, parent=None):
+        """Set the origin tags snapshot of a processed data
+
+        Parameters
+        ----------
+        processed_data: ProcessedData
+            Processed data to update
+        parent: Data
+            The first input of the processed data if it is already read
+        """
+
+        if parent is None:
+            parent = self.get_parent(processed_data)
+        if isinstance(parent, ProcessedData):
+            if parent.origin_tags is not None:
+                processed_data.origin_uuid = parent.origin_uuid
+                processed_data.origin_tags = dict(parent.origin_tags)
+                return
+            parent = self.get_origin(parent)
+        if parent is None:
+            processed_data.origin_uuid = ''
+            processed_data.origin_tags = {}
+        else:
+            processed_data.origin_uuid = parent.uuid
+            processed_data.origin_tags = dict(parent.tags)
+
+    def _origin_uuid(self, md_uri):
+        """Get the uuid of the origin raw data of a processed data
+
+        The first inputs are followed up to the raw data, as in get_origin.
+        An empty string is returned if the origin is not found
+        """
+
+        try:
+            parent = self.service.get_data_fields(md_uri, ['parent'])[0]
+            while parent is not None and parent[0] != METADATA_TYPE_RAW():
+                parent = self.service.get_data_fields(parent[1],
+                                                      ['parent'])[0]
+            if parent is None:
+                return ''
+            return self.service.get_data_fields(parent[1], ['uuid'])[0]
+        except SciXtracerError:
+            return ''
+
+    def refresh_origin_tags(self, experiment, datasets=None, add=False):
+        """Refresh the origin tags snapshots of the processed data
+
+        The snapshots are stale when the tags of the raw data change. Each
+        raw data is read once, and only the processed data whose snapshot
+        changed are written. The snapshot of a processed data whose origin
+        raw data is not found is cleared
+
+        Parameters
+        ----------
+        experiment: Experiment
+            Container of the experiment metadata
+        datasets: list
+            Names of the processed datasets to refresh. Default is all the
+            processed datasets
+        add: bool
+            True to also snapshot the tags of the processed data that have
+            no snapshot
+
+        Returns
+        -------
+        int
+            Number of processed data with a refreshed snapshot
+        """
+
+        raw_tags = dict()
+        for data_info in self.get_rawdataset(experiment).uris:
+            uuid_, tags = self.service.get_data_fields(data_info.md_uri,
+                                                       ['uuid', 'tags'])
+            raw_tags[uuid_] = tags
+
+        updated = 0
+        with self.batch():
+            for dataset_info in experiment.processeddatasets:
+                if datasets is not None and dataset_info.name not in datasets:
+                    continue
+                dataset = self.get_dataset_from_uri(dataset_info.url)
+                for data_info in dataset.uris:
+                    snapshot, = self.service.get_data_fields(
+                        data_info.md_uri, ['origin.snapshot'])
+                    if snapshot is None and not add:
+                        continue
+                    if snapshot is None:
+                        snapshot = {
+                            'uuid': self._origin_uuid(data_info.md_uri),
+                            'tags': None
+                        }
+                    tags = raw_tags.get(snapshot['uuid'])
+                    if tags is None:
+                        # the origin is not found: clear a stale snapshot
+                        if snapshot['tags'] is not None:
+                            processed_data = self.get_processeddata(
+                                data_info.md_uri)
+                            processed_data.origin_uuid = ''
+                            processed_data.origin_tags = None
+                            self.update_processeddata(processed_data)
+                        continue
+                    if snapshot['tags'] == tags:
+                        continue
+                    processed_data = self.get_processeddata(data_info.md_uri)
+                    processed_data.origin_uuid = snapshot['uuid']
+                    processed_data.origin_tags = dict(tags)
+                    self.update_processeddata(processed_data)
+                    updated += 1
+        return updated
+
+    def _project_data(self, dataset, md_uri, fields, origin_output_name):
+        """Read the fields of a data and its search container
+
+        Parameters
+        ----------
+        dataset: Dataset
+            Object containing the dataset metadata
+        md_uri: str
+            URI of the data metadata
+        fields: list
+            List of the fields to read
+        origin_output_name: str
+            Name of the output origin for processed data. The data is not
+            selected if its output name is different
+
+        Returns
+        -------
+        tuple
+            (SearchContainer, tuple of the fields values), or (None, None) if
+            the data does not come from origin_output_name
+        """
+
+        read_fields = ['name', 'tags', 'output.name', 'parent',
+                       'origin.snapshot']
+        values = dict(zip(read_fields + fields,
+                          self.service.get_data_fields(md_uri,
+                                                       read_fields + fields)))
+        if dataset.name == 'data':
+            tags = values['tags']
+        else:
+            if origin_output_name != '' and \
+                    values['output.name'] != origin_output_name:
+                return None, None
+            if values['origin.snapshot'] is not None:
+                tags = values['origin.snapshot']['tags']
+            else:
+                tags = self._origin_tags(values['parent'])
+
+        container = SearchContainer()
+        container.data['name'] = values['name']
+        container.data['uri'] = md_uri
+        container.data['tags'] = tags
+
+        record = []
+        for field in fields:
+            if field == 'tags':
+                record.append(tags)
+            elif field.startswith('tags.'):
+                record.append(tags.get(field[5:], ''))
+            else:
+                record.append(values[field])
+        return container, tuple(record)
+
+    def _origin_tags(self, parent):
+        """Get the tags of the origin raw data of a processed data
+
+        Parameters
+        ----------
+        parent: tuple
+            (type, md_uri) of the first input of the processed data
+
+        Returns
+        -------
+        dict
+            Tags of the origin raw data. Empty if the origin is not found
+        """
+
+        try:
+            while parent is not None and parent[0] != METADATA_TYPE_RAW():
+                parent = self.service.get_data_fields(parent[1],
+                                                      ['parent'])[0]
+            if parent is None:
+                return {}
+            return self.service.get_data_fields(parent[1], ['tags'])[0]
+        except SciXtracerError:
+            return {}
+
+    def create_data_many(self, dataset, run, processed_list, workers=1,
+                         snapshot_tags=False):
+        """Create several processed data for a given dataset in one call
+
+        Parameters
+        ----------
+        dataset: Dataset
+            Object of the dataset metadata
+        run: Run
+            Metadata of the run
+        processed_list: list
+            List of ProcessedData objects containing the new processed data.
+            md_uri is ignored and created automatically by this method
+        workers: int
+            Number of parallel workers used to write the metadata
+        snapshot_tags: bool
+            True to store the origin tags in the processed data metadata
+            (see create_data)
+
+        Returns
+        -------
+        list
+            The ProcessedData objects with the metadata and the new created
+            md_uri
+        """
+
+        if snapshot_tags:
+            for processed_data in processed_list:
+                self._snapshot_origin(processed_data)
+        return self.service.create_data_many(dataset, run, processed_list,
+                                             workers)
+
+    def map_run(self, dataset, run_info, func, query=None,
+                origin_output_name=None, workers=1, skip_existing=False,
+                snapshot_tags=False, chunk_size=1000):
+        """Execute a process on each data of a dataset and register the outputs
+
+        The data are selected with the query of the first run input. func is
+        called once per selected data, in a pool of worker processes if
+        workers > 1, and the returned processed data are registered in the
+        run processed dataset by chunks of chunk_size data, each in a bulk
+        write. If func raises, the outputs already computed stay registered,
+        so that the run can be resumed with skip_existing. The progress is
+        notified to the observers
+
+        Parameters
+        ----------
+        dataset: Dataset
+            Dataset containing the input data
+        run_info: Run
+            Metadata of the run, already created with create_run
+        func: callable
+            Function func(data, parameters) processing one data, where
+            parameters is the {name: value} dictionary of the run
+            parameters. It returns a ProcessedData (or None to skip the data).
+            If the ProcessedData has no input, the data is added as the run
+            input. func must be picklable (a module level function) when
+            workers > 1
+        query: str
+            Query selecting the input data. Default is the query of the first
+            run input
+        origin_output_name: str
+            Name of the output origin for a processed input dataset. Default
+            is the origin output name of the first run input
+        workers: int
+            Number of worker processes
+        skip_existing: bool
+            True to skip the data that already have an output from a run with
+            the same fingerprint (see get_unprocessed_data). It makes the
+            restart of an interrupted run incremental
+        snapshot_tags: bool
+            True to store the origin tags in the outputs metadata (see
+            create_data)
+        chunk_size: int
+            Number of outputs registered in each bulk write
+
+        Returns
+        -------
+        list
+            List of the Container (md_uri, uuid) of the created processed
+            data. The processed data are not kept in memory
+        """
+
+        if run_info.md_uri == '':
+            raise SciXtracerError('The run must be created with create_run '
+                                  'before being executed')
+        input_name = 'i'
+        if len(run_info.inputs) > 0:
+            input_name = run_info.inputs[0].name
+            if query is None:
+                query = run_info.inputs[0].query
+            if origin_output_name is None:
+                origin_output_name = run_info.inputs[0].origin_output_name
+        if skip_existing:
+            data_list = self.get_unprocessed_data(dataset, run_info, query,
+                                                  origin_output_name)
+        else:
+            data_list = self.get_data(dataset, query or '',
+                                      origin_output_name or '')
+        return self._map_data(data_list, run_info, func, input_name, workers,
+                              snapshot_tags, chunk_size)
+
+    def get_unprocessed_data(self, dataset, run_info, query=None,
+                             origin_output_name=None):
+        """Query the data that have no output yet for a run
+
+        A data is processed if an output in the run processed dataset has
+        the data as first input and was created by a run with the same
+        fingerprint (same process URI, parameters and inputs) as run_info
+
+        Parameters
+        ----------
+        dataset: Dataset
+            Dataset containing the input data
+        run_info: Run
+            Metadata of the run. Its processeddataset must be set (see
+            create_run)
+        query: str
+            Query selecting the input data. Default is the query of the first
+            run input
+        origin_output_name: str
+            Name of the output origin for a processed input dataset. Default
+            is the origin output name of the first run input
+
+        Returns
+        -------
+        list
+            List of the selected data (RawData or ProcessedData) without
+            output
+        """
+
+        if len(run_info.inputs) > 0:
+            if query is None:
+                query = run_info.inputs[0].query
+            if origin_output_name is None:
+                origin_output_name = run_info.inputs[0].origin_output_name
+
+        processeddataset = run_info.processeddataset
+        if not isinstance(processeddataset, Dataset):
+            processeddataset = self.get_dataset_from_uri(
+                processeddataset.md_uri)
+        fingerprint = run_info.fingerprint()
+        runs = set(os.path.normpath(run.md_uri)
+                   for run in self.service.get_dataset_runs(processeddataset)
+                   if run.fingerprint() == fingerprint)
+
+        processed = set()
+        if len(runs) > 0:
+            for data_info in processeddataset.uris:
+                run_uri, parent = self.service.get_data_fields(
+                    data_info.md_uri, ['run', 'parent'])
+                if parent is not None and os.path.normpath(run_uri) in runs:
+                    processed.add(os.path.normpath(parent[1]))
+
+        return [data for data in self.iter_data(dataset, query or '',
+                                                origin_output_name or '')
+                if os.path.normpath(data.md_uri) not in processed]
+
+    def _map_data(self, data_list, run_info, func, input_name, workers,
+                  snapshot_tags=False, chunk_size=1000):
+        """Execute func on each data and register the outputs of a run
+
+        Parameters
+        ----------
+        data_list: list
+            List of the input data
+        run_info: Run
+            Metadata of the run
+        func: callable
+            Function func(data, parameters) returning a ProcessedData
+        input_name: str
+            Name of the run input used to link the outputs to the data
+        workers: int
+            Number of worker processes
+        snapshot_tags: bool
+            True to store the origin tags in the outputs metadata
+        chunk_size: int
+            Number of outputs registered in each bulk write
+
+        Returns
+        -------
+        list
+            List of the Container (md_uri, uuid) of the created processed
+            data
+        """
+
+        parameters = {parameter.name: parameter.value
+                      for parameter in run_info.parameters}
+        processeddataset = run_info.processeddataset
+        if not isinstance(processeddataset, Dataset):
+            processeddataset = self.get_dataset_from_uri(
+                processeddataset.md_uri)
+
+        created = []
+        outputs = []
+
+        def register():
+            for processed_data in self.service.create_data_many(
+                    processeddataset, run_info, outputs):
+                created.append(Container(processed_data.md_uri,
+                                         processed_data.uuid))
+            outputs.clear()
+
+        count = 0
+        try:
+            for data, processed_data in self._map_results(
+                    data_list, func, parameters, workers):
+                count += 1
+                self.notify_observers(int(100 * count / len(data_list)),
+                                      data.name)
+                if processed_data is None:
+                    continue
+                parent = None
+                if len(processed_data.inputs) == 0:
+                    processed_data.add_input(input_name, data)
+                    parent = data
+                if snapshot_tags:
+                    self._snapshot_origin(processed_data, parent)
+                outputs.append(processed_data)
+                if len(outputs) >= chunk_size:
+                    register()
+        finally:
+            # the outputs computed before a failure are registered too
+            if outputs:
+                register()
+        return created
+
+    @staticmethod
+    def _map_results(data_list, func, parameters, workers):
+        """Iterate over the results of func on each data, in the data order
+
+        With workers > 1, func runs in a pool of processes and at most
+        2 * workers data are submitted ahead of the result being read, so
+        that the results do not accumulate in memory. The data not yet
+        started are cancelled if the iteration stops
+
+        Yields
+        ------
+        tuple
+            (data, result of func)
+        """
+
+        if workers <= 1 or len(data_list) <= 1:
+            for data in data_list:
+                yield data, func(data, parameters)
+            return
+
+        data_iter = iter(data_list)
+        pending = deque()
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            try:
+                for data in islice(data_iter, 2 * workers):
+                    pending.append((data, executor.submit(func, data,
+                                                          parameters)))
+                while pending:
+                    data, future = pending.popleft()
+                    for next_data in islice(data_iter, 1):
+                        pending.append((next_data, executor.submit(
+                            func, next_data, parameters)))
+                    yield data, future.result()
+            finally:
+                for _, future in pending:
+                    future.cancel()
+
     @staticmethod
     def _rawdata_to_search_container(rawdata):
         """convert a RawData to SearchContainer
@@ -581,14 +1554,18 @@ class Request(Observable):
         """
 
         container = None
-        try:
-            origin = self.get_origin(processeddata)
-            if origin is not None:
-                container = self._rawdata_to_search_container(origin)
-            else:
-                container = SearchContainer()
-        except SciXtracerError:
+        if processeddata.origin_tags is not None:
             container = SearchContainer()
+            container.data['tags'] = processeddata.origin_tags
+        else:
+            try:
+                origin = self.get_origin(processeddata)
+                if origin is not None:
+                    container = self._rawdata_to_search_container(origin)
+                else:
+                    container = SearchContainer()
+            except SciXtracerError:
+                container = SearchContainer()
         container.data['name'] = processeddata.name
         container.data['uri'] = processeddata.md_uri
         container.data['uuid'] = processeddata.uuid
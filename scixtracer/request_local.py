@@ -10,17 +10,31 @@ LocalRequest
 """
 
 import os
+import re
+import sys
 import json
 from shutil import copyfile
+from stat import S_IRUSR, S_IRGRP, S_IROTH
+from concurrent.futures import ThreadPoolExecutor
 import uuid
 
-from .utils import SciXtracerError
+from .utils import SciXtracerError, file_hash, copy_file_hash
+from .instrumentation import instrumented, span, count
+from .packed_store import PACK_FILE, PackedStore
+from .provenance import ProvenanceIndex
+from .manifest import ImportManifest
+from .codecs import JsonCodec, get_codec, detect_codec
 from .containers import (METADATA_TYPE_RAW, METADATA_TYPE_PROCESSED, RawData,
                          ProcessedData, Dataset, DatasetInfo, Container,
                          Experiment, Run, ProcessedDataInputContainer,
                          RunInputContainer, RunParameterContainer)
 
 
+_MISSING = object()
+_RUN_FILE = re.compile(r'^run(?:_(\d+))?\.md\.json$')
+STORE_DIR = '.scixtracer_store'
+
+
 class RequestLocalServiceBuilder:
     """Service builder for the metadata service"""
 
@@ -38,23 +52,414 @@ class LocalRequestService:
 
     def __init__(self):
         self.service_name = 'LocalMetadataService'
+        self._packs = dict()
+        self._formats = dict()
+        self._batch_depth = 0
+        self._savepoints = []
+        self._uri_positions = dict()
+        self._pending = dict()
+        self._pending_datasets = dict()
+        self._provenance = dict()
+        self._pending_provenance = []
+        self._pending_imports = []
 
     @staticmethod
     def _generate_uuid():
         return str(uuid.uuid4())
 
+    def _pack_store(self, directory: str):
+        """Get the packed store of a directory
+
+        Parameters
+        ----------
+        directory: str
+            Absolute path of the directory
+
+        Returns
+        -------
+        The PackedStore of the directory, or None if it is not packed
+        """
+
+        if directory in self._packs:
+            if self._packs[directory].is_valid():
+                count('cache.hit', cache='pack')
+                return self._packs[directory]
+            self._packs.pop(directory).close()
+        if os.path.isfile(os.path.join(directory, PACK_FILE)):
+            self._packs[directory] = PackedStore(directory)
+            return self._packs[directory]
+        return None
+
+    def close_packs(self):
+        """Release the packed stores opened by the service"""
+        for store in self._packs.values():
+            store.close()
+        self._packs = dict()
+
+    def begin_batch(self):
+        """Start buffering the metadata writes
+
+        Until the batch is committed, the written metadata are kept in memory
+        and the repeated writes of the same metadata file are coalesced.
+        Datasets are kept as containers and serialized once at commit.
+        Batches can be nested, the writes are flushed when the outermost
+        batch is committed. A nested batch keeps a savepoint, an undo log of
+        the buffered writes it changes, so that its rollback discards only
+        its own writes
+        """
+        if self._batch_depth > 0:
+            self._savepoints.append({
+                # {md_uri: buffered metadata before the first change}
+                'pending': dict(),
+                # the datasets are containers changed in place
+                'datasets': {md_uri: (dataset, len(dataset.uris))
+                             for md_uri, dataset
+                             in self._pending_datasets.items()},
+                # [(uris list, position, replaced container)]
+                'replaced': [],
+                'provenance': len(self._pending_provenance),
+                'imports': len(self._pending_imports)})
+        self._batch_depth += 1
+
+    @instrumented
+    def commit_batch(self):
+        """End a batch and write the buffered metadata"""
+        self._batch_depth -= 1
+        if self._batch_depth > 0:
+            # the enclosing batch takes over the undo log
+            savepoint = self._savepoints.pop()
+            if self._savepoints:
+                outer = self._savepoints[-1]
+                for md_uri, metadata in savepoint['pending'].items():
+                    outer['pending'].setdefault(md_uri, metadata)
+                outer['replaced'].extend(savepoint['replaced'])
+            return
+        pending = self._pending
+        self._pending = dict()
+        self._pending_datasets = dict()
+        self._uri_positions = dict()
+        pending_provenance = self._pending_provenance
+        self._pending_provenance = []
+        pending_imports = self._pending_imports
+        self._pending_imports = []
+        packed = dict()
+        for md_uri, metadata in pending.items():
+            if callable(metadata):
+                metadata = metadata()
+            store = None
+            if not os.path.isfile(md_uri):
+                store = self._pack_store(os.path.dirname(md_uri))
+            if store is not None:
+                packed.setdefault(store, []).append(
+                    (os.path.basename(md_uri), metadata))
+            else:
+                self._write_file(metadata, md_uri)
+        for store, records in packed.items():
+            store.append_many(records)
+        provenance = dict()
+        for experiment_dir, record in pending_provenance:
+            provenance.setdefault(experiment_dir, []).append(record)
+        for experiment_dir, records in provenance.items():
+            self._append_provenance(experiment_dir, records)
+        # the imports are checkpointed once their metadata are written
+        imports = dict()
+        for experiment_dir, record in pending_imports:
+            imports.setdefault(experiment_dir, []).append(record)
+        for experiment_dir, records in imports.items():
+            ImportManifest(experiment_dir).append(records)
+
+    def rollback_batch(self):
+        """End a batch and discard the metadata it buffered
+
+        The writes buffered by the enclosing batches are kept
+        """
+        self._batch_depth -= 1
+        if self._batch_depth > 0:
+            savepoint = self._savepoints.pop()
+            for md_uri, metadata in savepoint['pending'].items():
+                if metadata is _MISSING:
+                    self._pending.pop(md_uri, None)
+                else:
+                    self._pending[md_uri] = metadata
+            for uris, position, container in reversed(savepoint['replaced']):
+                if position < len(uris):
+                    uris[position] = container
+            datasets = savepoint['datasets']
+            for md_uri, (dataset, size) in datasets.items():
+                del dataset.uris[size:]
+            for md_uri in list(self._pending_datasets):
+                if md_uri not in datasets:
+                    del self._pending_datasets[md_uri]
+            del self._pending_provenance[savepoint['provenance']:]
+            del self._pending_imports[savepoint['imports']:]
+            return
+        self._pending = dict()
+        self._pending_datasets = dict()
+        self._uri_positions = dict()
+        self._pending_provenance = []
+        self._pending_imports = []
+
+    def _is_metadata(self, md_uri: str) -> bool:
+        """Check if a metadata file exists, as a file or in a packed store"""
+        if md_uri in self._pending:
+            return True
+        if os.path.isfile(md_uri):
+            return True
+        store = self._pack_store(os.path.dirname(md_uri))
+        return store is not None and store.contains(os.path.basename(md_uri))
+
+    def _set_format(self, experiment_md_uri: str, format_: str):
+        """Set the metadata codec of the data of an experiment"""
+        experiment_dir = os.path.dirname(os.path.abspath(experiment_md_uri))
+        self._formats[experiment_dir] = get_codec(format_).name
+
+    def _codec_for(self, md_uri: str):
+        """Get the codec used to write a metadata file
+
+        The data, dataset and run metadata of an experiment are stored in the
+        sub directories of the experiment directory. They are written with the
+        format of the experiment. The other files are written in JSON.
+        The format of an experiment that was not read by this service is
+        read once from its experiment.md.json file
+        """
+        experiment_dir = os.path.dirname(os.path.dirname(md_uri))
+        format_ = self._formats.get(experiment_dir)
+        if format_ is None:
+            experiment_uri = os.path.join(experiment_dir, 'experiment.md.json')
+            if experiment_uri not in self._pending and \
+                    not os.path.isfile(experiment_uri):
+                return JsonCodec
+            metadata = self._read_json(experiment_uri) or dict()
+            format_ = get_codec(metadata.get('format', JsonCodec.name)).name
+            self._formats[experiment_dir] = format_
+        return get_codec(format_)
+
+    def _read_json(self, md_uri: str):
+        """Read the metadata from the a json file
+
+        The codec of the file (json or msgpack) is detected from its content
+        """
+        if md_uri in self._pending:
+            count('cache.hit', cache='batch')
+            metadata = self._pending[md_uri]
+            return metadata() if callable(metadata) else metadata
+        with span('LocalRequestService._read_json', uri=md_uri) as span_:
+            if os.path.isfile(md_uri):
+                with open(md_uri, 'rb') as md_file:
+                    content = md_file.read()
+                span_.set('bytes', len(content))
+                if len(content) > 0:
+                    return detect_codec(content).decode(content)
+                return None
+            store = self._pack_store(os.path.dirname(md_uri))
+            if store is not None and store.contains(os.path.basename(md_uri)):
+                span_.set('source', 'pack')
+                return store.read(os.path.basename(md_uri))
+            raise SciXtracerError('Metadata file not found: ' + md_uri)
+
+    def _write_json(self, metadata, md_uri: str):
+        """Write the metadata to the a json file
+
+        The metadata are appended to the packed store of the directory if the
+        directory is packed and the metadata file does not exist. During a
+        batch, the metadata are buffered in memory. metadata can be a
+        function returning the metadata dictionary to defer the
+        serialization to the batch commit
+        """
+        if self._batch_depth > 0:
+            if self._savepoints:
+                self._savepoints[-1]['pending'].setdefault(
+                    md_uri, self._pending.get(md_uri, _MISSING))
+            if md_uri in self._pending:
+                count('cache.coalesced_write')
+            self._pending[md_uri] = metadata
+            return
+        if callable(metadata):
+            metadata = metadata()
+        with span('LocalRequestService._write_json', uri=md_uri) as span_:
+            if not os.path.isfile(md_uri):
+                store = self._pack_store(os.path.dirname(md_uri))
+                if store is not None:
+                    span_.set('source', 'pack')
+                    store.append(os.path.basename(md_uri), metadata)
+                    return
+            span_.set('bytes', self._write_file(metadata, md_uri))
+
+    def _write_file(self, metadata: dict, md_uri: str) -> int:
+        """Write the metadata to a loose file with the codec of the file
+
+        Returns
+        -------
+        The number of bytes written
+        """
+        codec = self._codec_for(md_uri)
+        if codec.name == JsonCodec.name:
+            with open(md_uri, 'w') as outfile:
+                json.dump(metadata, outfile, indent=4)
+                return outfile.tell()
+        with open(md_uri, 'wb') as outfile:
+            return outfile.write(codec.encode(metadata))
+
+    @staticmethod
+    def _experiment_dir(md_uri: str) -> str:
+        """Get the experiment directory of an experiment, data or run URI"""
+        md_uri = os.path.abspath(md_uri)
+        if os.path.basename(md_uri) == 'experiment.md.json':
+            return os.path.dirname(md_uri)
+        return os.path.dirname(os.path.dirname(md_uri))
+
+    @staticmethod
+    def _provenance_node(type_: str, md_uri: str, uuid_: str,
+                         **links) -> dict:
+        """Create the provenance index record of a data or run metadata"""
+        md_uri = os.path.abspath(md_uri)
+        experiment_dir = os.path.dirname(os.path.dirname(md_uri))
+        record = {'uuid': uuid_, 'type': type_,
+                  'url': LocalRequestService.to_unix_path(
+                      md_uri[len(experiment_dir) + 1:])}
+        record.update(links)
+        return record
+
     @staticmethod
-    def _read_json(md_uri: str):
-        """Read the metadata from the a json file"""
-        if os.path.getsize(md_uri) > 0:
-            with open(md_uri) as json_file:
-                return json.load(json_file)
+    def _processed_provenance(processeddata) -> dict:
+        """Create the provenance index record of a processed data"""
+        return LocalRequestService._provenance_node(
+            'processed', processeddata.md_uri, processeddata.uuid,
+            run=processeddata.run.uuid if processeddata.run else '',
+            inputs=[input_.uuid for input_ in processeddata.inputs])
+
+    def _record_provenance(self, md_uri: str, record: dict):
+        """Add a record to the provenance index of the experiment
+
+        During a batch, the records are added when the batch is committed
+        """
+        experiment_dir = os.path.dirname(os.path.dirname(md_uri))
+        if self._batch_depth > 0:
+            self._pending_provenance.append((experiment_dir, record))
+        else:
+            self._append_provenance(experiment_dir, [record])
+
+    def _append_provenance(self, experiment_dir: str, records: list):
+        """Append records to the provenance index file of an experiment
+
+        The experiments created without the provenance index are not
+        updated. Their index is built from the metadata when it is queried
+        """
+        index = self._provenance.get(experiment_dir)
+        if index is None:
+            index = ProvenanceIndex(experiment_dir)
+        if not index.exists():
+            self._provenance.pop(experiment_dir, None)
+            return
+        self._provenance[experiment_dir] = index
+        index.append(records)
+
+    @instrumented
+    def get_provenance(self, md_uri: str, rebuild=False):
+        """Get the provenance index of an experiment
+
+        The index is built from the metadata of the experiment if it does not
+        exist
+
+        Parameters
+        ----------
+        md_uri: str
+            URI of the experiment or of a data or run of the experiment
+        rebuild: bool
+            True to rebuild the index from the metadata of the experiment
+
+        Returns
+        -------
+        ProvenanceIndex
+        """
+
+        experiment_dir = self._experiment_dir(md_uri)
+        index = self._provenance.get(experiment_dir)
+        if index is None:
+            index = ProvenanceIndex(experiment_dir)
+        if rebuild or not index.exists():
+            index.write(self._scan_provenance(experiment_dir))
+        else:
+            index.refresh()
+        self._provenance[experiment_dir] = index
+        return index
+
+    @instrumented
+    def get_import_manifest(self, experiment):
+        """Get the files imported into an experiment by import_dir
+
+        Parameters
+        ----------
+        experiment: Experiment
+            Container of the experiment metadata
+
+        Returns
+        -------
+        ImportManifest
+        """
+
+        return ImportManifest(self._experiment_dir(experiment.md_uri)).load()
+
+    def checkpoint_import(self, experiment, source: str, size: int,
+                          mtime_ns: int, rawdata):
+        """Record an imported file in the import manifest of an experiment
+
+        During a batch, the file is recorded when the batch is committed, after
+        the metadata of the imported data are written
+
+        Parameters
+        ----------
+        experiment: Experiment
+            Container of the experiment metadata
+        source: str
+            Absolute path of the imported file
+        size: int
+            Size of the imported file in bytes
+        mtime_ns: int
+            Modification time of the imported file in nanoseconds
+        rawdata: RawData
+            Metadata of the imported data
+        """
+
+        experiment_dir = self._experiment_dir(experiment.md_uri)
+        md_uri = os.path.abspath(rawdata.md_uri)
+        record = ImportManifest.record(
+            source, size, mtime_ns,
+            self.to_unix_path(md_uri[len(experiment_dir) + 1:]))
+        if self._batch_depth > 0:
+            self._pending_imports.append((experiment_dir, record))
+        else:
+            ImportManifest(experiment_dir).append([record])
+
+    def _scan_provenance(self, experiment_dir: str) -> list:
+        """Create the provenance records of all the data of an experiment"""
+        experiment = self.get_experiment(
+            os.path.join(experiment_dir, 'experiment.md.json'))
+        records = []
+        rawdataset = self.get_dataset(experiment.rawdataset.url)
+        for uri in rawdataset.uris:
+            records.append(self._provenance_node('raw', uri.md_uri,
+                                                 uri.uuid))
+        for dataset_info in experiment.processeddatasets:
+            dataset = self.get_dataset(dataset_info.url)
+            for run in self.get_dataset_runs(dataset):
+                records.append(self._provenance_node('run', run.md_uri,
+                                                     run.uuid))
+            for uri in dataset.uris:
+                records.append(self._processed_provenance(
+                    self.get_processeddata(uri.md_uri)))
+        return records
 
     @staticmethod
-    def _write_json(metadata: dict, md_uri: str):
-        """Write the metadata to the a json file"""
-        with open(md_uri, 'w') as outfile:
-            json.dump(metadata, outfile, indent=4)
+    def _intern_tags(tags: dict):
+        """Copy a tags dictionary with interned keys and values
+
+        Tag keys and values are repeated in many data of an experiment.
+        Interning them keeps a single copy of each string in memory
+        """
+        return {sys.intern(key): (sys.intern(value)
+                                  if isinstance(value, str) else value)
+                for key, value in tags.items()}
 
     @staticmethod
     def md_file_path(md_uri):
@@ -192,8 +597,9 @@ class LocalRequestService:
         """
         return path.replace('\\\\', '/').replace('\\', '/')
 
+    @instrumented
     def create_experiment(self, name, author, date='now', tag_keys=None,
-                          destination=''):
+                          destination='', metadata_format='json'):
         """Create a new experiment
 
         Parameters
@@ -209,6 +615,8 @@ class LocalRequestService:
         destination: str
             Destination where the experiment is created. It is a the path of the
             directory where the experiment will be created for local use case
+        metadata_format: str
+            Codec used to store the data metadata ('json' or 'msgpack')
 
         Returns
         -------
@@ -222,6 +630,7 @@ class LocalRequestService:
         container.name = name
         container.author = author
         container.date = date
+        container.metadata_format = get_codec(metadata_format).name
         container.tag_keys = tag_keys
 
         # check the destination dir
@@ -256,6 +665,8 @@ class LocalRequestService:
                 'directory does not exists'
             )
 
+        self._set_format(os.path.join(experiment_path, 'experiment.md.json'),
+                         container.metadata_format)
         rawdataset = Dataset()
         rawdataset.uuid = self._generate_uuid()
         rawdataset.md_uri = rawdataset_md_url
@@ -267,8 +678,14 @@ class LocalRequestService:
         # save the experiment.md.json metadata file
         container.md_uri = os.path.join(experiment_path, 'experiment.md.json')
         self.update_experiment(container)
+
+        # start an empty provenance index
+        index = ProvenanceIndex(experiment_path)
+        index.write([])
+        self._provenance[experiment_path] = index
         return container
 
+    @instrumented
     def get_experiment(self, md_uri):
         """Read an experiment from the database
 
@@ -311,10 +728,14 @@ class LocalRequestService:
                                 dataset['uuid']))
             for tag in metadata['tags']:
                 container.tag_keys.append(tag)
+            container.metadata_format = metadata.get('format',
+                                                     JsonCodec.name)
+            self._set_format(md_uri, container.metadata_format)
             return container
         raise SciXtracerError('Cannot find the experiment metadata from the '
                               'given URI')
 
+    @instrumented
     def update_experiment(self, experiment):
         """Write an experiment to the database
 
@@ -349,10 +770,15 @@ class LocalRequestService:
         metadata['tags'] = []
         for tag in experiment.tag_keys:
             metadata['tags'].append(tag)
+        if experiment.metadata_format != JsonCodec.name:
+            metadata['format'] = experiment.metadata_format
+        self._set_format(md_uri, experiment.metadata_format)
         self._write_json(metadata, md_uri)
 
+    @instrumented
     def import_data(self, experiment, data_path, name, author, format_,
-                    date='now', tags=dict, copy=True):
+                    date='now', tags=dict, copy=True, hash_content=False,
+                    deduplicate=False, file_name=''):
         """import one data to the experiment
 
         The data is imported to the rawdataset
@@ -376,6 +802,18 @@ class LocalRequestService:
         copy: bool
             True to copy the data to the Experiment database
             False otherwise
+        hash_content: bool
+            True to record the hash of the data content in the metadata
+        deduplicate: bool
+            True to store the copied data in the content addressed store of
+            the workspace (the directory containing the experiment). Identical
+            files are stored once and hard linked into the experiment data
+            directory: the linked files share their content and are
+            read-only. Implies hash_content
+        file_name: str
+            Name of the data file in the experiment data directory. Default
+            is the base name of data_path. Importing a data with the same file
+            name as another data raises a SciXtracerError
 
         Returns
         -------
@@ -387,35 +825,78 @@ class LocalRequestService:
         data_dir_path = os.path.dirname(rawdataset_uri)
 
         # create the new data uri
-        data_base_name = os.path.basename(data_path)
+        data_base_name = file_name or os.path.basename(data_path)
         filtered_name = data_base_name.replace(' ', '')
         filtered_name, ext = os.path.splitext(filtered_name)
         md_uri = os.path.join(data_dir_path, filtered_name + '.md.json')
 
-        # create the container
-        metadata = RawData()
-        metadata.uuid = self._generate_uuid()
-        metadata.md_uri = md_uri
-        metadata.name = name
-        metadata.author = author
-        metadata.format = format_
-        metadata.date = date
-        metadata.tags = tags
+        if self._is_metadata(md_uri):
+            # the data is imported again (ex: resumed import): keep its uuid
+            # and tags so that the processed data and the provenance index
+            # still refer to it
+            reimport = True
+            metadata = self.get_rawdata(md_uri)
+            if metadata.name != name:
+                raise SciXtracerError(
+                    'Cannot import ' + name + ': the data file name ' +
+                    data_base_name + ' is already used by ' + metadata.name)
+            metadata.tags.update(tags)
+            metadata.date = date
+        else:
+            reimport = False
+            metadata = RawData()
+            metadata.uuid = self._generate_uuid()
+            metadata.md_uri = md_uri
+            metadata.name = name
+            metadata.author = author
+            metadata.format = format_
+            metadata.date = date
+            metadata.tags = tags
+        metadata.file_info = dict()
 
         # import data
         if copy:
             copied_data_path = os.path.join(data_dir_path, data_base_name)
-            copyfile(data_path, copied_data_path)
+            if os.path.isfile(copied_data_path) and \
+                    os.stat(copied_data_path).st_nlink > 1:
+                # replace a file linked to the store instead of writing
+                # through the link
+                os.remove(copied_data_path)
+            if deduplicate:
+                metadata.file_info['hash'] = self._store_data(
+                    data_path, copied_data_path)
+            elif hash_content:
+                metadata.file_info['hash'] = copy_file_hash(data_path,
+                                                            copied_data_path)
+            else:
+                copyfile(data_path, copied_data_path)
             metadata.uri = copied_data_path
         else:
             metadata.uri = data_path
+            if hash_content or deduplicate:
+                metadata.file_info['hash'] = file_hash(data_path)
+        stat = os.stat(metadata.uri)
+        metadata.file_info['size'] = stat.st_size
+        metadata.file_info['mtime_ns'] = stat.st_mtime_ns
         self.update_rawdata(metadata)
 
         # add data to experiment RawDataSet
         rawdataset_container = self.get_dataset(rawdataset_uri)
         raw_c = Container(md_uri=metadata.md_uri, uuid=metadata.uuid)
-        rawdataset_container.uris.append(raw_c)
-        self.update_dataset(rawdataset_container)
+        positions = self._dataset_positions(rawdataset_container) \
+            if reimport else None
+        position = positions.get(metadata.md_uri) if reimport else None
+        if position is None:
+            rawdataset_container.uris.append(raw_c)
+            self._index_appended(rawdataset_container)
+            self.update_dataset(rawdataset_container)
+        elif rawdataset_container.uris[position].uuid != metadata.uuid:
+            if self._savepoints:
+                self._savepoints[-1]['replaced'].append((
+                    rawdataset_container.uris, position,
+                    rawdataset_container.uris[position]))
+            rawdataset_container.uris[position] = raw_c
+            self.update_dataset(rawdataset_container)
 
         # add tags keys to experiment
         for key in tags:
@@ -424,6 +905,96 @@ class LocalRequestService:
 
         return metadata
 
+    def _dataset_positions(self, dataset) -> dict:
+        """Get the positions of the data of a dataset by metadata URI
+
+        During a batch, the index is built once per dataset container and
+        kept up to date by the imports, so that the re-imports do not scan
+        the dataset for each data. It is rebuilt if the uris list was changed by
+        another request
+
+        Returns
+        -------
+        dict
+            {md_uri: position in dataset.uris}
+        """
+        md_uri = os.path.abspath(dataset.md_uri)
+        cached = self._uri_positions.get(md_uri)
+        if cached is None or cached[0] is not dataset.uris or \
+                cached[1] != len(dataset.uris):
+            cached = [dataset.uris, len(dataset.uris),
+                      {uri.md_uri: position
+                       for position, uri in enumerate(dataset.uris)}]
+            # out of a batch the dataset is read again by each request
+            if self._batch_depth > 0:
+                self._uri_positions[md_uri] = cached
+        return cached[2]
+
+    def _index_appended(self, dataset):
+        """Add the last data of a dataset to its positions index"""
+        cached = self._uri_positions.get(os.path.abspath(dataset.md_uri))
+        if cached is not None and cached[0] is dataset.uris and \
+                cached[1] == len(dataset.uris) - 1:
+            cached[1] += 1
+            cached[2][dataset.uris[-1].md_uri] = cached[1] - 1
+
+    @staticmethod
+    @instrumented
+    def _store_data(data_path, destination):
+        """Import a data file through the content addressed store
+
+        The store is the STORE_DIR directory of the workspace containing the
+        experiment. Files are stored once by content hash and hard linked to
+        the destination. The file is copied if it cannot be linked.
+
+        A linked destination shares its content with the stored file and
+        with every experiment of the workspace that imported the same
+        content, so the stored file is made read-only: the data must be
+        replaced, never edited in place
+
+        Parameters
+        ----------
+        data_path: str
+            Path of the data to import
+        destination: str
+            Path of the data in the experiment data directory
+
+        Returns
+        -------
+        str
+            The hash of the data content
+        """
+
+        workspace_dir = os.path.dirname(os.path.dirname(
+            os.path.dirname(destination)))
+        store_dir = os.path.join(workspace_dir, STORE_DIR)
+        os.makedirs(store_dir, exist_ok=True)
+        # the digest is known once the file is read: hash while copying
+        tmp_path = os.path.join(store_dir, uuid.uuid4().hex + '.tmp')
+        try:
+            hash_ = copy_file_hash(data_path, tmp_path)
+            digest = hash_.split(':', 1)[1]
+            stored_path = os.path.join(store_dir, digest[:2], digest +
+                                       os.path.splitext(data_path)[1])
+            if os.path.isfile(stored_path):
+                os.remove(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(stored_path), exist_ok=True)
+                os.chmod(tmp_path, S_IRUSR | S_IRGRP | S_IROTH)
+                os.replace(tmp_path, stored_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        if os.path.lexists(destination):
+            os.remove(destination)
+        try:
+            os.link(stored_path, destination)
+        except OSError:
+            copyfile(stored_path, destination)
+        return hash_
+
+    @instrumented
     def get_rawdata(self, md_uri):
         """Read a raw data from the database
 
@@ -438,8 +1009,8 @@ class LocalRequestService:
         """
 
         md_uri = os.path.abspath(md_uri)
-        if os.path.isfile(md_uri) and md_uri.endswith('.md.json'):
-            metadata = LocalRequestService._read_json(md_uri)
+        if md_uri.endswith('.md.json') and self._is_metadata(md_uri):
+            metadata = self._read_json(md_uri)
             container = RawData()
             container.uuid = metadata['uuid']
             container.md_uri = md_uri
@@ -453,11 +1024,58 @@ class LocalRequestService:
                 LocalRequestService.normalize_path_sep(
                     metadata['common']['url']), md_uri)
             if 'tags' in metadata:
-                for key in metadata['tags']:
-                    container.tags[key] = metadata['tags'][key]
+                container.tags = LocalRequestService._intern_tags(
+                    metadata['tags'])
+            if 'file' in metadata:
+                container.file_info = dict(metadata['file'])
             return container
         raise SciXtracerError('Metadata file format not supported')
 
+    @staticmethod
+    @instrumented
+    def is_rawdata_changed(rawdata, full_hash=False):
+        """Check if the file of a raw data changed since it was imported
+
+        The size and modification time recorded at import are compared
+        first. The content hash is computed only when the modification time
+        changed with the same size, or when full_hash is True. When the hash
+        matches with a new modification time (the file was touched), the new
+        modification time is set in rawdata.file_info so that the caller can
+        write it and the next checks do not hash the file again
+
+        Parameters
+        ----------
+        rawdata: RawData
+            Container with the rawdata metadata
+        full_hash: bool
+            True to always compare the content hash when it is recorded
+
+        Returns
+        -------
+        bool
+            True if the file is missing or changed, False otherwise. A data
+            without recorded file information is considered unchanged
+        """
+
+        info = rawdata.file_info or {}
+        try:
+            stat = os.stat(rawdata.uri)
+        except OSError:
+            return True
+        if 'size' in info and stat.st_size != info['size']:
+            return True
+        same_mtime = 'mtime_ns' in info and \
+            stat.st_mtime_ns == info['mtime_ns']
+        if 'hash' in info and (full_hash or not same_mtime):
+            algorithm = info['hash'].split(':', 1)[0]
+            if file_hash(rawdata.uri, algorithm) != info['hash']:
+                return True
+            if not same_mtime:
+                info['mtime_ns'] = stat.st_mtime_ns
+            return False
+        return 'mtime_ns' in info and not same_mtime
+
+    @instrumented
     def update_rawdata(self, rawdata):
         """Read a raw data from the database
 
@@ -484,9 +1102,14 @@ class LocalRequestService:
         metadata['tags'] = dict()
         for key in rawdata.tags:
             metadata['tags'][key] = rawdata.tags[key]
+        if rawdata.file_info:
+            metadata['file'] = dict(rawdata.file_info)
 
         self._write_json(metadata, md_uri)
+        self._record_provenance(md_uri, self._provenance_node(
+            'raw', md_uri, rawdata.uuid))
 
+    @instrumented
     def get_processeddata(self, md_uri):
         """Read a processed data from the database
 
@@ -501,7 +1124,7 @@ class LocalRequestService:
         """
 
         md_uri = os.path.abspath(md_uri)
-        if os.path.isfile(md_uri) and md_uri.endswith('.md.json'):
+        if md_uri.endswith('.md.json') and self._is_metadata(md_uri):
             metadata = self._read_json(md_uri)
             container = ProcessedData()
             container.uuid = metadata['uuid']
@@ -536,10 +1159,17 @@ class LocalRequestService:
             if 'label' in metadata['origin']['output']:
                 container.output['label'] = \
                     metadata['origin']['output']['label']
+            # snapshot of the origin tags
+            if 'snapshot' in metadata['origin']:
+                snapshot = metadata['origin']['snapshot']
+                container.origin_uuid = snapshot['uuid']
+                container.origin_tags = LocalRequestService._intern_tags(
+                    snapshot['tags'])
 
             return container
         raise SciXtracerError('Metadata file format not supported')
 
+    @instrumented
     def update_processeddata(self, processeddata):
         """Read a processed data from the database
 
@@ -549,6 +1179,16 @@ class LocalRequestService:
             Container with the processeddata metadata
         """
 
+        self._write_processeddata(processeddata)
+        self._record_provenance(os.path.abspath(processeddata.md_uri),
+                                self._processed_provenance(processeddata))
+
+    def _write_processeddata(self, processeddata):
+        """Write the metadata file of a processed data
+
+        The provenance index is not updated
+        """
+
         md_uri = os.path.abspath(processeddata.md_uri)
         metadata = dict()
         metadata['uuid'] = processeddata.uuid
@@ -585,9 +1225,110 @@ class LocalRequestService:
             'name': processeddata.output['name'],
             'label': processeddata.output['label'],
         }
+        # snapshot of the origin tags
+        if processeddata.origin_tags is not None:
+            metadata['origin']['snapshot'] = {
+                'uuid': processeddata.origin_uuid,
+                'tags': dict(processeddata.origin_tags)
+            }
 
         self._write_json(metadata, md_uri)
 
+    @instrumented
+    def get_data_fields(self, md_uri, fields):
+        """Read selected fields of a raw or processed data
+
+        The metadata file is read once and only the paths of the requested
+        fields are resolved. No RawData or ProcessedData container is created
+
+        Parameters
+        ----------
+        md_uri: str
+            URI of the data metadata
+        fields: list
+            Names of the fields to read. Available fields are 'md_uri',
+            'uuid', 'type', 'name', 'author', 'date', 'format', 'uri', 'tags',
+            'tags.<key>', 'output.name', 'output.label', 'run', 'parent' and
+            'origin.snapshot'. 'parent' is the (type, md_uri) tuple of the
+            first input of a processed data, or None. 'origin.snapshot' is
+            the {'uuid', 'tags'} snapshot of the origin of a processed data,
+            or None
+
+        Returns
+        -------
+        tuple
+            The values of the fields in the same order as fields
+        """
+
+        md_uri = os.path.abspath(md_uri)
+        if md_uri.endswith('.md.json') and self._is_metadata(md_uri):
+            metadata = self._read_json(md_uri)
+            return tuple(LocalRequestService._metadata_field(metadata, field,
+                                                             md_uri)
+                         for field in fields)
+        raise SciXtracerError('Metadata file format not supported')
+
+    @staticmethod
+    def _metadata_field(metadata, field, md_uri):
+        """Extract one field from a data metadata dictionary
+
+        Parameters
+        ----------
+        metadata: dict
+            Content of the data metadata file
+        field: str
+            Name of the field (see get_data_fields)
+        md_uri: str
+            Absolute URI of the metadata file
+
+        Returns
+        -------
+        The value of the field
+        """
+
+        if field == 'md_uri':
+            return md_uri
+        if field == 'uuid':
+            return metadata['uuid']
+        if field == 'type':
+            return metadata['origin']['type']
+        if field in ('name', 'author', 'date', 'format'):
+            return metadata['common'][field]
+        if field == 'uri':
+            return LocalRequestService.absolute_path(
+                LocalRequestService.normalize_path_sep(
+                    metadata['common']['url']), md_uri)
+        if field == 'tags':
+            return LocalRequestService._intern_tags(metadata.get('tags', {}))
+        if field.startswith('tags.'):
+            return metadata.get('tags', {}).get(field[5:], '')
+        if field in ('output.name', 'output.label'):
+            output = metadata['origin'].get('output', {})
+            return output.get(field[7:], '')
+        if field == 'origin.snapshot':
+            snapshot = metadata['origin'].get('snapshot')
+            if snapshot is None:
+                return None
+            return {'uuid': snapshot['uuid'],
+                    'tags': LocalRequestService._intern_tags(
+                        snapshot['tags'])}
+        if field == 'run':
+            if 'run' not in metadata['origin']:
+                return ''
+            return LocalRequestService.absolute_path(
+                LocalRequestService.normalize_path_sep(
+                    metadata['origin']['run']['url']), md_uri)
+        if field == 'parent':
+            inputs = metadata['origin'].get('inputs', [])
+            if len(inputs) == 0:
+                return None
+            return (inputs[0]['type'],
+                    LocalRequestService.absolute_path(
+                        LocalRequestService.normalize_path_sep(
+                            inputs[0]['url']), md_uri))
+        raise SciXtracerError('Unknown data field: ' + field)
+
+    @instrumented
     def get_dataset(self, md_uri):
         """Read a dataset from the database using it URI
 
@@ -602,7 +1343,10 @@ class LocalRequestService:
         """
 
         md_uri = os.path.abspath(md_uri)
-        if os.path.isfile(md_uri) and md_uri.endswith('.md.json'):
+        if md_uri in self._pending_datasets:
+            count('cache.hit', cache='dataset')
+            return self._pending_datasets[md_uri]
+        if md_uri.endswith('.md.json') and self._is_metadata(md_uri):
             metadata = self._read_json(md_uri)
             container = Dataset()
             container.uuid = metadata["uuid"]
@@ -618,6 +1362,7 @@ class LocalRequestService:
             return container
         raise SciXtracerError('Dataset not found')
 
+    @instrumented
     def update_dataset(self, dataset):
         """Read a processed data from the database
 
@@ -628,6 +1373,31 @@ class LocalRequestService:
         """
 
         md_uri = os.path.abspath(dataset.md_uri)
+        if self._batch_depth > 0:
+            # the dataset is serialized once when the batch is committed
+            self._pending_datasets[md_uri] = dataset
+            self._write_json(lambda: self._dataset_metadata(dataset, md_uri),
+                             md_uri)
+        else:
+            self._write_json(self._dataset_metadata(dataset, md_uri), md_uri)
+
+    @staticmethod
+    def _dataset_metadata(dataset, md_uri):
+        """Serialize a dataset container to a metadata dictionary
+
+        Parameters
+        ----------
+        dataset: Dataset
+            Container with the dataset metadata
+        md_uri: str
+            Absolute URI of the dataset metadata file
+
+        Returns
+        -------
+        dict
+            The dataset metadata
+        """
+
         metadata = dict()
         metadata['uuid'] = dataset.uuid
         metadata['name'] = dataset.name
@@ -636,8 +1406,9 @@ class LocalRequestService:
             tmp_url = LocalRequestService.to_unix_path(
                 LocalRequestService.relative_path(uri.md_uri, md_uri))
             metadata['urls'].append({"uuid": uri.uuid, 'url': tmp_url})
-        self._write_json(metadata, md_uri)
+        return metadata
 
+    @instrumented
     def create_dataset(self, experiment, dataset_name):
         """Create a processed dataset in an experiment
 
@@ -678,6 +1449,7 @@ class LocalRequestService:
 
         return container
 
+    @instrumented
     def create_run(self, dataset, run_info):
         """Create a new run metadata
 
@@ -699,7 +1471,8 @@ class LocalRequestService:
         dataset_dir = LocalRequestService.md_file_path(dataset_md_uri)
         run_md_file_name = "run.md.json"
         runid_count = 0
-        while os.path.isfile(os.path.join(dataset_dir, run_md_file_name)):
+        while self._is_metadata(os.path.join(dataset_dir,
+                                             run_md_file_name)):
             runid_count += 1
             run_md_file_name = "run_" + str(runid_count) + ".md.json"
         run_uri = os.path.join(dataset_dir, run_md_file_name)
@@ -709,8 +1482,11 @@ class LocalRequestService:
         run_info.uuid = self._generate_uuid()
         run_info.md_uri = run_uri
         self._write_run(run_info)
+        self._record_provenance(run_uri, self._provenance_node(
+            'run', run_uri, run_info.uuid))
         return run_info
 
+    @instrumented
     def get_run(self, md_uri):
         """Read a run metadata from the data base
 
@@ -725,7 +1501,7 @@ class LocalRequestService:
         """
 
         md_uri = os.path.abspath(md_uri)
-        if os.path.isfile(md_uri):
+        if self._is_metadata(md_uri):
             metadata = self._read_json(md_uri)
             container = Run()
             container.uuid = metadata['uuid']
@@ -756,6 +1532,42 @@ class LocalRequestService:
             return container
         raise SciXtracerError('Run not found')
 
+    @instrumented
+    def get_dataset_runs(self, dataset):
+        """Read the runs of a processed dataset
+
+        Parameters
+        ----------
+        dataset: Dataset
+            Object of the processed dataset metadata
+
+        Returns
+        -------
+        list
+            List of Run objects, in the creation order
+        """
+
+        dataset_dir = LocalRequestService.md_file_path(
+            os.path.abspath(dataset.md_uri))
+        names = set()
+        with os.scandir(dataset_dir) as entries:
+            for entry in entries:
+                names.add(entry.name)
+        store = self._pack_store(dataset_dir)
+        if store is not None:
+            names.update(store.index)
+        for md_uri in self._pending:
+            if os.path.dirname(md_uri) == dataset_dir:
+                names.add(os.path.basename(md_uri))
+
+        runs = []
+        for name in names:
+            match = _RUN_FILE.match(name)
+            if match:
+                runs.append((int(match.group(1) or 0), name))
+        return [self.get_run(os.path.join(dataset_dir, name))
+                for _, name in sorted(runs)]
+
     def _write_run(self, run):
         """Write a run metadata to the data base
         Parameters
@@ -794,6 +1606,7 @@ class LocalRequestService:
 
         self._write_json(metadata, run.md_uri)
 
+    @instrumented
     def create_data(self, dataset, run, processed_data):
         """Create a new processed data for a given dataset
 
@@ -831,6 +1644,75 @@ class LocalRequestService:
 
         return processed_data
 
+    @instrumented
+    def create_data_many(self, dataset, run, processed_list, workers=1):
+        """Create several processed data for a given dataset
+
+        The processed data metadata files are written (in parallel if
+        workers > 1) and the dataset metadata is written once with all the
+        new data
+
+        Parameters
+        ----------
+        dataset: Dataset
+            Object of the dataset metadata
+        run: Run
+            Metadata of the run
+        processed_list: list
+            List of ProcessedData containing the new processed data. md_uri
+            is ignored and created automatically by this method
+        workers: int
+            Number of threads used to write the processed data metadata
+
+        Returns
+        -------
+        list
+            The ProcessedData objects with the metadata and the new created
+            md_uri
+        """
+
+        md_uri = os.path.abspath(dataset.md_uri)
+        dataset_dir = LocalRequestService.md_file_path(md_uri)
+
+        for processed_data in processed_list:
+            processed_data.uuid = self._generate_uuid()
+            processed_data.md_uri = os.path.join(dataset_dir,
+                                                 processed_data.name +
+                                                 '.md.json')
+            processed_data.run = run
+
+        if workers > 1 and self._batch_depth == 0 and \
+                self._pack_store(dataset_dir) is None:
+            # the threads only write the metadata files, the provenance
+            # index is appended once from this thread
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                list(executor.map(self._write_processeddata,
+                                  processed_list))
+            if processed_list:
+                self._append_provenance(
+                    self._experiment_dir(processed_list[0].md_uri),
+                    [self._processed_provenance(processed_data)
+                     for processed_data in processed_list])
+            for processed_data in processed_list:
+                dataset.uris.append(Container(processed_data.md_uri,
+                                              processed_data.uuid))
+            self.update_dataset(dataset)
+        else:
+            self.begin_batch()
+            try:
+                for processed_data in processed_list:
+                    self.update_processeddata(processed_data)
+                    dataset.uris.append(Container(processed_data.md_uri,
+                                                  processed_data.uuid))
+                self.update_dataset(dataset)
+            except BaseException:
+                self.rollback_batch()
+                raise
+            self.commit_batch()
+
+        return processed_list
+
+    @instrumented
     def workspace_experiments(self, workspace_uri: str):
         """Read the experiments in the user workspace
 
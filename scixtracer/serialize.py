@@ -1,11 +1,28 @@
 """Serialize the containers
 
+The serialize_* functions format a container as a human readable text. The
+export_* functions write the containers as NDJSON (one JSON object per
+line, see Container.to_dict) and read the data one at a time, so that whole
+datasets and experiments are exported with a constant memory
+
 Methods
 -------
+serialize_data
 serialize_rawdata
+serialize_processeddata
+serialize_dataset
+serialize_experiment
+serialize_run
+iter_dataset_records
+iter_experiment_records
+write_ndjson
+export_dataset
+export_experiment
 
 """
 
+import json
+
 from .containers import RawData, ProcessedData, Dataset, Run, Experiment
 
 
@@ -22,12 +39,11 @@ def serialize_data(data):
     str containing the serialized container
     """
 
-    content = 'name = ' + data.name + '\n'
-    content += 'author = ' + data.author + '\n'
-    content += 'date = ' + data.date + '\n'
-    content += 'format = ' + data.format + '\n'
-    content += 'uri = ' + data.uri + '\n'
-    return content
+    return ''.join(('name = ', data.name, '\n',
+                    'author = ', data.author, '\n',
+                    'date = ', data.date, '\n',
+                    'format = ', data.format, '\n',
+                    'uri = ', data.uri, '\n'))
 
 
 def serialize_rawdata(rawdata):
@@ -43,13 +59,11 @@ def serialize_rawdata(rawdata):
     str containing the serialized container
     """
 
-    content = 'RawData:\n'
-    content += serialize_data(rawdata)
-    content += 'tags = {'
-    for tag in rawdata.tags:
-        content += rawdata.tags[tag] + ':' + rawdata.tags[tag] + ','
-    content = content[:-1] + '}'
-    return content
+    tags = ','.join(value + ':' + value for value in rawdata.tags.values())
+    if tags:
+        tags = '{' + tags
+    return ''.join(('RawData:\n', serialize_data(rawdata), 'tags = ', tags,
+                    '}'))
 
 
 def serialize_processeddata(processeddata):
@@ -65,24 +79,16 @@ def serialize_processeddata(processeddata):
     str containing the serialized container
     """
 
-    content = 'ProcessedData:\n'
-    content += serialize_data(processeddata)
-    content += 'run = \n'
-    content += '\t{\n'
-    content += '\t\tuuid: ' + processeddata.run.uuid + ',\n'
-    content += '\t\turl: ' + processeddata.run.md_uri + ',\n'
-    content += '\t}\n'
-    content += 'inputs = [ \n'
+    parts = ['ProcessedData:\n', serialize_data(processeddata),
+             'run = \n', '\t{\n',
+             '\t\tuuid: ', processeddata.run.uuid, ',\n',
+             '\t\turl: ', processeddata.run.md_uri, ',\n',
+             '\t}\n', 'inputs = [ \n']
     for input_ in processeddata.inputs:
-        content += 'name:' + input_.name + ', uri:' + input_.uri + '\n'
-    content += (
-            'output={name:'
-            + processeddata.output['name']
-            + ', label:'
-            + processeddata.output['label']
-            + '}'
-    )
-    return content
+        parts.extend(('name:', input_.name, ', uri:', input_.uri, '\n'))
+    parts.extend(('output={name:', processeddata.output['name'],
+                  ', label:', processeddata.output['label'], '}'))
+    return ''.join(parts)
 
 
 def serialize_dataset(dataset):
@@ -98,16 +104,18 @@ def serialize_dataset(dataset):
     str containing the serialized container
     """
 
-    content = 'Dataset:\n'
-    content += 'name = ' + dataset.name
-    content += 'uris = [\n'
+    parts = ['Dataset:\n', 'name = ', dataset.name, 'uris = [\n']
     for uri in dataset.uris:
-        content += '\t{\n'
-        content += '\t\tuuid: ' + uri.uuid + ',\n'
-        content += '\t\turl: ' + uri.md_uri + ',\n'
-        content += '\t}\n'
-    content += ']\n'
-    return content
+        parts.extend(('\t{\n\t\tuuid: ', uri.uuid, ',\n\t\turl: ',
+                      uri.md_uri, ',\n\t}\n'))
+    parts.append(']\n')
+    return ''.join(parts)
+
+
+def _serialize_dataset_info(info):
+    return ''.join(('\t{\n', '\t\tname: ', info.name, ',\n',
+                    '\t\tuuid: ', info.uuid, ',\n',
+                    '\t\turl: ', info.url, ',\n', '\t}\n'))
 
 
 def serialize_experiment(experiment):
@@ -123,30 +131,21 @@ def serialize_experiment(experiment):
     str containing the serialized container
     """
 
-    content = 'Experiment:\n'
-    content += 'uuid = ' + experiment.uuid + '\n'
-    content += 'name = ' + experiment.name + '\n'
-    content += 'author = ' + experiment.author + '\n'
-    content += 'date = ' + experiment.date + '\n'
-    content += 'rawdataset = ' + '\n'
-    content += '\t{\n'
-    content += '\t\tname: ' + experiment.rawdataset.name + ',\n'
-    content += '\t\tuuid: ' + experiment.rawdataset.uuid + ',\n'
-    content += '\t\turl: ' + experiment.rawdataset.url + ',\n'
-    content += '\t}\n'
-    content += 'processeddatasets = [ \n'
-    for dataset in experiment.processeddatasets:
-        content += '\t{\n'
-        content += '\t\tname: ' + dataset.name + ',\n'
-        content += '\t\tuuid: ' + dataset.uuid + ',\n'
-        content += '\t\turl: ' + dataset.url + ',\n'
-        content += '\t}\n'
-    content += '] \n'
-    content += 'tags = [ \n'
-    for tag in experiment.tag_keys:
-        content += '\t' + tag + '\n'
-    content += ']'
-    return content
+    parts = ['Experiment:\n',
+             'uuid = ', experiment.uuid, '\n',
+             'name = ', experiment.name, '\n',
+             'author = ', experiment.author, '\n',
+             'date = ', experiment.date, '\n',
+             'rawdataset = \n',
+             _serialize_dataset_info(experiment.rawdataset),
+             'processeddatasets = [ \n']
+    parts.extend(_serialize_dataset_info(info)
+                 for info in experiment.processeddatasets)
+    parts.append('] \n')
+    parts.append('tags = [ \n')
+    parts.extend('\t' + tag + '\n' for tag in experiment.tag_keys)
+    parts.append(']')
+    return ''.join(parts)
 
 
 def serialize_run(run):
@@ -162,35 +161,177 @@ def serialize_run(run):
     str containing the serialized container
     """
 
-    content = 'Experiment:\n'
-    content += '{\n\t"process":{\n'
-    content += '\t\t"name": "' + run.process_name + '",\n'
-    content += '\t\t"uri": "' + run.process_uri + '"\n'
-    content += '\t}\n\t"processeddataset": \n'
-    content += '\t\t{\n'
-    content += '\t\t\t"uuid": "' + run.processeddataset.uuid + '",\n'
-    content += '\t\t\t"url": "' + run.processeddataset.md_uri + '"\n'
-    content += '\t\t},\n'
-    content += '\t"parameters": [\n '
-    for param in run.parameters:
-        content += '\t\t{\n'
-        content += '\t\t\t"name": "' + param.name + '",\n'
-        content += '\t\t\t"value": "' + param.value + '"\n'
-        content += '\t\t},\n'
-    content = content[:-3] + '\n'
-    content += '\t]\n'
-    content += '\t"inputs": [\n '
-    for input_ in run.inputs:
-        content += '\t\t{\n'
-        content += '\t\t\t"name": "' + input_.name + '",\n'
-        content += '\t\t\t"dataset": "' + input_.dataset + '",\n'
-        content += '\t\t\t"query": "' + input_.query + '",\n'
-        content += (
-                '\t\t\t"origin_output_name": "' + input_.origin_output_name +
-                '"\n'
-        )
-        content += '\t\t},\n'
-    content = content[:-3] + '\n'
-    content += '\t]\n'
-    content += '}'
-    return content
+    parts = ['Experiment:\n',
+             '{\n\t"process":{\n',
+             '\t\t"name": "', run.process_name, '",\n',
+             '\t\t"uri": "', run.process_uri, '"\n',
+             '\t}\n\t"processeddataset": \n',
+             '\t\t{\n',
+             '\t\t\t"uuid": "', run.processeddataset.uuid, '",\n',
+             '\t\t\t"url": "', run.processeddataset.md_uri, '"\n',
+             '\t\t},\n',
+             '\t"parameters": [\n ']
+    parts.extend(''.join(('\t\t{\n\t\t\t"name": "', param.name,
+                          '",\n\t\t\t"value": "', param.value,
+                          '"\n\t\t},\n'))
+                 for param in run.parameters)
+    # remove the separator after the last parameter
+    parts[-1] = parts[-1][:-3]
+    parts.append('\n\t]\n\t"inputs": [\n ')
+    parts.extend(''.join(('\t\t{\n\t\t\t"name": "', input_.name,
+                          '",\n\t\t\t"dataset": "', input_.dataset,
+                          '",\n\t\t\t"query": "', input_.query,
+                          '",\n\t\t\t"origin_output_name": "',
+                          input_.origin_output_name, '"\n\t\t},\n'))
+                 for input_ in run.inputs)
+    parts[-1] = parts[-1][:-3]
+    parts.append('\n\t]\n}')
+    return ''.join(parts)
+
+
+def iter_dataset_records(request, dataset, query=''):
+    """Iterate over the export records of a dataset
+
+    The first record is the dataset (without its uris), followed by the runs
+    of a processed dataset and by the data. The data are read one at a time
+
+    Parameters
+    ----------
+    request: Request
+        Request used to read the metadata
+    dataset: Dataset
+        Container of the dataset metadata
+    query: str
+        Query selecting the exported data (see Request.get_data). Empty to
+        export all the data
+
+    Yields
+    ------
+    dict
+        The records. Each record has a 'type' key: 'dataset', 'run', 'raw'
+        or 'processed'
+    """
+
+    yield {'type': 'dataset', 'md_uri': dataset.md_uri, 'uuid': dataset.uuid,
+           'name': dataset.name, 'size': dataset.size()}
+    is_raw = dataset.name == 'data'
+    if not is_raw:
+        for run in request.service.get_dataset_runs(dataset):
+            record = run.to_dict()
+            record['type'] = 'run'
+            yield record
+    if query:
+        for data in request.iter_data(dataset, query):
+            yield data.to_dict()
+    elif is_raw:
+        for uri in dataset.uris:
+            yield request.get_rawdata(uri.md_uri).to_dict()
+    else:
+        for uri in dataset.uris:
+            yield request.get_processeddata(uri.md_uri).to_dict()
+
+
+def iter_experiment_records(request, experiment, datasets=None):
+    """Iterate over the export records of an experiment
+
+    The first record is the experiment, followed by the records of each
+    dataset (see iter_dataset_records)
+
+    Parameters
+    ----------
+    request: Request
+        Request used to read the metadata
+    experiment: Experiment
+        Container of the experiment metadata
+    datasets: list
+        Names of the exported datasets. Default is all the datasets
+
+    Yields
+    ------
+    dict
+        The records
+    """
+
+    record = experiment.to_dict()
+    record['type'] = 'experiment'
+    yield record
+    names = [experiment.rawdataset.name] + \
+        [info.name for info in experiment.processeddatasets]
+    for name in names:
+        if datasets is None or name in datasets:
+            yield from iter_dataset_records(
+                request, request.get_dataset(experiment, name))
+
+
+def write_ndjson(records, out_file) -> int:
+    """Write records as NDJSON
+
+    Parameters
+    ----------
+    records: iterable
+        Records (dict) to write
+    out_file: file
+        File object opened in text mode
+
+    Returns
+    -------
+    int
+        The number of written records
+    """
+
+    encode = json.JSONEncoder(ensure_ascii=False,
+                              separators=(',', ':')).encode
+    count = 0
+    for record in records:
+        out_file.write(encode(record))
+        out_file.write('\n')
+        count += 1
+    return count
+
+
+def export_dataset(request, dataset, out_file, query='') -> int:
+    """Export a dataset as NDJSON
+
+    Parameters
+    ----------
+    request: Request
+        Request used to read the metadata
+    dataset: Dataset
+        Container of the dataset metadata
+    out_file: file
+        File object opened in text mode
+    query: str
+        Query selecting the exported data. Empty to export all the data
+
+    Returns
+    -------
+    int
+        The number of written records
+    """
+
+    return write_ndjson(iter_dataset_records(request, dataset, query),
+                        out_file)
+
+
+def export_experiment(request, experiment, out_file, datasets=None) -> int:
+    """Export an experiment and its datasets as NDJSON
+
+    Parameters
+    ----------
+    request: Request
+        Request used to read the metadata
+    experiment: Experiment
+        Container of the experiment metadata
+    out_file: file
+        File object opened in text mode
+    datasets: list
+        Names of the exported datasets. Default is all the datasets
+
+    Returns
+    -------
+    int
+        The number of written records
+    """
+
+    return write_ndjson(iter_experiment_records(request, experiment,
+                                                datasets), out_file)
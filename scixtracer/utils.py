@@ -12,11 +12,21 @@ Methods
 -------
 format_date
 extract_filename
+file_hash
+copy_file_hash
 
 """
 
 import datetime
+import hashlib
+import logging
 import os
+import queue
+import threading
+import time
+
+HASH_ALGORITHM = 'blake2b'
+HASH_CHUNK_SIZE = 1024 * 1024
 
 
 class SciXtracerError(Exception):
@@ -60,13 +70,22 @@ class Observable:
     """Define an object that can be observed
 
     Objects inheriting from this object can be observed
-    by a ProgressObserver
+    by a ProgressObserver. The progress notifications can be rate limited
+    (see set_notification_rate) and dispatched to the observers from a
+    background thread (see set_async_dispatch) so that slow observers do not
+    stall the observed process
 
     """
 
     def __init__(self):
         self._observers = []
         self._progress_message = ''
+        self._min_interval = 0.0
+        self._min_progress_step = 0
+        self._last_notification_time = None
+        self._last_progress = None
+        self._queue = None
+        self._dispatch_thread = None
 
     def observers_count(self):
         """Get the number of observers"""
@@ -83,6 +102,106 @@ class Observable:
         """
         self._observers.append(observer)
 
+    def set_notification_rate(self, max_per_second: float = 0,
+                              min_progress_step: int = 0):
+        """Limit the rate of the progress notifications
+
+        A progress notification is dropped if it comes less than
+        1/max_per_second seconds after the previous one, or if the progress
+        changed by less than min_progress_step since the previous one. The
+        notifications of a progress of 100, of a progress going backward
+        (a new task) and the messages are always sent
+
+        Parameters
+        ----------
+        max_per_second
+            Maximum number of progress notifications per second. 0 for no
+            limit
+        min_progress_step
+            Minimum progress change (in percent) between two notifications.
+            0 for no limit
+
+        """
+        self._min_interval = 1.0 / max_per_second if max_per_second > 0 \
+            else 0.0
+        self._min_progress_step = min_progress_step
+        self._last_notification_time = None
+        self._last_progress = None
+
+    def set_async_dispatch(self, enabled: bool = True):
+        """Dispatch the notifications to the observers from a thread
+
+        The notifications are queued and the observers are notified in a
+        background thread. Disabling the asynchronous dispatch waits until
+        all the queued notifications are sent
+
+        Parameters
+        ----------
+        enabled
+            True to start the background dispatch, False to stop it
+
+        """
+        if enabled and self._dispatch_thread is None:
+            self._queue = queue.Queue()
+            self._dispatch_thread = threading.Thread(
+                target=self._dispatch_loop, args=(self._queue,), daemon=True)
+            self._dispatch_thread.start()
+        elif not enabled and self._dispatch_thread is not None:
+            self._queue.put(None)
+            self._dispatch_thread.join()
+            self._queue = None
+            self._dispatch_thread = None
+
+    def flush_notifications(self):
+        """Wait until all the queued notifications are sent"""
+        if self._queue is not None:
+            self._queue.join()
+
+    def _dispatch_loop(self, notifications):
+        """Send the queued notifications until the None sentinel
+
+        An observer raising an exception is logged and does not stop the
+        dispatch of the notifications to the other observers
+        """
+        while True:
+            data = notifications.get()
+            try:
+                if data is None:
+                    return
+                for observer in self._observers:
+                    try:
+                        observer.notify(data)
+                    except Exception:
+                        logging.getLogger('scixtracer').exception(
+                            'Observer %r failed to handle %r', observer,
+                            data)
+            finally:
+                notifications.task_done()
+
+    def _dispatch(self, data: dict):
+        """Send a notification to the observers"""
+        if self._queue is not None:
+            self._queue.put(data)
+        else:
+            for observer in self._observers:
+                observer.notify(data)
+
+    def _is_throttled(self, progress: int) -> bool:
+        """Check if a progress notification must be dropped"""
+        if self._min_interval <= 0 and self._min_progress_step <= 0:
+            return False
+        now = time.monotonic()
+        last_progress = self._last_progress
+        if progress < 100 and last_progress is not None and \
+                progress >= last_progress:
+            if progress - last_progress < self._min_progress_step:
+                return True
+            if now - self._last_notification_time < self._min_interval:
+                return True
+        self._last_progress = progress
+        self._last_notification_time = now
+        return False
+
     def notify_message(self, message: str):
         """Notify observer the progress of the import
 
@@ -92,11 +211,12 @@ class Observable:
             Process message
 
         """
+        self._progress_message = message
+        if len(self._observers) == 0:
+            return
         progress = dict()
         progress['message'] = message
-        self._progress_message = message
-        for observer in self._observers:
-            observer.notify(progress)
+        self._dispatch(progress)
 
     def notify_observers(self, progress: int, message: str = ''):
         """Notify observer the progress of the import
@@ -109,11 +229,12 @@ class Observable:
             Progress message
 
         """
+        if len(self._observers) == 0 or self._is_throttled(progress):
+            return
         progress_dict = dict()
         progress_dict['progress'] = progress
         progress_dict['message'] = message
-        for observer in self._observers:
-            observer.notify(progress_dict)
+        self._dispatch(progress_dict)
 
 
 def format_date(date: str):
@@ -127,3 +248,59 @@ def format_date(date: str):
 def extract_filename(uri: str):
     pos = uri.rfind(os.sep)
     return uri[pos:]
+
+
+def file_hash(path: str, algorithm: str = HASH_ALGORITHM):
+    """Compute the hash of a file content
+
+    The file is read by chunks so that the memory usage does not depend on
+    the file size
+
+    Parameters
+    ----------
+    path: str
+        Path of the file
+    algorithm: str
+        Name of the hashlib algorithm
+
+    Returns
+    -------
+    str
+        The hash as 'algorithm:hexdigest'
+    """
+    hasher = hashlib.new(algorithm)
+    with open(path, 'rb') as file:
+        chunk = file.read(HASH_CHUNK_SIZE)
+        while chunk:
+            hasher.update(chunk)
+            chunk = file.read(HASH_CHUNK_SIZE)
+    return algorithm + ':' + hasher.hexdigest()
+
+
+def copy_file_hash(source: str, destination: str,
+                   algorithm: str = HASH_ALGORITHM):
+    """Copy a file and compute the hash of its content in a single read
+
+    Parameters
+    ----------
+    source: str
+        Path of the file to copy
+    destination: str
+        Path of the copy
+    algorithm: str
+        Name of the hashlib algorithm
+
+    Returns
+    -------
+    str
+        The hash as 'algorithm:hexdigest'
+    """
+    hasher = hashlib.new(algorithm)
+    with open(source, 'rb') as source_file, \
+            open(destination, 'wb') as destination_file:
+        chunk = source_file.read(HASH_CHUNK_SIZE)
+        while chunk:
+            hasher.update(chunk)
+            destination_file.write(chunk)
+            chunk = source_file.read(HASH_CHUNK_SIZE)
+    return algorithm + ':' + hasher.hexdigest()
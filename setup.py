@@ -22,4 +22,7 @@ setuptools.setup(
     install_requires=[
         "PrettyTable>=1.0.1"
     ],
+    extras_require={
+        "msgpack": ["msgpack>=1.0"]
+    },
 )
@@ -0,0 +1,51 @@
+import unittest
+import os
+import builtins
+
+from scixtracer import Request
+from scixtracer.accounting import io_accounting
+
+
+class TestAccounting(unittest.TestCase):
+    def setUp(self):
+        self.request = Request()
+        self.experiment = self.request.get_experiment(
+            os.path.join('tests', 'test_metadata_local', 'experiment.md.json'))
+
+    def test_get_data_raw(self):
+        dataset = self.request.get_rawdataset(self.experiment)
+        with io_accounting() as account:
+            data = self.request.get_data(dataset, 'Population=population1')
+        self.assertEqual(len(data), 3)
+        counts = account.calls['get_data']
+        self.assertEqual(counts.calls, 1)
+        self.assertLessEqual(counts.opens, dataset.size() + 1)
+        self.assertEqual(counts.writes, 0)
+        self.assertGreater(counts.bytes_read, 0)
+        self.assertEqual(account.total.opens, counts.opens)
+
+    def test_get_data_processed(self):
+        # a data of the second processing stage needs its parent and origin
+        dataset = self.request.get_dataset(self.experiment, 'process2')
+        with io_accounting() as account:
+            self.request.get_data(dataset, 'Population=population1')
+        self.assertLessEqual(account.calls['get_data'].opens,
+                             3 * dataset.size() + 1)
+
+    def test_outermost_call(self):
+        with io_accounting() as account:
+            self.request.get_dataset(self.experiment, 'process1')
+        self.assertEqual(list(account.calls), ['get_dataset'])
+        self.assertIn('get_dataset', account.summary())
+
+    def test_restore(self):
+        open_ = builtins.open
+        stat = os.stat
+        get_data = Request.get_data
+        with io_accounting():
+            with io_accounting():
+                self.assertIsNot(builtins.open, open_)
+            self.assertIsNot(builtins.open, open_)
+        self.assertIs(builtins.open, open_)
+        self.assertIs(os.stat, stat)
+        self.assertIs(Request.get_data, get_data)
@@ -0,0 +1,76 @@
+import unittest
+import os
+import os.path
+import shutil
+
+from scixtracer import Request
+from scixtracer.migrate import migrate_experiment
+from scixtracer.request_local import LocalRequestService
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+@unittest.skipIf(msgpack is None, 'msgpack is not installed')
+class TestMsgpackFormat(unittest.TestCase):
+    def setUp(self):
+        self.request = Request()
+        self.test_experiment_dir = \
+            os.path.join('tests', 'test_metadata_local')
+        self.test_import_image = \
+            os.path.join('tests', 'test_images', 'data', 'population1_001.tif')
+        self.experiment_path = os.path.join(self.test_experiment_dir,
+                                            'myexperiment')
+        self.rawdata_file = os.path.join(self.experiment_path, 'data',
+                                         'population1_001.md.json')
+
+    def tearDown(self):
+        if os.path.isdir(self.experiment_path):
+            shutil.rmtree(self.experiment_path)
+
+    def _import(self, experiment):
+        self.request.import_data(experiment, self.test_import_image,
+                                 'population1_001.tif', 'sprigent', 'tif',
+                                 tags={'Population': 'population1'})
+
+    def test_create_msgpack_experiment(self):
+        experiment = self.request.create_experiment(
+            "myexperiment", "sprigent", destination=self.test_experiment_dir,
+            metadata_format='msgpack')
+        self._import(experiment)
+        with open(self.rawdata_file, 'rb') as md_file:
+            self.assertNotEqual(md_file.read(1), b'{')
+
+        experiment = self.request.get_experiment(os.path.join(
+            self.experiment_path, 'experiment.md.json'))
+        self.assertEqual(experiment.metadata_format, 'msgpack')
+        raw_data = self.request.get_rawdata(self.rawdata_file)
+        self.assertEqual(raw_data.tags['Population'], 'population1')
+
+    def test_write_before_get_experiment(self):
+        experiment = self.request.create_experiment(
+            "myexperiment", "sprigent", destination=self.test_experiment_dir,
+            metadata_format='msgpack')
+        self._import(experiment)
+        # a new service has not read the experiment format
+        service = LocalRequestService()
+        raw_data = service.get_rawdata(self.rawdata_file)
+        service.update_rawdata(raw_data)
+        with open(self.rawdata_file, 'rb') as md_file:
+            self.assertNotEqual(md_file.read(1), b'{')
+
+    def test_migrate_experiment(self):
+        experiment = self.request.create_experiment(
+            "myexperiment", "sprigent", destination=self.test_experiment_dir)
+        self._import(experiment)
+        self.assertEqual(migrate_experiment(self.experiment_path, 'msgpack'),
+                         2)
+        with open(self.rawdata_file, 'rb') as md_file:
+            self.assertNotEqual(md_file.read(1), b'{')
+        migrate_experiment(self.experiment_path, 'json')
+        with open(self.rawdata_file, 'rb') as md_file:
+            self.assertEqual(md_file.read(1), b'{')
+        raw_data = self.request.get_rawdata(self.rawdata_file)
+        self.assertEqual(raw_data.name, 'population1_001.tif')
@@ -0,0 +1,75 @@
+import unittest
+import os
+import logging
+
+from scixtracer import Request
+from scixtracer import instrumentation
+
+
+class TestInstrumentation(unittest.TestCase):
+    def setUp(self):
+        self.request = Request()
+        self.experiment_uri = os.path.join('tests', 'test_metadata_local',
+                                           'experiment.md.json')
+
+    def tearDown(self):
+        instrumentation.disable()
+
+    def test_disabled(self):
+        sink = instrumentation.MemorySink()
+        with instrumentation.record(sink):
+            self.request.get_experiment(self.experiment_uri)
+        self.assertEqual(
+            sink.spans['LocalRequestService.get_experiment']['count'], 1)
+
+        # the sink is not notified once the recording stopped
+        self.assertFalse(instrumentation.is_enabled())
+        self.request.get_experiment(self.experiment_uri)
+        with instrumentation.span('operation') as span:
+            span.set('bytes', 10)
+        instrumentation.count('counter')
+        self.assertIs(span, instrumentation._NOOP_SPAN)
+        self.assertEqual(
+            sink.spans['LocalRequestService.get_experiment']['count'], 1)
+        self.assertNotIn('operation', sink.spans)
+        self.assertEqual(sink.counters, dict())
+
+    def test_memory_sink(self):
+        sink = instrumentation.MemorySink()
+        with instrumentation.record(sink):
+            experiment = self.request.get_experiment(self.experiment_uri)
+            raw_dataset = self.request.get_rawdataset(experiment)
+            self.request.get_data(raw_dataset, 'Population=population1')
+        self.assertFalse(instrumentation.is_enabled())
+        self.assertEqual(
+            sink.spans['LocalRequestService.get_experiment']['count'], 1)
+        self.assertEqual(
+            sink.spans['LocalRequestService.get_rawdata']['count'], 3)
+        read = sink.spans['LocalRequestService._read_json']
+        self.assertEqual(read['count'], 5)
+        self.assertGreater(read['bytes'], 0)
+        # the path helpers do no I/O and are not instrumented
+        self.assertNotIn('LocalRequestService.absolute_path', sink.spans)
+        self.assertIn('LocalRequestService.get_rawdata', sink.summary())
+
+    def test_open_telemetry_sink(self):
+        sink = instrumentation.OpenTelemetrySink(trace_id='trace')
+        with instrumentation.record(sink):
+            self.request.get_experiment(self.experiment_uri)
+        spans = sink.export()['spans']
+        self.assertEqual(spans[0]['name'], 'LocalRequestService._read_json')
+        self.assertEqual(spans[-1]['name'],
+                         'LocalRequestService.get_experiment')
+        for span in spans[:-1]:
+            self.assertEqual(span['parentSpanId'], spans[-1]['spanId'])
+        self.assertEqual(spans[-1]['parentSpanId'], '')
+        self.assertGreaterEqual(spans[-1]['endTimeUnixNano'],
+                                spans[-1]['startTimeUnixNano'])
+        self.assertEqual(sink.export()['spans'], [])
+
+    def test_logging_sink(self):
+        sink = instrumentation.LoggingSink(level=logging.INFO)
+        with self.assertLogs('scixtracer', level='INFO') as logs:
+            with instrumentation.record(sink):
+                instrumentation.count('cache.hit', cache='pack')
+        self.assertIn('cache.hit', logs.output[0])
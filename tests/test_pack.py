@@ -0,0 +1,68 @@
+import unittest
+import os
+import os.path
+import shutil
+
+from scixtracer import Request
+from scixtracer.packed_store import PACK_FILE
+from scixtracer.pack import pack_experiment, unpack_experiment
+
+
+class TestPack(unittest.TestCase):
+    def setUp(self):
+        self.request = Request()
+        self.test_experiment_dir = \
+            os.path.join('tests', 'test_metadata_local')
+        self.test_import_dir = \
+            os.path.join('tests', 'test_images', 'data')
+        self.experiment_path = os.path.join(self.test_experiment_dir,
+                                            'myexperiment')
+        self.experiment = self.request.create_experiment(
+            "myexperiment", "sprigent", date='now', tag_keys=[],
+            destination=self.test_experiment_dir)
+        self.request.import_dir(self.experiment, self.test_import_dir,
+                                filter_=r'population1_00[1-3]\.tif$',
+                                author='sprigent', format_='tif', date='now',
+                                copy_data=True)
+        self.request.tag_from_name(self.experiment, 'Population',
+                                   ['population1'])
+
+    def tearDown(self):
+        if os.path.isdir(self.experiment_path):
+            shutil.rmtree(self.experiment_path)
+
+    def test_pack_experiment(self):
+        pack_experiment(self.experiment_path)
+        data_dir = os.path.join(self.experiment_path, 'data')
+        self.assertTrue(os.path.isfile(os.path.join(data_dir, PACK_FILE)))
+        self.assertFalse(os.path.isfile(os.path.join(
+            data_dir, 'population1_001.md.json')))
+        self.assertTrue(os.path.isfile(os.path.join(
+            data_dir, 'rawdataset.md.json')))
+
+        raw_dataset = self.request.get_dataset(self.experiment, 'data')
+        data = self.request.get_data(raw_dataset,
+                                     query='Population=population1')
+        self.assertEqual(sorted([d.name for d in data]),
+                         ['population1_001.tif', 'population1_002.tif',
+                          'population1_003.tif'])
+
+    def test_update_packed_data(self):
+        pack_experiment(self.experiment_path)
+        md_uri = os.path.join(self.experiment_path, 'data',
+                              'population1_002.md.json')
+        raw_data = self.request.get_rawdata(md_uri)
+        raw_data.set_tag('Population', 'population2')
+        self.request.update_rawdata(raw_data)
+        self.assertFalse(os.path.isfile(md_uri))
+        self.assertEqual(self.request.get_rawdata(md_uri).tags['Population'],
+                         'population2')
+
+    def test_unpack_experiment(self):
+        pack_experiment(self.experiment_path)
+        unpack_experiment(self.experiment_path)
+        data_dir = os.path.join(self.experiment_path, 'data')
+        self.assertFalse(os.path.isfile(os.path.join(data_dir, PACK_FILE)))
+        raw_data = self.request.get_rawdata(os.path.join(
+            data_dir, 'population1_001.md.json'))
+        self.assertEqual(raw_data.tags['Population'], 'population1')
@@ -0,0 +1,41 @@
+import unittest
+import os
+import io
+import shutil
+import tempfile
+from contextlib import redirect_stdout
+
+from scixtracer.profile import main
+
+
+class TestProfile(unittest.TestCase):
+    def setUp(self):
+        self.experiment_dir = os.path.join('tests', 'test_metadata_local')
+        self.output_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.output_dir)
+
+    def test_sampling(self):
+        output = os.path.join(self.output_dir, 'profile.folded')
+        with redirect_stdout(io.StringIO()) as stdout:
+            main([self.experiment_dir, '--query', 'Population=population1',
+                  '--lineage', '--repeat', '20', '--interval', '0.0001',
+                  '--output', output])
+        self.assertIn('LocalRequestService.get_processeddata',
+                      stdout.getvalue())
+        with open(output) as profile_file:
+            lines = profile_file.read().splitlines()
+        self.assertGreater(len(lines), 0)
+        for line in lines:
+            stack, count = line.rsplit(' ', 1)
+            self.assertGreater(int(count), 0)
+            self.assertNotIn('scixtracer.instrumentation', stack)
+
+    def test_cprofile(self):
+        output = os.path.join(self.output_dir, 'profile.prof')
+        with redirect_stdout(io.StringIO()) as stdout:
+            main([self.experiment_dir, '--dataset', 'data',
+                  '--profiler', 'cprofile', '--output', output])
+        self.assertTrue(os.path.isfile(output))
+        self.assertIn('LocalRequestService.get_rawdata', stdout.getvalue())
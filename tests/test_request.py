@@ -5,6 +5,9 @@ import filecmp
 import shutil
 
 from scixtracer import Request, Run, ProcessedData
+from scixtracer.utils import ProgressObserver, SciXtracerError
+from scixtracer.provenance import ProvenanceIndex
+from scixtracer.accounting import io_accounting
 from scixtracer.serialize import (serialize_experiment, serialize_rawdata,
                                   serialize_processeddata, serialize_dataset,
                                   serialize_run)
@@ -12,6 +15,27 @@ from tests.metadata import (create_experiment, create_raw_data,
                             create_processed_data, create_dataset)
 
 
+def threshold(data, parameters):
+    processed_data = ProcessedData()
+    processed_data.set_info(name="o_" + data.name, author="sprigent",
+                            date='now', format_="tif",
+                            url="o_" + data.name)
+    processed_data.set_output(id="o", label="threshold " +
+                              parameters['threshold'])
+    return processed_data
+
+
+def threshold_failing(data, parameters):
+    if data.name == 'population1_003.tif':
+        raise ValueError('cannot process ' + data.name)
+    return threshold(data, parameters)
+
+
+class InterruptObserver(ProgressObserver):
+    def notify(self, data: dict):
+        raise RuntimeError('interrupted')
+
+
 class TestRequest(unittest.TestCase):
     def setUp(self):
         self.request = Request()
@@ -158,6 +182,113 @@ class TestRequest(unittest.TestCase):
             t2 = True
         self.assertTrue(t1*t2)
 
+    def test_import_dir_recursive(self):
+        tree_dir = os.path.join(self.test_experiment_dir, 'import_tree')
+        self.addCleanup(shutil.rmtree, tree_dir, True)
+        for sub_dir, names in [('', ['population1_001.tif', 'notes.txt']),
+                               ('plate1', ['population1_001.tif']),
+                               (os.path.join('plate1', 'well1'),
+                                ['population1_001.tif',
+                                 'population1_002.tif'])]:
+            os.makedirs(os.path.join(tree_dir, sub_dir), exist_ok=True)
+            for name in names:
+                shutil.copyfile(self.test_import_image,
+                                os.path.join(tree_dir, sub_dir, name))
+
+        experiment = self.request.create_experiment("myexperiment", "sprigent",
+                                                    date='now', tag_keys=[],
+                                                    destination=self.test_experiment_dir)
+        count = self.request.import_dir(experiment, tree_dir, filter_='',
+                                        author='sprigent', format_='tif',
+                                        date='now', copy_data=True,
+                                        recursive=True, glob_pattern='*.tif',
+                                        chunk_size=2)
+        self.assertEqual(count, 4)
+
+        dataset = self.request.get_rawdataset(experiment)
+        names = sorted(self.request.get_rawdata(uri.md_uri).name
+                       for uri in dataset.uris)
+        self.assertEqual(names, ['plate1/population1_001.tif',
+                                 'plate1/well1/population1_001.tif',
+                                 'plate1/well1/population1_002.tif',
+                                 'population1_001.tif'])
+        data_dir = os.path.join(self.test_experiment_dir, 'myexperiment',
+                                'data')
+        self.assertTrue(os.path.isfile(os.path.join(
+            data_dir, 'plate1_well1_population1_002.tif')))
+
+    def test_import_dir_recursive_clash(self):
+        tree_dir = os.path.join(self.test_experiment_dir, 'import_tree')
+        self.addCleanup(shutil.rmtree, tree_dir, True)
+        for path in [os.path.join('a', 'b_c.tif'),
+                     os.path.join('a_b', 'c.tif')]:
+            os.makedirs(os.path.dirname(os.path.join(tree_dir, path)),
+                        exist_ok=True)
+            shutil.copyfile(self.test_import_image,
+                            os.path.join(tree_dir, path))
+        # a link cycle is not followed
+        os.symlink(os.path.abspath(tree_dir), os.path.join(tree_dir, 'a',
+                                                           'cycle'))
+
+        experiment = self.request.create_experiment("myexperiment", "sprigent",
+                                                    date='now', tag_keys=[],
+                                                    destination=self.test_experiment_dir)
+        with self.assertRaises(SciXtracerError):
+            self.request.import_dir(experiment, tree_dir, filter_='',
+                                    author='sprigent', format_='tif',
+                                    date='now', copy_data=True,
+                                    recursive=True)
+
+    def test_import_dir_resume(self):
+        experiment = self.request.create_experiment("myexperiment", "sprigent",
+                                                    date='now', tag_keys=[],
+                                                    destination=self.test_experiment_dir)
+        interrupted_request = Request()
+        interrupted_request.add_observer(InterruptObserver())
+        # the import is interrupted after the first committed chunk
+        with self.assertRaises(RuntimeError):
+            interrupted_request.import_dir(
+                experiment, self.test_import_dir,
+                filter_=r'population1_00[1-5]\.tif$', author='sprigent',
+                format_='tif', date='now', copy_data=True, chunk_size=2)
+        self.assertEqual(
+            len(self.request.get_rawdataset(experiment).uris), 2)
+
+        count = self.request.import_dir(experiment, self.test_import_dir,
+                                        filter_=r'population1_00[1-5]\.tif$',
+                                        author='sprigent', format_='tif',
+                                        date='now', copy_data=True,
+                                        chunk_size=2)
+        self.assertEqual(count, 3)
+        count = self.request.import_dir(experiment, self.test_import_dir,
+                                        filter_=r'population1_00[1-5]\.tif$',
+                                        author='sprigent', format_='tif',
+                                        date='now', copy_data=True)
+        self.assertEqual(count, 0)
+        uris = self.request.get_rawdataset(experiment).uris
+        self.assertEqual(len(uris), 5)
+        self.assertEqual(len(set(uri.md_uri for uri in uris)), 5)
+
+        # without resume the files are imported again, without duplicates
+        # and keeping their uuid and tags
+        self.request.tag_from_name(experiment, 'Population', ['population1'])
+        count = self.request.import_dir(experiment, self.test_import_dir,
+                                        filter_=r'population1_00[1-5]\.tif$',
+                                        author='sprigent', format_='tif',
+                                        date='now', copy_data=True,
+                                        resume=False)
+        self.assertEqual(count, 5)
+        reimported = self.request.get_rawdataset(experiment).uris
+        self.assertEqual([(uri.md_uri, uri.uuid) for uri in reimported],
+                         [(uri.md_uri, uri.uuid) for uri in uris])
+        for uri in reimported:
+            raw_data = self.request.get_rawdata(uri.md_uri)
+            self.assertEqual(raw_data.uuid, uri.uuid)
+            self.assertEqual(raw_data.tags, {'Population': 'population1'})
+        self.assertEqual(
+            len(self.request.service.get_import_manifest(experiment).files),
+            5)
+
     def test_tag_from_name(self):
         experiment = self.request.create_experiment("myexperiment", "sprigent",
                                                     date='now', tag_keys=[],
@@ -304,6 +435,49 @@ class TestRequest(unittest.TestCase):
                                      origin_output_name='o')
         self.assertEqual(data[0].name, 'population1_001_o')
 
+    def test_iter_data(self):
+        experiment = self.request.get_experiment(self.ref_experiment_uri)
+        dataset = self.request.get_dataset(experiment, "data")
+        data = list(self.request.iter_data(dataset,
+                                           query='Population=population1',
+                                           limit=1, offset=1))
+        self.assertEqual(len(data), 1)
+        self.assertEqual(data[0].name, 'population1_002.tif')
+
+    def test_iter_data_early_exit(self):
+        experiment = self.request.get_experiment(self.ref_experiment_uri)
+        dataset = self.request.get_dataset(experiment, "data")
+        # the second uri does not exist: the iteration must stop before
+        dataset.uris[1].md_uri = 'does_not_exist.md.json'
+        data = list(self.request.iter_data(dataset, limit=1))
+        self.assertEqual(data[0].name, 'population1_001.tif')
+
+    def test_get_data_fields(self):
+        experiment = self.request.get_experiment(self.ref_experiment_uri)
+        dataset = self.request.get_dataset(experiment, "process1")
+        data = self.request.get_data(dataset, query='number=002',
+                                     origin_output_name='o',
+                                     fields=['name', 'tags.number'])
+        self.assertEqual(data, [('population1_002_o', '002')])
+
+    def test_count(self):
+        experiment = self.request.get_experiment(self.ref_experiment_uri)
+        dataset = self.request.get_dataset(experiment, "data")
+        self.assertEqual(self.request.count(dataset), 3)
+        self.assertEqual(self.request.count(dataset, query='number<=002'), 2)
+        counts = self.request.count(dataset, keys=['Population'])
+        self.assertEqual(counts, {('population1',): 3})
+
+    def test_group_by(self):
+        experiment = self.request.get_experiment(self.ref_experiment_uri)
+        dataset = self.request.get_dataset(experiment, "process1")
+        groups = self.request.group_by(dataset, ['Population', 'number'],
+                                       query='number>=002')
+        self.assertEqual(list(groups.keys()), [('population1', '002'),
+                                               ('population1', '003')])
+        self.assertTrue(groups[('population1', '002')][0].endswith(
+            'population1_002_o.md.json'))
+
     def test_create_dataset(self):
         experiment = self.request.create_experiment("myexperiment", "sprigent",
                                                     date='now', tag_keys=[],
@@ -403,3 +577,458 @@ class TestRequest(unittest.TestCase):
         if "run.md.json" in processed_data.run.md_uri:
             t4 = True
         self.assertTrue(t1*t2*t3*t4)
+
+    def test_batch(self):
+        experiment = self.request.create_experiment("myexperiment", "sprigent",
+                                                    date='now', tag_keys=[],
+                                                    destination=self.test_experiment_dir)
+        dataset_file = os.path.join(self.test_experiment_dir, 'myexperiment',
+                                    'data', 'rawdataset.md.json')
+        with self.request.batch():
+            raw_data = self.request.import_data(experiment,
+                                                self.test_import_image,
+                                                'population1_001.tif',
+                                                'sprigent', 'tif', tags={})
+            self.assertFalse(os.path.isfile(raw_data.md_uri))
+            # read your writes inside the batch
+            dataset = self.request.get_rawdataset(experiment)
+            self.assertEqual(dataset.size(), 1)
+            self.assertEqual(self.request.get_rawdata(raw_data.md_uri).name,
+                             'population1_001.tif')
+        self.assertTrue(os.path.isfile(raw_data.md_uri))
+        dataset = self.request.get_dataset_from_uri(dataset_file)
+        self.assertEqual(dataset.size(), 1)
+
+    def test_batch_rollback(self):
+        experiment = self.request.create_experiment("myexperiment", "sprigent",
+                                                    date='now', tag_keys=[],
+                                                    destination=self.test_experiment_dir)
+        md_uri = ''
+        try:
+            with self.request.batch():
+                md_uri = self.request.import_data(
+                    experiment, self.test_import_image, 'population1_001.tif',
+                    'sprigent', 'tif', tags={}).md_uri
+                raise ValueError()
+        except ValueError:
+            pass
+        self.assertFalse(os.path.isfile(md_uri))
+        self.assertEqual(self.request.get_rawdataset(experiment).size(), 0)
+
+    def test_batch_nested_rollback(self):
+        experiment = self.request.create_experiment("myexperiment", "sprigent",
+                                                    date='now', tag_keys=[],
+                                                    destination=self.test_experiment_dir)
+        image_2 = os.path.join(self.test_import_dir, 'population1_002.tif')
+        image_3 = os.path.join(self.test_import_dir, 'population1_003.tif')
+        with self.request.batch():
+            self.request.import_data(experiment, self.test_import_image,
+                                     'population1_001.tif', 'sprigent', 'tif',
+                                     tags={})
+            try:
+                with self.request.batch():
+                    md_uri = self.request.import_data(
+                        experiment, image_2, 'population1_002.tif',
+                        'sprigent', 'tif', tags={}).md_uri
+                    raise ValueError()
+            except ValueError:
+                pass
+            self.request.import_data(experiment, image_3,
+                                     'population1_003.tif', 'sprigent', 'tif',
+                                     tags={})
+            # a committed batch is discarded with its enclosing batch
+            try:
+                with self.request.batch():
+                    with self.request.batch():
+                        self.request.import_data(
+                            experiment, image_2, 'population1_002.tif',
+                            'sprigent', 'tif', tags={})
+                    raise ValueError()
+            except ValueError:
+                pass
+        self.assertFalse(os.path.isfile(md_uri))
+        names = [os.path.basename(uri.md_uri) for uri
+                 in self.request.get_rawdataset(experiment).uris]
+        self.assertEqual(names, ['population1_001.md.json',
+                                 'population1_003.md.json'])
+
+    def test_create_data_many(self):
+        experiment = self.request.create_experiment("myexperiment", "sprigent",
+                                                    date='now', tag_keys=[],
+                                                    destination=self.test_experiment_dir)
+        raw_data = self.request.import_data(experiment, self.test_import_image,
+                                            'population1_001.tif', 'sprigent',
+                                            'tif', tags={})
+        dataset = self.request.create_dataset(experiment, "threshold")
+        run_info = Run()
+        run_info.set_process(name='threshold', uri='uniqueIdOfMyAlgorithm')
+        run_info.add_input(name='image', dataset='data')
+        self.request.create_run(dataset, run_info)
+
+        processed_list = []
+        for i in range(5):
+            processed_data = ProcessedData()
+            processed_data.set_info(name="myimage" + str(i), author="sprigent",
+                                    date='now', format_="tif",
+                                    url="myimage" + str(i) + ".tif")
+            processed_data.add_input(id="i", data=raw_data)
+            processed_data.set_output(id="o", label="threshold")
+            processed_list.append(processed_data)
+        created = self.request.create_data_many(dataset, run_info,
+                                                processed_list, workers=2)
+
+        self.assertTrue(all(os.path.isfile(d.md_uri) for d in created))
+        dataset = self.request.get_dataset(experiment, "threshold")
+        self.assertEqual(dataset.size(), 5)
+        self.assertEqual(self.request.count(dataset, query='name=myimage3'), 1)
+        # the provenance of the outputs written by the threads is indexed
+        index = ProvenanceIndex(os.path.dirname(
+            os.path.abspath(experiment.md_uri)))
+        index.refresh()
+        self.assertEqual(sorted(index.descendants([raw_data.uuid])),
+                         sorted(d.uuid for d in created))
+
+    def test_map_run(self):
+        experiment = self.request.create_experiment("myexperiment", "sprigent",
+                                                    date='now', tag_keys=[],
+                                                    destination=self.test_experiment_dir)
+        self.request.import_dir(experiment, self.test_import_dir,
+                                filter_=r'\.tif$', author='sprigent',
+                                format_='tif', date='now', copy_data=False)
+        raw_dataset = self.request.get_dataset(experiment, "data")
+        dataset = self.request.create_dataset(experiment, "threshold")
+        run_info = Run()
+        run_info.set_process(name='threshold', uri='uniqueIdOfMyAlgorithm')
+        run_info.add_input(name='image', dataset='data',
+                           query="name=population1")
+        run_info.add_parameter('threshold', '100')
+        self.request.create_run(dataset, run_info)
+
+        outputs = self.request.map_run(raw_dataset, run_info, threshold,
+                                       workers=2)
+        self.assertEqual(len(outputs), 20)
+        output = self.request.get_processeddata(outputs[0].md_uri)
+        self.assertEqual(output.uuid, outputs[0].uuid)
+        self.assertEqual(output.output['label'], 'threshold 100')
+        self.assertEqual(output.inputs[0].name, 'image')
+
+        dataset = self.request.get_dataset(experiment, "threshold")
+        self.assertEqual(dataset.size(), 20)
+        origin = self.request.get_origin(
+            self.request.get_processeddata(dataset.uris[0].md_uri))
+        self.assertTrue(origin.name.startswith('population1'))
+
+    def test_map_run_resume(self):
+        experiment = self.request.create_experiment("myexperiment", "sprigent",
+                                                    date='now', tag_keys=[],
+                                                    destination=self.test_experiment_dir)
+        self.request.import_dir(experiment, self.test_import_dir,
+                                filter_=r'population1_00[1-4]\.tif$',
+                                author='sprigent', format_='tif', date='now',
+                                copy_data=True)
+        raw_dataset = self.request.get_dataset(experiment, "data")
+        dataset = self.request.create_dataset(experiment, "threshold")
+        run_info = Run()
+        run_info.set_process(name='threshold', uri='uniqueIdOfMyAlgorithm')
+        run_info.add_input(name='image', dataset='data')
+        run_info.add_parameter('threshold', '100')
+        self.request.create_run(dataset, run_info)
+
+        # the outputs computed before the failure are registered
+        with self.assertRaises(ValueError):
+            self.request.map_run(raw_dataset, run_info, threshold_failing,
+                                 chunk_size=1)
+        names = [self.request.get_rawdata(uri.md_uri).name
+                 for uri in raw_dataset.uris]
+        processed = names.index('population1_003.tif')
+        dataset = self.request.get_dataset(experiment, "threshold")
+        self.assertEqual(dataset.size(), processed)
+
+        outputs = self.request.map_run(raw_dataset, run_info, threshold,
+                                       skip_existing=True)
+        self.assertEqual(len(outputs), 4 - processed)
+        self.assertEqual(
+            self.request.get_dataset(experiment, "threshold").size(), 4)
+
+    def test_run_fingerprint(self):
+        run1 = Run()
+        run1.set_process(name='threshold', uri='uniqueIdOfMyAlgorithm')
+        run1.add_input(name='image', dataset='data', query='')
+        run1.add_parameter('threshold', '100')
+        run1.add_parameter('method', 'otsu')
+        run2 = Run()
+        run2.set_process(name='threshold', uri='uniqueIdOfMyAlgorithm')
+        run2.add_input(name='image', dataset='data', query='')
+        run2.add_parameter('method', 'otsu')
+        run2.add_parameter('threshold', '100')
+        self.assertEqual(run1.fingerprint(), run2.fingerprint())
+        run2.add_parameter('size', '3')
+        self.assertNotEqual(run1.fingerprint(), run2.fingerprint())
+
+    def test_get_unprocessed_data(self):
+        experiment = self.request.create_experiment("myexperiment", "sprigent",
+                                                    date='now', tag_keys=[],
+                                                    destination=self.test_experiment_dir)
+        self.request.import_dir(experiment, self.test_import_dir,
+                                filter_=r'population1_00[1-4]\.tif$',
+                                author='sprigent', format_='tif', date='now',
+                                copy_data=False)
+        raw_dataset = self.request.get_dataset(experiment, "data")
+        dataset = self.request.create_dataset(experiment, "threshold")
+        run_info = Run()
+        run_info.set_process(name='threshold', uri='uniqueIdOfMyAlgorithm')
+        run_info.add_input(name='image', dataset='data')
+        run_info.add_parameter('threshold', '100')
+        self.request.create_run(dataset, run_info)
+        self.request.map_run(raw_dataset, run_info, threshold,
+                             query='name=population1_002')
+
+        # restart with a new run with the same definition
+        run_info2 = Run()
+        run_info2.set_process(name='threshold', uri='uniqueIdOfMyAlgorithm')
+        run_info2.add_input(name='image', dataset='data')
+        run_info2.add_parameter('threshold', '100')
+        self.request.create_run(dataset, run_info2)
+        data = self.request.get_unprocessed_data(raw_dataset, run_info2)
+        self.assertEqual(len(data), 3)
+        outputs = self.request.map_run(raw_dataset, run_info2, threshold,
+                                       skip_existing=True)
+        self.assertEqual(len(outputs), 3)
+        self.assertEqual(self.request.get_unprocessed_data(raw_dataset,
+                                                           run_info2), [])
+
+        # a run with other parameters has no output
+        run_info3 = Run()
+        run_info3.set_process(name='threshold', uri='uniqueIdOfMyAlgorithm')
+        run_info3.add_input(name='image', dataset='data')
+        run_info3.add_parameter('threshold', '50')
+        self.request.create_run(dataset, run_info3)
+        data = self.request.get_unprocessed_data(raw_dataset, run_info3)
+        self.assertEqual(len(data), 4)
+
+    def test_import_data_deduplicate(self):
+        store_dir = os.path.join(self.test_experiment_dir,
+                                 '.scixtracer_store')
+        self.addCleanup(shutil.rmtree, store_dir, True)
+        self.addCleanup(shutil.rmtree, os.path.join(self.test_experiment_dir,
+                                                    'myexperiment2'), True)
+        raw_data = []
+        for name in ['myexperiment', 'myexperiment2']:
+            experiment = self.request.create_experiment(
+                name, "sprigent", date='now', tag_keys=[],
+                destination=self.test_experiment_dir)
+            raw_data.append(self.request.import_data(
+                experiment, self.test_import_image, 'population1_001.tif',
+                'sprigent', 'tif', tags={}, copy=True, deduplicate=True))
+
+        self.assertTrue(raw_data[0].file_info['hash'].startswith('blake2b:'))
+        self.assertEqual(raw_data[0].file_info['hash'],
+                         raw_data[1].file_info['hash'])
+        self.assertTrue(os.path.samefile(raw_data[0].uri, raw_data[1].uri))
+        read_data = self.request.get_rawdata(raw_data[1].md_uri)
+        self.assertEqual(read_data.file_info, raw_data[1].file_info)
+        # the shared content is read-only
+        self.assertFalse(os.stat(raw_data[0].uri).st_mode & 0o222)
+
+        # a copy without the store replaces the link of one experiment only
+        experiment = self.request.get_experiment(os.path.join(
+            self.test_experiment_dir, 'myexperiment2', 'experiment.md.json'))
+        other_image = os.path.join(os.path.dirname(self.test_import_image),
+                                   'population1_002.tif')
+        self.request.import_data(
+            experiment, other_image, 'population1_001.tif', 'sprigent',
+            'tif', tags={}, copy=True, file_name='population1_001.tif')
+        self.assertFalse(os.path.samefile(raw_data[0].uri, raw_data[1].uri))
+        self.assertTrue(filecmp.cmp(raw_data[0].uri, self.test_import_image,
+                                    shallow=False))
+        self.assertTrue(filecmp.cmp(raw_data[1].uri, other_image,
+                                    shallow=False))
+
+    def test_changed_data(self):
+        experiment = self.request.create_experiment("myexperiment", "sprigent",
+                                                    date='now', tag_keys=[],
+                                                    destination=self.test_experiment_dir)
+        self.request.import_dir(experiment, self.test_import_dir,
+                                filter_=r'population1_00[1-3]\.tif$',
+                                author='sprigent', format_='tif', date='now',
+                                copy_data=True, hash_content=True)
+        self.assertTrue(self.request.verify(experiment, full_hash=True))
+
+        data_file = os.path.join(self.test_experiment_dir, 'myexperiment',
+                                 'data', 'population1_002.tif')
+        # same content with a new modification time
+        stat = os.stat(data_file)
+        os.utime(data_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        self.assertTrue(self.request.verify(experiment))
+        # the new modification time is recorded, the file is not hashed again
+        md_uri = os.path.join(self.test_experiment_dir, 'myexperiment',
+                              'data', 'population1_002.md.json')
+        self.assertEqual(
+            self.request.get_rawdata(md_uri).file_info['mtime_ns'],
+            os.stat(data_file).st_mtime_ns)
+        # new content
+        with open(data_file, 'ab') as file:
+            file.write(b'0')
+        changed = self.request.changed_data(experiment)
+        self.assertEqual([data.name for data in changed],
+                         ['population1_002.tif'])
+
+    def _create_pipeline(self):
+        experiment = self.request.create_experiment("myexperiment", "sprigent",
+                                                    date='now', tag_keys=[],
+                                                    destination=self.test_experiment_dir)
+        self.request.import_dir(experiment, self.test_import_dir,
+                                filter_=r'population1_00[1-3]\.tif$',
+                                author='sprigent', format_='tif', date='now',
+                                copy_data=True)
+        input_dataset = self.request.get_rawdataset(experiment)
+        runs = []
+        for name, input_name in [('threshold1', 'data'),
+                                 ('threshold2', 'threshold1')]:
+            dataset = self.request.create_dataset(experiment, name)
+            run_info = Run()
+            run_info.set_process(name='threshold', uri='uniqueIdOfMyAlgorithm')
+            run_info.add_input(name='image', dataset=input_name)
+            run_info.add_parameter('threshold', '100')
+            runs.append(self.request.create_run(dataset, run_info))
+            self.request.map_run(input_dataset, run_info, threshold)
+            input_dataset = self.request.get_dataset(experiment, name)
+        return experiment, runs
+
+    def test_provenance(self):
+        experiment, runs = self._create_pipeline()
+        dataset = self.request.get_dataset(experiment, 'threshold2')
+        output = self.request.get_processeddata(dataset.uris[0].md_uri)
+        parent = self.request.get_parent(output)
+        origin = self.request.get_origin(output)
+
+        ancestors = self.request.ancestors(output)
+        self.assertEqual([c.uuid for c in ancestors],
+                         [parent.uuid, origin.uuid])
+        self.assertEqual(ancestors[1].md_uri, origin.md_uri)
+        ancestors = self.request.ancestors(output, runs=True)
+        self.assertEqual([c.uuid for c in ancestors],
+                         [runs[1].uuid, parent.uuid, runs[0].uuid,
+                          origin.uuid])
+
+        index = self.request.provenance(experiment)
+        self.assertEqual(index.descendants([origin.uuid]),
+                         [parent.uuid, output.uuid])
+        self.assertEqual(len(index.nodes), 3 * 3 + 2)
+
+        # the index is persisted and can be rebuilt from the metadata
+        persisted = ProvenanceIndex(index.experiment_dir)
+        persisted.refresh()
+        self.assertEqual(persisted.nodes, index.nodes)
+        os.remove(index.path)
+        rebuilt = self.request.provenance(experiment)
+        self.assertTrue(os.path.isfile(index.path))
+        self.assertEqual(rebuilt.nodes, persisted.nodes)
+        self.assertEqual(rebuilt.parents, persisted.parents)
+
+    def test_stale_outputs(self):
+        experiment, runs = self._create_pipeline()
+        rawdataset = self.request.get_rawdataset(experiment)
+        rawdata = self.request.get_rawdata(rawdataset.uris[0].md_uri)
+
+        descendants = self.request.descendants(rawdata)
+        self.assertEqual(len(descendants), 2)
+        output = self.request.get_processeddata(descendants[1].md_uri)
+        self.assertEqual(self.request.get_origin(output).uuid, rawdata.uuid)
+        self.assertEqual(len(self.request.descendants(runs[0])), 6)
+
+        self.assertEqual(self.request.stale_outputs(experiment), [])
+        stale = self.request.stale_outputs(experiment, changed=[rawdata])
+        self.assertEqual({c.uuid for c in stale},
+                         {c.uuid for c in descendants})
+
+    def test_query_workspace(self):
+        self.addCleanup(shutil.rmtree, os.path.join(self.test_experiment_dir,
+                                                    'myexperiment2'), True)
+        self._create_pipeline()
+        experiment = self.request.create_experiment(
+            "myexperiment2", "sprigent", date='now', tag_keys=[],
+            destination=self.test_experiment_dir)
+        self.request.import_dir(experiment, self.test_import_dir,
+                                filter_=r'\.tif$', author='sprigent',
+                                format_='tif', date='now', copy_data=False)
+        self.request.tag_from_name(experiment, 'Population',
+                                   ['population1', 'population2'])
+
+        results = list(self.request.query_workspace(
+            self.test_experiment_dir, 'Population=population1',
+            datasets=['data'], workers=2))
+        self.assertEqual(len(results), 20)
+        self.assertEqual({r[0].name for r in results}, {'myexperiment2'})
+
+        results = list(self.request.query_workspace(
+            self.test_experiment_dir, experiments=['myexperiment'],
+            fields=['name']))
+        self.assertEqual(len(results), 9)
+        self.assertEqual(
+            sorted(name for _, dataset, (name,) in results
+                   if dataset == 'threshold2'),
+            ['o_o_population1_001.tif', 'o_o_population1_002.tif',
+             'o_o_population1_003.tif'])
+
+        # stopping the iteration early stops the workers
+        results = self.request.query_workspace(self.test_experiment_dir,
+                                               buffer_size=1)
+        self.assertEqual(len(next(results)), 3)
+        results.close()
+
+    def test_snapshot_origin_tags(self):
+        experiment = self.request.create_experiment("myexperiment", "sprigent",
+                                                    date='now', tag_keys=[],
+                                                    destination=self.test_experiment_dir)
+        self.request.import_dir(experiment, self.test_import_dir,
+                                filter_=r'population[12]_001\.tif$',
+                                author='sprigent', format_='tif', date='now',
+                                copy_data=True)
+        self.request.tag_from_name(experiment, 'Population',
+                                   ['population1', 'population2'])
+        input_dataset = self.request.get_rawdataset(experiment)
+        for name, input_name in [('threshold1', 'data'),
+                                 ('threshold2', 'threshold1')]:
+            dataset = self.request.create_dataset(experiment, name)
+            run_info = Run()
+            run_info.set_process(name='threshold', uri='uniqueIdOfMyAlgorithm')
+            run_info.add_input(name='image', dataset=input_name)
+            run_info.add_parameter('threshold', '100')
+            self.request.create_run(dataset, run_info)
+            self.request.map_run(input_dataset, run_info, threshold,
+                                 snapshot_tags=True)
+            input_dataset = self.request.get_dataset(experiment, name)
+
+        data = self.request.get_data(input_dataset, 'Population=population1')
+        self.assertEqual([d.name for d in data],
+                         ['o_o_population1_001.tif'])
+        origin = self.request.get_origin(data[0])
+        self.assertEqual(data[0].origin_uuid, origin.uuid)
+        self.assertEqual(data[0].origin_tags, {'Population': 'population1'})
+
+        # the queries do not read the origin data
+        with io_accounting() as account:
+            self.request.get_data(input_dataset, 'Population=population1')
+            self.request.get_data(input_dataset, 'Population=population1',
+                                  fields=['name'])
+        self.assertEqual(account.calls['get_data'].opens, 4)
+
+        origin.set_tag('Population', 'population3')
+        self.request.update_rawdata(origin)
+        self.assertEqual(self.request.refresh_origin_tags(experiment), 2)
+        self.assertEqual(self.request.refresh_origin_tags(experiment), 0)
+        data = self.request.get_data(input_dataset, 'Population=population3',
+                                     fields=['name'])
+        self.assertEqual(data, [('o_o_population1_001.tif',)])
+
+        # a snapshot whose origin is not in the experiment is cleared
+        raw_dataset = self.request.get_rawdataset(experiment)
+        raw_dataset.uris = [uri for uri in raw_dataset.uris
+                            if uri.uuid != origin.uuid]
+        self.request.update_dataset(raw_dataset)
+        self.assertEqual(
+            self.request.refresh_origin_tags(experiment, add=True), 0)
+        data = self.request.get_data(input_dataset, 'Population=population3')
+        self.assertEqual(data[0].origin_uuid, '')
+        self.assertIsNone(data[0].origin_tags)
@@ -0,0 +1,90 @@
+import unittest
+import io
+import os
+import json
+
+from scixtracer import Request
+from scixtracer.serialize import export_dataset, export_experiment
+from tests.metadata import (create_experiment, create_raw_data,
+                            create_processed_data, create_dataset)
+
+
+class TestSerialize(unittest.TestCase):
+    def setUp(self):
+        self.request = Request()
+        self.experiment_uri = \
+            os.path.join('tests', 'test_metadata_local', 'experiment.md.json')
+
+    def test_to_dict(self):
+        raw_data = create_raw_data()
+        content = json.loads(raw_data.to_json())
+        self.assertEqual(content['type'], 'raw')
+        self.assertEqual(content['uri'], raw_data.uri)
+        self.assertEqual(content['tags'], {'Population': 'population1',
+                                           'number': '001'})
+
+        processed_data = create_processed_data()
+        content = json.loads(processed_data.to_json())
+        self.assertEqual(content['run'], {'md_uri': processed_data.run.md_uri,
+                                          'uuid': processed_data.run.uuid})
+        self.assertEqual(content['inputs'][0]['uri'],
+                         processed_data.inputs[0].uri)
+        self.assertEqual(content['output'], processed_data.output)
+        self.assertIsNone(content['origin_tags'])
+
+        dataset = create_dataset()
+        content = json.loads(dataset.to_json())
+        self.assertEqual([uri['md_uri'] for uri in content['uris']],
+                         [uri.md_uri for uri in dataset.uris])
+
+        experiment = create_experiment()
+        content = json.loads(experiment.to_json())
+        self.assertEqual(content['rawdataset']['url'],
+                         experiment.rawdataset.url)
+        self.assertEqual(len(content['processeddatasets']),
+                         len(experiment.processeddatasets))
+        self.assertEqual(content['tag_keys'], experiment.tag_keys)
+
+        run = self.request.get_run(os.path.join(
+            'tests', 'test_metadata_local', 'process1', 'run.md.json'))
+        content = json.loads(run.to_json())
+        self.assertEqual(content['process_name'], run.process_name)
+        self.assertEqual([parameter['name']
+                          for parameter in content['parameters']],
+                         [parameter.name for parameter in run.parameters])
+        self.assertEqual(content['inputs'][0]['dataset'],
+                         run.inputs[0].dataset)
+
+    def test_export_experiment(self):
+        experiment = self.request.get_experiment(self.experiment_uri)
+        out_file = io.StringIO()
+        count = export_experiment(self.request, experiment, out_file)
+
+        records = [json.loads(line)
+                   for line in out_file.getvalue().splitlines()]
+        self.assertEqual(len(records), count)
+        self.assertEqual(records[0]['type'], 'experiment')
+        self.assertEqual(records[0]['name'], experiment.name)
+        datasets = [record['name'] for record in records
+                    if record['type'] == 'dataset']
+        self.assertEqual(datasets, ['data', 'process1', 'process2'])
+        raw_dataset = self.request.get_rawdataset(experiment)
+        self.assertEqual(
+            sum(record['type'] == 'raw' for record in records),
+            raw_dataset.size())
+        self.assertEqual(
+            sum(record['type'] == 'run' for record in records), 2)
+
+    def test_export_dataset_query(self):
+        experiment = self.request.get_experiment(self.experiment_uri)
+        dataset = self.request.get_rawdataset(experiment)
+        out_file = io.StringIO()
+        count = export_dataset(self.request, dataset, out_file,
+                               query='Population=population1')
+
+        records = [json.loads(line)
+                   for line in out_file.getvalue().splitlines()]
+        expected = self.request.get_data(dataset, 'Population=population1')
+        self.assertEqual(count, len(expected) + 1)
+        self.assertEqual([record['md_uri'] for record in records[1:]],
+                         [data.md_uri for data in expected])
@@ -0,0 +1,73 @@
+import unittest
+import time
+
+from scixtracer.utils import Observable, ProgressObserver
+
+
+class RecordObserver(ProgressObserver):
+    def __init__(self, delay=0):
+        super().__init__()
+        self.delay = delay
+        self.notifications = []
+
+    def notify(self, data: dict):
+        time.sleep(self.delay)
+        self.notifications.append(data)
+
+
+class RaisingObserver(ProgressObserver):
+    def notify(self, data: dict):
+        raise RuntimeError('observer failure')
+
+
+class TestObservable(unittest.TestCase):
+    def test_progress_step(self):
+        observable = Observable()
+        observer = RecordObserver()
+        observable.add_observer(observer)
+        observable.set_notification_rate(min_progress_step=10)
+        for progress in range(101):
+            observable.notify_observers(progress)
+        progresses = [data['progress'] for data in observer.notifications]
+        self.assertEqual(progresses, list(range(0, 101, 10)))
+
+    def test_rate(self):
+        observable = Observable()
+        observer = RecordObserver()
+        observable.add_observer(observer)
+        observable.set_notification_rate(max_per_second=1)
+        observable.notify_message('start')
+        for progress in range(101):
+            observable.notify_observers(progress)
+        progresses = [data['progress'] for data in observer.notifications
+                      if 'progress' in data]
+        self.assertEqual(progresses, [0, 100])
+        self.assertEqual(observer.notifications[0]['message'], 'start')
+
+    def test_async_dispatch(self):
+        observable = Observable()
+        observer = RecordObserver(delay=0.01)
+        observable.add_observer(observer)
+        observable.set_async_dispatch(True)
+        start = time.monotonic()
+        for progress in range(10):
+            observable.notify_observers(progress)
+        self.assertLess(time.monotonic() - start, 0.05)
+        observable.set_async_dispatch(False)
+        self.assertEqual(len(observer.notifications), 10)
+
+    def test_async_dispatch_observer_error(self):
+        observable = Observable()
+        observer = RecordObserver()
+        observable.add_observer(RaisingObserver())
+        observable.add_observer(observer)
+        observable.set_async_dispatch(True)
+        with self.assertLogs('scixtracer', level='ERROR'):
+            for progress in range(3):
+                observable.notify_observers(progress)
+            observable.flush_notifications()
+            self.assertEqual(len(observer.notifications), 3)
+            observable.notify_message('done')
+            observable.flush_notifications()
+        self.assertEqual(observer.notifications[-1]['message'], 'done')
+        observable.set_async_dispatch(False)